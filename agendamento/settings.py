@@ -94,6 +94,64 @@ DATABASES = {
     )
 }
 
+# =================================================================
+# CACHE COMPARTILHADO
+# =================================================================
+
+# Dados em cache que valem para todos os workers do gunicorn (como a versão do
+# catálogo de serviços) não podem ficar em um cache em memória, que seria um por
+# processo. Sem REDIS_URL, usa uma tabela no próprio banco (crie com
+# `python manage.py createcachetable`); com ela, o Redis (requer o pacote redis).
+# A suíte de testes usa agendamento.settings_testes, com cache em memória.
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'agendamentos_cache'}}
+
+# =================================================================
+# ÍNDICE DE OCUPAÇÃO DA AGENDA
+# =================================================================
+
+# Alias do cache (em CACHES) que guarda o bitmap de ocupação de cada dia.
+# Em produção, aponte para um cache compartilhado entre os workers.
+AGENDAMENTOS_OCUPACAO_CACHE = config('AGENDAMENTOS_OCUPACAO_CACHE', default='default')
+AGENDAMENTOS_OCUPACAO_TIMEOUT = config('AGENDAMENTOS_OCUPACAO_TIMEOUT', default=3600, cast=int)
+# Espera máxima (segundos) pela trava da versão de um dia ao ligar os slots de um agendamento novo
+AGENDAMENTOS_OCUPACAO_TRAVA_ESPERA = config('AGENDAMENTOS_OCUPACAO_TRAVA_ESPERA', default=1.0, cast=float)
+# Eventos ao vivo (SSE): intervalo de leitura das versões dos dias, keep-alive e
+# duração de cada conexão (em segundos; o navegador reconecta sozinho).
+# Sem ASGI (ex.: runserver), a tela recarrega o dia a cada POLLING segundos.
+AGENDAMENTOS_EVENTOS_INTERVALO = config('AGENDAMENTOS_EVENTOS_INTERVALO', default=1, cast=float)
+AGENDAMENTOS_EVENTOS_KEEPALIVE = config('AGENDAMENTOS_EVENTOS_KEEPALIVE', default=15, cast=float)
+AGENDAMENTOS_EVENTOS_DURACAO = config('AGENDAMENTOS_EVENTOS_DURACAO', default=300, cast=float)
+AGENDAMENTOS_EVENTOS_POLLING = config('AGENDAMENTOS_EVENTOS_POLLING', default=30, cast=float)
+
+# =================================================================
+# CONSULTA DE CEP
+# =================================================================
+
+# Provedor externo (classe com o método consultar(cep)); os testes usam um provedor local.
+AGENDAMENTOS_CEP_PROVEDOR = config('AGENDAMENTOS_CEP_PROVEDOR', default='agendamentos.cep.ViaCepProvedor')
+AGENDAMENTOS_CEP_TIMEOUT = config('AGENDAMENTOS_CEP_TIMEOUT', default=3, cast=float)
+# Validade (em segundos) dos CEPs encontrados e das respostas "CEP não encontrado"
+AGENDAMENTOS_CEP_TTL = config('AGENDAMENTOS_CEP_TTL', default=30 * 24 * 60 * 60, cast=int)
+AGENDAMENTOS_CEP_TTL_NEGATIVO = config('AGENDAMENTOS_CEP_TTL_NEGATIVO', default=24 * 60 * 60, cast=int)
+AGENDAMENTOS_CEP_LRU_TAMANHO = config('AGENDAMENTOS_CEP_LRU_TAMANHO', default=2048, cast=int)
+
+# =================================================================
+# TAREFAS EM SEGUNDO PLANO
+# =================================================================
+
+# Executa as tarefas na hora, dentro da requisição (desenvolvimento sem worker).
+AGENDAMENTOS_TAREFAS_IMEDIATAS = config('AGENDAMENTOS_TAREFAS_IMEDIATAS', default=False, cast=bool)
+# Espera (segundos) antes da 1ª nova tentativa; dobra a cada falha, até o máximo.
+AGENDAMENTOS_TAREFAS_BACKOFF = config('AGENDAMENTOS_TAREFAS_BACKOFF', default=10, cast=int)
+AGENDAMENTOS_TAREFAS_BACKOFF_MAXIMO = config('AGENDAMENTOS_TAREFAS_BACKOFF_MAXIMO', default=3600, cast=int)
+# Tarefa "executando" há mais tempo que isso volta para a fila (worker morreu no meio).
+AGENDAMENTOS_TAREFAS_TIMEOUT = config('AGENDAMENTOS_TAREFAS_TIMEOUT', default=600, cast=int)
+
 # =================================================================
 # VALIDAÇÃO DE SENHA E I18N
 # =================================================================
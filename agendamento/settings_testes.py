@@ -0,0 +1,11 @@
+"""
+Configurações da suíte de testes:
+
+    python manage.py test --settings=agendamento.settings_testes
+"""
+
+from .settings import *  # noqa: F401,F403
+
+# Cache em memória, do próprio processo: os testes limpam o cache entre um caso e
+# outro e contam queries (com a tabela de cache, cada leitura entraria na conta).
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
@@ -1,14 +1,111 @@
-from django.contrib import admin
-from .models import Pet, PerfilUsuario, Servico, Agendamento
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.functional import cached_property
+from .models import (
+    Pet, PerfilUsuario, Servico, Agendamento, Recurso, Tarefa,
+    HorarioFuncionamento, PausaExpediente, FechamentoAgenda,
+)
+from .catalogo import obter_catalogo
+from . import busca, exportacao
+
+# ==============================================================================
+# Modo "Tabela Grande" (changelists com milhões de linhas)
+# ==============================================================================
+
+# Abaixo disso o COUNT(*) é barato e a estimativa não compensa (e pode estar
+# zerada ou desatualizada em tabelas novas ou recém-importadas)
+LIMIAR_ESTIMATIVA = 100_000
+
+
+class PaginadorContagemEstimada(Paginator):
+    """
+    Sem filtros, o COUNT(*) exato varre a tabela inteira. No PostgreSQL, com
+    mais de LIMIAR_ESTIMATIVA linhas segundo as estatísticas (reltuples), usa
+    essa estimativa. Com filtros, tabelas menores ou outros bancos, conta normalmente.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None or query.where or connection.vendor != 'postgresql':
+            return super().count
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [self.object_list.model._meta.db_table],
+            )
+            linha = cursor.fetchone()
+        # reltuples é -1 (nunca analisada) ou 0 em tabelas novas: só a usa acima do limiar
+        if linha and linha[0] >= LIMIAR_ESTIMATIVA:
+            return linha[0]
+        return super().count
+
+
+class TabelaGrandeAdminMixin:
+    paginator = PaginadorContagemEstimada
+    # Não executa o segundo COUNT(*) ("x resultados de y no total") ao filtrar
+    show_full_result_count = False
+
+
+class ServicoListFilter(admin.SimpleListFilter):
+    """
+    Filtro pelo M2M de serviços com EXISTS em vez de JOIN: não duplica linhas,
+    então o changelist não precisa de DISTINCT. As opções vêm do snapshot do catálogo.
+    """
+    title = 'serviço'
+    parameter_name = 'servico'
+
+    def lookups(self, request, model_admin):
+        return [(str(s.id), s.nome) for s in obter_catalogo().ativos()]
+
+    def queryset(self, request, queryset):
+        if not self.value() or not self.value().isdigit():
+            return queryset
+        through = Agendamento.servicos.through
+        return queryset.filter(Exists(
+            through.objects.filter(agendamento_id=OuterRef('pk'), servico_id=int(self.value()))
+        ))
+
+class BuscaIndexadaAdminMixin:
+    """
+    A caixa de busca do changelist consulta o índice textual (busca.py) em vez
+    de gerar LIKE '%termo%' em cada campo de search_fields. search_fields
+    continua definido apenas para o admin exibir a caixa de busca.
+    """
+    tipo_busca = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        # Um a mais que o limite: sabe se a lista foi cortada sem contar todos os resultados
+        ids = busca.ids_encontrados(self.tipo_busca, search_term, busca.LIMITE_ADMIN + 1)
+        if len(ids) > busca.LIMITE_ADMIN:
+            ids = ids[:busca.LIMITE_ADMIN]
+            messages.warning(
+                request,
+                f'A busca encontrou mais de {busca.LIMITE_ADMIN} resultados; só os '
+                f'{busca.LIMITE_ADMIN} mais relevantes são exibidos. Refine o termo ou use os filtros.',
+            )
+        return queryset.filter(pk__in=ids), False
+
+# ==============================================================================
+# Registro dos Modelos
+# ==============================================================================
 
 @admin.register(Pet)
-class PetAdmin(admin.ModelAdmin):
+class PetAdmin(BuscaIndexadaAdminMixin, admin.ModelAdmin):
+    tipo_busca = 'pet'
     list_display = ['nome', 'tipo', 'dono', 'idade']
     list_filter = ['tipo', 'data_cadastro']
     search_fields = ['nome', 'raca', 'dono__username']
 
 @admin.register(PerfilUsuario)
-class PerfilUsuarioAdmin(admin.ModelAdmin):
+class PerfilUsuarioAdmin(BuscaIndexadaAdminMixin, admin.ModelAdmin):
+    tipo_busca = 'perfil'
     list_display = ['usuario', 'cpf', 'telefone', 'data_nascimento']
     search_fields = ['usuario__username', 'usuario__email', 'cpf']
 
@@ -19,10 +116,67 @@ class ServicoAdmin(admin.ModelAdmin):
     search_fields = ['nome']
     list_editable = ['preco', 'ativo']
 
+@admin.register(Recurso)
+class RecursoAdmin(admin.ModelAdmin):
+    list_display = ['nome', 'tipo', 'ativo']
+    list_filter = ['tipo', 'ativo']
+    search_fields = ['nome']
+    filter_horizontal = ['servicos']
+
+@admin.register(HorarioFuncionamento)
+class HorarioFuncionamentoAdmin(admin.ModelAdmin):
+    list_display = ['dia_semana', 'abertura', 'fechamento']
+    list_filter = ['dia_semana']
+
+@admin.register(PausaExpediente)
+class PausaExpedienteAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'dia_semana', 'inicio', 'fim', 'descricao']
+    list_filter = ['dia_semana']
+
+@admin.register(FechamentoAgenda)
+class FechamentoAgendaAdmin(admin.ModelAdmin):
+    list_display = ['data', 'inicio', 'fim', 'motivo', 'repetir_anualmente']
+    list_filter = ['repetir_anualmente']
+    date_hierarchy = 'data'
+    search_fields = ['motivo']
+
 @admin.register(Agendamento)
-class AgendamentoAdmin(admin.ModelAdmin):
-    list_display = ['nome_pet', 'data', 'horario_inicio', 'status', 'nome_tutor', 'valor_total']
-    list_filter = ['status', 'data', 'servicos', 'tipo_pet', 'forma_pagamento']
+class AgendamentoAdmin(BuscaIndexadaAdminMixin, TabelaGrandeAdminMixin, admin.ModelAdmin):
+    tipo_busca = 'agendamento'
+    list_display = [
+        'nome_pet', 'data', 'horario_inicio', 'status', 'nome_tutor', 'usuario', 'recurso', 'servicos_resumo', 'valor_total',
+    ]
+    list_filter = ['status', ServicoListFilter, 'recurso', 'tipo_pet', 'forma_pagamento']
+    list_select_related = ['usuario', 'recurso']
+    date_hierarchy = 'data'  # Usa o índice agendamento_data_idx
     search_fields = ['nome_pet', 'nome_tutor', 'rua', 'bairro', 'cidade']
     readonly_fields = ['data_criacao', 'data_atualizacao']
-    filter_horizontal = ['servicos']
\ No newline at end of file
+    autocomplete_fields = ['servicos']
+    actions = ['exportar_csv']
+
+    def get_queryset(self, request):
+        # Os serviços da página vêm em uma única query
+        return super().get_queryset(request).prefetch_related('servicos')
+
+    @admin.action(description='Exportar selecionados em CSV')
+    def exportar_csv(self, request, queryset):
+        # O queryset da ação já vem com os filtros do changelist; as linhas são enviadas em streaming
+        return exportacao.resposta_csv(queryset)
+
+    @admin.display(description='Serviços')
+    def servicos_resumo(self, obj):
+        return ', '.join(servico.nome for servico in obj.servicos.all())
+
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ['nome', 'fila', 'status', 'tentativas', 'executar_apos', 'concluida_em', 'worker']
+    list_filter = ['status', 'fila']
+    readonly_fields = [campo.name for campo in Tarefa._meta.fields]
+    actions = ['reenfileirar']
+
+    @admin.action(description='Reenfileirar tarefas selecionadas')
+    def reenfileirar(self, request, queryset):
+        total = queryset.exclude(status='executando').update(
+            status='pendente', tentativas=0, executar_apos=timezone.now(), erro='',
+        )
+        self.message_user(request, f'{total} tarefas reenfileiradas.')
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class AgendamentosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'agendamentos'
\ No newline at end of file
+    name = 'agendamentos'
+
+    def ready(self):
+        # Registra os signals (catálogo de serviços e índice de ocupação)
+        from . import signals  # noqa: F401
\ No newline at end of file
@@ -0,0 +1,162 @@
+# agendamentos/busca.py
+
+import re
+import unicodedata
+
+from django.apps import apps as apps_globais
+from django.db import connection, transaction
+
+# ==============================================================================
+# Busca Textual Indexada (agendamentos, pets e perfis)
+# ==============================================================================
+#
+# Cada objeto pesquisável tem uma linha em IndiceBusca com seus campos de texto
+# normalizados (minúsculas, sem acentos, só letras e dígitos). A consulta usa:
+#   - SQLite: a tabela FTS5 agendamentos_indicebusca_fts (mantida por triggers),
+#     com prefixo em cada termo e ordenação por bm25;
+#   - PostgreSQL: LIKE por termo sobre o índice GIN de trigramas, ordenado por
+#     word_similarity;
+#   - outros bancos: LIKE simples, sem ranking.
+
+TABELA_FTS = 'agendamentos_indicebusca_fts'
+
+# Máximo de IDs usados para filtrar um changelist do admin
+LIMITE_ADMIN = 1000
+
+# tipo -> (modelo, campos que compõem o documento)
+TIPOS = {
+    'agendamento': ('Agendamento', (
+        'nome_pet', 'nome_tutor', 'tipo_pet', 'cep', 'rua', 'numero', 'bairro', 'cidade', 'estado',
+    )),
+    'pet': ('Pet', (
+        'nome', 'raca', 'tipo', 'dono__username', 'dono__first_name', 'dono__last_name',
+    )),
+    'perfil': ('PerfilUsuario', (
+        'cpf', 'telefone', 'usuario__username', 'usuario__first_name', 'usuario__last_name', 'usuario__email',
+    )),
+}
+
+
+def normalizar(texto: str) -> str:
+    """'João da Silva-Ávila' -> 'joao da silva avila'."""
+    sem_acentos = unicodedata.normalize('NFKD', texto or '')
+    sem_acentos = ''.join(c for c in sem_acentos if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'[0-9a-z]+', sem_acentos.lower()))
+
+
+def _modelo(tipo):
+    return apps_globais.get_model('agendamentos', TIPOS[tipo][0])
+
+
+# ------------------------------------------------------------------------------
+# Manutenção do índice
+# ------------------------------------------------------------------------------
+
+def indexar(tipo: str, ids):
+    """(Re)gera o documento dos objetos informados. IDs que não existem mais saem do índice."""
+    ids = list(ids)
+    if not ids:
+        return
+    IndiceBusca = apps_globais.get_model('agendamentos', 'IndiceBusca')
+    campos = TIPOS[tipo][1]
+    linhas = _modelo(tipo).objects.filter(pk__in=ids).values_list('pk', *campos)
+
+    registros = [
+        IndiceBusca(tipo=tipo, objeto_id=pk, documento=normalizar(' '.join(str(v) for v in valores if v)))
+        for pk, *valores in linhas
+    ]
+    with transaction.atomic():
+        IndiceBusca.objects.bulk_create(
+            registros,
+            update_conflicts=True,
+            unique_fields=['tipo', 'objeto_id'],
+            update_fields=['documento'],
+        )
+        encontrados = {registro.objeto_id for registro in registros}
+        removidos = [pk for pk in ids if pk not in encontrados]
+        if removidos:
+            remover(tipo, removidos)
+
+
+def remover(tipo: str, ids):
+    IndiceBusca = apps_globais.get_model('agendamentos', 'IndiceBusca')
+    IndiceBusca.objects.filter(tipo=tipo, objeto_id__in=list(ids)).delete()
+
+
+def reconstruir(lote=2000):
+    """Indexa todos os objetos de todos os tipos, em lotes de IDs (ex.: depois de mudar TIPOS)."""
+    for tipo in TIPOS:
+        ids = _modelo(tipo).objects.order_by('pk').values_list('pk', flat=True)
+        ultimo = 0
+        while True:
+            pagina = list(ids.filter(pk__gt=ultimo)[:lote])
+            if not pagina:
+                break
+            indexar(tipo, pagina)
+            ultimo = pagina[-1]
+
+# ------------------------------------------------------------------------------
+# Consulta
+# ------------------------------------------------------------------------------
+
+def buscar(termo: str, tipos=None, limite: int = 50):
+    """
+    Retorna [(tipo, objeto_id)] ordenados por relevância. Todos os termos
+    precisam aparecer (como prefixo de palavra no SQLite, em qualquer posição
+    no PostgreSQL). Acentos e maiúsculas são ignorados.
+    """
+    termos = normalizar(termo).split()
+    if not termos or limite <= 0:
+        return []
+    tipos = [t for t in (tipos or TIPOS) if t in TIPOS]
+    if not tipos:
+        return []
+
+    filtro_tipos = ', '.join(['%s'] * len(tipos))
+    if connection.vendor == 'sqlite':
+        # Termos só têm [0-9a-z], então as aspas não precisam de escape
+        consulta = ' '.join(f'"{t}"*' for t in termos)
+        sql = (
+            f'SELECT i.tipo, i.objeto_id FROM {TABELA_FTS} '
+            f'JOIN agendamentos_indicebusca i ON i.id = {TABELA_FTS}.rowid '
+            f'WHERE {TABELA_FTS} MATCH %s AND i.tipo IN ({filtro_tipos}) '
+            f'ORDER BY bm25({TABELA_FTS}) LIMIT %s'
+        )
+        parametros = [consulta, *tipos, limite]
+    elif connection.vendor == 'postgresql':
+        likes = ' AND '.join(['documento LIKE %s'] * len(termos))
+        sql = (
+            f'SELECT tipo, objeto_id FROM agendamentos_indicebusca '
+            f'WHERE {likes} AND tipo IN ({filtro_tipos}) '
+            f'ORDER BY word_similarity(%s, documento) DESC, id DESC LIMIT %s'
+        )
+        parametros = [*(f'%{t}%' for t in termos), *tipos, ' '.join(termos), limite]
+    else:
+        IndiceBusca = apps_globais.get_model('agendamentos', 'IndiceBusca')
+        queryset = IndiceBusca.objects.filter(tipo__in=tipos)
+        for t in termos:
+            queryset = queryset.filter(documento__contains=t)
+        return list(queryset.order_by('-id').values_list('tipo', 'objeto_id')[:limite])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, parametros)
+        return [(tipo, objeto_id) for tipo, objeto_id in cursor.fetchall()]
+
+
+def ids_encontrados(tipo: str, termo: str, limite: int = LIMITE_ADMIN):
+    return [objeto_id for _, objeto_id in buscar(termo, [tipo], limite)]
+
+
+def buscar_objetos(termo: str, tipos=None, limite: int = 50):
+    """Como buscar(), mas devolve [(tipo, objeto)] carregando os objetos com uma query por tipo."""
+    encontrados = buscar(termo, tipos, limite)
+    relacionados = {'pet': ['dono'], 'perfil': ['usuario'], 'agendamento': []}
+
+    objetos = {}
+    for tipo in {t for t, _ in encontrados}:
+        ids = [objeto_id for t, objeto_id in encontrados if t == tipo]
+        queryset = _modelo(tipo).objects.select_related(*relacionados[tipo])
+        objetos[tipo] = queryset.in_bulk(ids)
+
+    # Um objeto excluído entre a busca e o carregamento simplesmente some do resultado
+    return [(t, objetos[t][pk]) for t, pk in encontrados if pk in objetos[t]]
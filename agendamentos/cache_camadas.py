@@ -0,0 +1,283 @@
+# agendamentos/cache_camadas.py
+
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import cache, caches
+from django.db import transaction
+
+# ==============================================================================
+# Cache em Duas Camadas (LRU do processo -> cache compartilhado)
+# ==============================================================================
+#
+# L1 é um dicionário LRU em memória, por processo: leitura sem I/O, mas cada
+# worker do gunicorn tem o seu e uma invalidação não chega aos outros. Por isso
+# o L1 só deve guardar chaves versionadas (a versão troca a chave) ou valores
+# que toleram alguns segundos de atraso (ttl_l1 curto).
+#
+# L2 é um backend de CACHES (banco ou Redis) compartilhado entre os
+# processos. get_or_compute() grava no L2 um envelope (valor, custo, expira_em):
+# perto do vencimento, cada leitura decide com uma probabilidade crescente
+# recalcular antes da hora (expiração antecipada probabilística, "XFetch"), e uma
+# trava no próprio L2 garante que só um processo recalcula enquanto os demais
+# continuam servindo o valor anterior.
+
+# ------------------------------------------------------------------------------
+# L1: LRU em memória (por processo)
+# ------------------------------------------------------------------------------
+
+class CacheLRU:
+    """Dicionário limitado por tamanho, com expiração por item e seguro entre threads."""
+
+    def __init__(self, tamanho_maximo: int):
+        self.tamanho_maximo = tamanho_maximo
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def get(self, chave):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em <= time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl: float):
+        with self._trava:
+            self._itens[chave] = (valor, time.monotonic() + ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho_maximo:
+                self._itens.popitem(last=False)
+
+    def delete(self, chave):
+        with self._trava:
+            self._itens.pop(chave, None)
+
+    def clear(self):
+        with self._trava:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+# ------------------------------------------------------------------------------
+# L1 + L2
+# ------------------------------------------------------------------------------
+
+# Todas as instâncias, para que limpar_l1() alcance os L1 de todos os módulos
+_instancias = []
+
+
+class CacheDoisNiveis:
+    """
+    L1 (CacheLRU) na frente de um alias de CACHES. `alias` pode ser o nome do
+    alias ou uma função que o devolve (lida a cada uso, respeitando settings
+    alterados em tempo de execução). ttl_l1=0 desliga o L1.
+    """
+
+    def __init__(self, prefixo: str, alias='default', tamanho_l1: int = 1024, ttl_l1: float = 5,
+                 timeout_trava: float = 30, espera_trava: float = 2):
+        self.prefixo = prefixo
+        self.alias = alias
+        self.ttl_l1 = ttl_l1
+        self.timeout_trava = timeout_trava
+        self.espera_trava = espera_trava
+        self.l1 = CacheLRU(tamanho_l1)
+        _instancias.append(self)
+
+    @property
+    def l2(self):
+        return caches[self.alias() if callable(self.alias) else self.alias]
+
+    def _chave(self, chave: str) -> str:
+        return f'{self.prefixo}:{chave}'
+
+    # --- leitura e escrita do envelope ---
+
+    def _ler(self, chave: str):
+        if self.ttl_l1:
+            envelope = self.l1.get(chave)
+            if envelope is not None:
+                return envelope
+        envelope = self.l2.get(self._chave(chave))
+        if envelope is not None:
+            self._guardar_no_l1(chave, envelope)
+        return envelope
+
+    def _guardar_no_l1(self, chave: str, envelope):
+        if not self.ttl_l1:
+            return
+        restante = envelope[2] - time.time() if envelope[2] is not None else self.ttl_l1
+        ttl = min(self.ttl_l1, restante)
+        if ttl > 0:
+            self.l1.set(chave, envelope, ttl)
+
+    def _gravar(self, chave: str, valor, timeout, custo: float = 0.0):
+        expira_em = time.time() + timeout if timeout is not None else None
+        envelope = (valor, custo, expira_em)
+        self.l2.set(self._chave(chave), envelope, timeout)
+        self._guardar_no_l1(chave, envelope)
+        return envelope
+
+    # --- API ---
+
+    def get(self, chave: str, padrao=None):
+        envelope = self._ler(chave)
+        return envelope[0] if envelope is not None else padrao
+
+    def set(self, chave: str, valor, timeout=300):
+        self._gravar(chave, valor, timeout)
+
+    def atualizar(self, chave: str, funcao, timeout=300) -> bool:
+        """
+        Aplica `funcao` ao valor do L2, se houver um (ler-alterar-gravar, sem
+        trava). Retorna False se a chave não estava em cache.
+        """
+        envelope = self.l2.get(self._chave(chave))
+        if envelope is None:
+            return False
+        self._gravar(chave, funcao(envelope[0]), timeout, envelope[1])
+        return True
+
+    def delete(self, chave: str):
+        """Remove do L2 e do L1 deste processo (os L1 dos outros expiram sozinhos)."""
+        self.l1.delete(chave)
+        self.l2.delete(self._chave(chave))
+
+    def limpar_l1(self):
+        self.l1.clear()
+
+    def get_or_compute(self, chave: str, calcular, timeout=300, beta: float = 1.0):
+        """
+        Retorna o valor em cache ou executa `calcular()` e o guarda por `timeout`
+        segundos. Proteção contra "stampede":
+
+        - antes de vencer, cada leitura recalcula antecipadamente com probabilidade
+          que cresce com o custo do cálculo e com a proximidade do vencimento
+          (beta > 1 antecipa mais; beta = 0 desliga);
+        - só quem obtém a trava recalcula; os demais devolvem o valor atual ou,
+          se não houver nenhum, aguardam até `espera_trava` segundos o resultado.
+        """
+        envelope = self._ler(chave)
+        if envelope is not None:
+            valor, custo, expira_em = envelope
+            if not self._expirar_antes(custo, expira_em, beta):
+                return valor
+            # Alguém já está recalculando: o valor atual ainda é válido
+            token = self._travar(chave)
+            if token is None:
+                return valor
+            try:
+                return self._calcular(chave, calcular, timeout)
+            finally:
+                self._destravar(chave, token)
+
+        token = self._travar(chave)
+        if token is not None:
+            try:
+                # Outro processo pode ter gravado entre a leitura e a trava
+                envelope = self.l2.get(self._chave(chave))
+                if envelope is not None:
+                    self._guardar_no_l1(chave, envelope)
+                    return envelope[0]
+                return self._calcular(chave, calcular, timeout)
+            finally:
+                self._destravar(chave, token)
+
+        envelope = self._aguardar(chave)
+        if envelope is not None:
+            return envelope[0]
+        # Quem tinha a trava demorou demais (ou morreu): calcula sem gravar por cima da trava
+        return self._calcular(chave, calcular, timeout)
+
+    # --- internos ---
+
+    @staticmethod
+    def _expirar_antes(custo: float, expira_em, beta: float) -> bool:
+        if expira_em is None or beta <= 0:
+            return False
+        # 1 - random() está em (0, 1], então o log nunca recebe zero
+        return time.time() - custo * beta * math.log(1.0 - random.random()) >= expira_em
+
+    def _calcular(self, chave: str, calcular, timeout):
+        inicio = time.monotonic()
+        valor = calcular()
+        self._gravar(chave, valor, timeout, time.monotonic() - inicio)
+        return valor
+
+    def _travar(self, chave: str):
+        token = uuid.uuid4().hex
+        if self.l2.add(self._chave(f'{chave}:trava'), token, self.timeout_trava):
+            return token
+        return None
+
+    def _destravar(self, chave: str, token: str):
+        chave_trava = self._chave(f'{chave}:trava')
+        # Só apaga a própria trava (ela pode ter vencido e sido obtida por outro)
+        if self.l2.get(chave_trava) == token:
+            self.l2.delete(chave_trava)
+
+    def _aguardar(self, chave: str):
+        limite = time.monotonic() + self.espera_trava
+        intervalo = 0.01
+        while time.monotonic() < limite:
+            time.sleep(intervalo)
+            envelope = self.l2.get(self._chave(chave))
+            if envelope is not None:
+                self._guardar_no_l1(chave, envelope)
+                return envelope
+            intervalo = min(intervalo * 2, 0.2)
+        return None
+
+
+# ------------------------------------------------------------------------------
+# Versão compartilhada (chaves versionadas de dados pequenos e raramente alterados)
+# ------------------------------------------------------------------------------
+
+class VersaoCompartilhada:
+    """
+    Versão no cache padrão que os signals trocam a cada alteração. Snapshots
+    por processo e entradas do L2 guardados sob a versão se tornam obsoletos
+    sozinhos, sem precisar apagar nada.
+    """
+
+    def __init__(self, chave: str):
+        self.chave = chave
+
+    def atual(self) -> int:
+        versao = cache.get(self.chave)
+        if versao is None:
+            # Chave ausente (primeiro acesso ou despejo do cache): inicia com um valor único
+            cache.add(self.chave, time.time_ns(), None)
+            versao = cache.get(self.chave)
+        return versao
+
+    def _trocar(self):
+        # Um valor novo em vez de incr(): no cache em banco incr() é get + set, e
+        # duas trocas simultâneas virariam um único incremento. Com set(), a última
+        # escrita vence, mas a versão nunca continua igual à de antes das duas.
+        cache.set(self.chave, time.time_ns(), None)
+
+    def invalidar(self):
+        """
+        Troca a versão agora e de novo após o commit: quem ler o banco entre o
+        signal e o commit guardaria os dados antigos sob a versão nova.
+        """
+        self._trocar()
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(self._trocar)
+
+
+def limpar_l1():
+    """Esvazia o L1 de todas as instâncias deste processo (testes)."""
+    for instancia in _instancias:
+        instancia.limpar_l1()
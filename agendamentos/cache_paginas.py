@@ -0,0 +1,67 @@
+# agendamentos/cache_paginas.py
+
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .catalogo import versao_catalogo
+
+# ==============================================================================
+# Cache de Páginas Inteiras para Visitantes Anônimos
+# ==============================================================================
+#
+# Um visitante sem cookie de sessão nem de mensagens vê exatamente o mesmo HTML
+# que qualquer outro visitante anônimo, então a página pronta pode ser servida
+# do cache sem tocar o banco. A chave inclui a versão do catálogo: alterar um
+# Servico troca a chave e as páginas antigas simplesmente expiram.
+
+PAGINA_ANONIMA_TIMEOUT = 300
+
+
+def _pode_usar_cache(request) -> bool:
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # Sessão pode significar usuário logado ou mensagens pendentes; mensagens também vêm em cookie
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES and CookieStorage.cookie_name not in request.COOKIES
+
+
+def _chave(request) -> str:
+    url = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f'pagina_anonima:{versao_catalogo()}:{url}'
+
+
+def cache_anonimo(timeout: int = PAGINA_ANONIMA_TIMEOUT):
+    """
+    Decorator de view: serve do cache a página renderizada para visitantes
+    anônimos. Respostas que não são 200 ou que gravam cookies (CSRF, sessão)
+    nunca são guardadas. Toda resposta leva `Vary: Cookie`, para que caches
+    intermediários também não misturem visitantes anônimos e logados.
+    """
+    def decorador(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not _pode_usar_cache(request):
+                resposta = view(request, *args, **kwargs)
+                patch_vary_headers(resposta, ('Cookie',))
+                return resposta
+
+            chave = _chave(request)
+            salva = cache.get(chave)
+            if salva is not None:
+                conteudo, tipo = salva
+                resposta = HttpResponse(conteudo, content_type=tipo)
+            else:
+                resposta = view(request, *args, **kwargs)
+                if resposta.status_code == 200 and not resposta.cookies and not resposta.streaming:
+                    if hasattr(resposta, 'render') and callable(resposta.render):
+                        resposta.render()
+                    cache.set(chave, (resposta.content, resposta['Content-Type']), timeout)
+            patch_vary_headers(resposta, ('Cookie',))
+            return resposta
+        return wrapper
+    return decorador
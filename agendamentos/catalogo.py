@@ -0,0 +1,124 @@
+# agendamentos/catalogo.py
+
+from dataclasses import dataclass
+from decimal import Decimal
+from types import MappingProxyType
+
+from django.core.files.storage import default_storage
+
+from .cache_camadas import CacheDoisNiveis, VersaoCompartilhada
+from .models import Servico
+from . import imagens
+
+# ==============================================================================
+# Snapshot Imutável do Catálogo de Serviços
+# ==============================================================================
+#
+# A tabela de Serviços é pequena e quase nunca muda, mas é lida em quase toda
+# requisição (home, agendamento, cálculo de duração e de preço). Cada processo
+# mantém um snapshot imutável em memória; a versão fica no cache do Django e é
+# trocada pelos signals de Servico, então todos os workers percebem a mudança.
+# As linhas lidas do banco ficam no cache compartilhado sob a versão: depois de
+# uma alteração, só um worker consulta o banco e os demais reaproveitam o resultado.
+
+CHAVE_VERSAO = 'catalogo_servicos:versao'
+CATALOGO_TIMEOUT = 24 * 60 * 60
+
+_versao = VersaoCompartilhada(CHAVE_VERSAO)
+# O snapshot já faz o papel do L1 neste processo
+_linhas = CacheDoisNiveis('catalogo_servicos:linhas', ttl_l1=0)
+
+
+@dataclass(frozen=True)
+class ServicoCatalogo:
+    id: int
+    nome: str
+    preco: Decimal
+    duracao_minutos: int
+    icone: str
+    ativo: bool
+    descricao: str
+    imagem: str
+    imagem_hash: str = ''
+    imagem_larguras: tuple = ()
+
+    @property
+    def imagem_url(self):
+        return default_storage.url(self.imagem) if self.imagem else ''
+
+    def imagem_srcset(self, extensao: str) -> str:
+        """srcset dos derivados redimensionados ('' enquanto não forem gerados)."""
+        if not self.imagem_hash:
+            return ''
+        return imagens.srcset(self.imagem_hash, self.imagem_larguras, extensao)
+
+    def __str__(self):
+        # Mesmo formato de Servico.__str__ (o JS do agendamento lê o preço do rótulo)
+        return f"{self.nome} - R$ {self.preco}"
+
+
+@dataclass(frozen=True)
+class Catalogo:
+    versao: int
+    servicos: MappingProxyType  # id -> ServicoCatalogo
+    ordem: tuple  # ids na ordenação padrão do modelo (nome)
+
+    def get(self, servico_id):
+        return self.servicos.get(servico_id)
+
+    def ativos(self) -> tuple:
+        return tuple(self.servicos[sid] for sid in self.ordem if self.servicos[sid].ativo)
+
+    def duracao_total(self, servicos_ids) -> int:
+        """Soma a duração dos serviços informados (IDs desconhecidos contam 0)."""
+        return sum(s.duracao_minutos for s in map(self.servicos.get, servicos_ids) if s)
+
+    def valor_total(self, servicos_ids) -> Decimal:
+        """Soma o preço dos serviços informados (IDs desconhecidos contam 0)."""
+        return sum((s.preco for s in map(self.servicos.get, servicos_ids) if s), Decimal('0'))
+
+
+_snapshot = None
+
+
+def versao_catalogo() -> int:
+    """Versão atual do catálogo, compartilhada entre processos via cache."""
+    return _versao.atual()
+
+
+def invalidar_catalogo():
+    """Troca a versão do catálogo (agora e após o commit). Chamado pelos signals de Servico."""
+    _versao.invalidar()
+
+
+def _ler_linhas() -> list:
+    campos = ('id', 'nome', 'preco', 'duracao_minutos', 'icone', 'ativo', 'descricao')
+    return list(Servico.objects.values_list(*campos, 'imagem', 'imagem_hash', 'imagem_larguras'))
+
+
+def _carregar_catalogo(versao: int) -> Catalogo:
+    servicos = {}
+    ordem = []
+    # Guarda as tuplas do banco (o MappingProxyType do snapshot não é serializável)
+    linhas = _linhas.get_or_compute(str(versao), _ler_linhas, CATALOGO_TIMEOUT)
+    for *linha, imagem, imagem_hash, larguras in linhas:
+        servico = ServicoCatalogo(
+            *linha, imagem=imagem or '', imagem_hash=imagem_hash, imagem_larguras=tuple(larguras or ()),
+        )
+        servicos[servico.id] = servico
+        ordem.append(servico.id)
+    return Catalogo(versao=versao, servicos=MappingProxyType(servicos), ordem=tuple(ordem))
+
+
+def obter_catalogo() -> Catalogo:
+    """
+    Retorna o snapshot do catálogo, recarregando do banco (uma query) apenas
+    quando a versão mudou. Leituras subsequentes não tocam o banco.
+    """
+    global _snapshot
+    versao = versao_catalogo()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.versao != versao:
+        snapshot = _carregar_catalogo(versao)
+        _snapshot = snapshot
+    return snapshot
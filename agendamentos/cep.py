@@ -0,0 +1,169 @@
+# agendamentos/cep.py
+
+import http.client
+import json
+import urllib.request
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .cache_camadas import CacheLRU
+from .models import CepCache, CepLocal
+
+# ==============================================================================
+# Consulta de CEP com Cache (LRU em memória -> tabela no banco -> provedor)
+# ==============================================================================
+
+class CepNaoEncontrado(Exception):
+    """O provedor respondeu que o CEP não existe."""
+
+class ErroConsultaCep(Exception):
+    """O provedor falhou (rede, timeout, resposta inválida)."""
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+# ------------------------------------------------------------------------------
+# Provedores
+# ------------------------------------------------------------------------------
+
+class ProvedorCep:
+    """
+    Interface dos provedores de CEP. `consultar` recebe o CEP com 8 dígitos e
+    devolve {'rua', 'bairro', 'cidade', 'estado'}, levantando CepNaoEncontrado
+    ou ErroConsultaCep. O provedor ativo é definido em AGENDAMENTOS_CEP_PROVEDOR.
+    """
+
+    def consultar(self, cep: str) -> dict:
+        raise NotImplementedError
+
+
+class ViaCepProvedor(ProvedorCep):
+    URL = 'https://viacep.com.br/ws/{cep}/json/'
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout if timeout is not None else _config('AGENDAMENTOS_CEP_TIMEOUT', 3)
+
+    def consultar(self, cep: str) -> dict:
+        try:
+            with urllib.request.urlopen(self.URL.format(cep=cep), timeout=self.timeout) as response:
+                data = json.loads(response.read().decode('utf-8'))
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            # OSError cobre URLError, timeouts e conexões recusadas ou resetadas;
+            # HTTPException, respostas cortadas ou malformadas (ex.: IncompleteRead)
+            raise ErroConsultaCep(str(e)) from e
+        if not isinstance(data, dict):
+            raise ErroConsultaCep('resposta inesperada do provedor')
+
+        if data.get('erro'):
+            raise CepNaoEncontrado(cep)
+
+        return {
+            'rua': data.get('logradouro', ''),
+            'bairro': data.get('bairro', ''),
+            'cidade': data.get('localidade', ''),
+            'estado': data.get('uf', ''),
+        }
+
+
+def obter_provedor() -> ProvedorCep:
+    return import_string(_config('AGENDAMENTOS_CEP_PROVEDOR', 'agendamentos.cep.ViaCepProvedor'))()
+
+
+# ------------------------------------------------------------------------------
+# LRU em memória (por processo; L1 de cache_camadas)
+# ------------------------------------------------------------------------------
+
+_lru = CacheLRU(_config('AGENDAMENTOS_CEP_LRU_TAMANHO', 2048))
+
+# Marcador guardado no LRU para CEPs inexistentes (cache negativo)
+_NAO_ENCONTRADO = object()
+
+
+def limpar_cache_local():
+    _lru.clear()
+
+
+# ------------------------------------------------------------------------------
+# Consulta
+# ------------------------------------------------------------------------------
+
+def _ttl(encontrado: bool) -> int:
+    if encontrado:
+        return _config('AGENDAMENTOS_CEP_TTL', 30 * 24 * 60 * 60)
+    return _config('AGENDAMENTOS_CEP_TTL_NEGATIVO', 24 * 60 * 60)
+
+
+def _resultado(registro: CepCache):
+    if not registro.encontrado:
+        return _NAO_ENCONTRADO
+    return {'rua': registro.rua, 'bairro': registro.bairro, 'cidade': registro.cidade, 'estado': registro.estado}
+
+
+def _guardar_no_lru(cep, resultado, idade_segundos=0):
+    ttl = _ttl(resultado is not _NAO_ENCONTRADO) - idade_segundos
+    if ttl > 0:
+        _lru.set(cep, resultado, ttl)
+
+
+def consultar_cep_em_memoria(cep: str):
+    """
+    Consulta apenas o LRU do processo (sem I/O, seguro em código assíncrono).
+    Retorna o endereço, None se o CEP não estiver em memória, ou levanta CepNaoEncontrado.
+    """
+    resultado = _lru.get(cep)
+    if resultado is _NAO_ENCONTRADO:
+        raise CepNaoEncontrado(cep)
+    return dict(resultado) if resultado is not None else None
+
+
+def consultar_cep(cep: str) -> dict:
+    """
+    Retorna o endereço do CEP (8 dígitos). Consulta, nesta ordem, o LRU do
+    processo, a base local importada (CepLocal), a tabela CepCache e, só então,
+    o provedor externo. Respostas negativas também ficam em cache (com TTL próprio).
+
+    Se o provedor falhar e houver um registro vencido no banco, ele é devolvido
+    em vez do erro.
+    """
+    resultado = _lru.get(cep)
+    if resultado is None:
+        resultado = _consultar_sem_lru(cep)
+
+    if resultado is _NAO_ENCONTRADO:
+        raise CepNaoEncontrado(cep)
+    return dict(resultado)
+
+
+def _consultar_sem_lru(cep: str):
+    local = CepLocal.objects.filter(cep=cep).values('rua', 'bairro', 'cidade', 'estado').first()
+    if local:
+        _guardar_no_lru(cep, local)
+        return local
+
+    agora = timezone.now()
+    registro = CepCache.objects.filter(cep=cep).first()
+    if registro:
+        idade = (agora - registro.atualizado_em).total_seconds()
+        if idade < _ttl(registro.encontrado):
+            resultado = _resultado(registro)
+            _guardar_no_lru(cep, resultado, idade)
+            return resultado
+
+    try:
+        endereco = obter_provedor().consultar(cep)
+        registro_novo = CepCache(cep=cep, encontrado=True, atualizado_em=agora, **endereco)
+    except CepNaoEncontrado:
+        registro_novo = CepCache(cep=cep, encontrado=False, atualizado_em=agora)
+    except ErroConsultaCep:
+        if registro and registro.encontrado:
+            return _resultado(registro)  # Registro vencido é melhor que nenhum
+        raise
+
+    registro_novo.save()
+    resultado = _resultado(registro_novo)
+    _guardar_no_lru(cep, resultado)
+    return resultado
@@ -0,0 +1,41 @@
+# agendamentos/coalescencia.py
+
+import asyncio
+import weakref
+
+# ==============================================================================
+# Coalescência de Requisições ("single-flight")
+# ==============================================================================
+#
+# Quando várias requisições idênticas chegam ao mesmo tempo (o mesmo CEP, a
+# mesma data + serviços), apenas a primeira executa o trabalho; as demais
+# aguardam o mesmo resultado. Funciona por event loop: sob ASGI há um loop por
+# worker, então todas as requisições simultâneas do worker compartilham o voo.
+
+class SingleFlight:
+
+    def __init__(self):
+        # event loop -> {chave: Task em andamento}
+        self._voos = weakref.WeakKeyDictionary()
+
+    def em_andamento(self) -> int:
+        """Quantidade de execuções em andamento no loop atual (usado nos testes)."""
+        return len(self._voos.get(asyncio.get_running_loop(), {}))
+
+    async def executar(self, chave, funcao):
+        """
+        Executa `funcao()` (uma corrotina) uma única vez por chave enquanto houver
+        uma execução em andamento. Todos os chamadores recebem o mesmo resultado
+        ou a mesma exceção.
+        """
+        loop = asyncio.get_running_loop()
+        voos = self._voos.setdefault(loop, {})
+
+        tarefa = voos.get(chave)
+        if tarefa is None:
+            tarefa = loop.create_task(funcao())
+            voos[chave] = tarefa
+            tarefa.add_done_callback(lambda _: voos.pop(chave, None))
+
+        # shield: se um chamador desistir (cliente desconectou), os demais continuam
+        return await asyncio.shield(tarefa)
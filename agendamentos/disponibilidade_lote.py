@@ -0,0 +1,137 @@
+# agendamentos/disponibilidade_lote.py
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+
+from .models import Agendamento
+from . import expediente, ocupacao, recursos, services
+
+# ==============================================================================
+# Disponibilidade em Lote (muitos dias x muitas durações, vetorizada com NumPy)
+# ==============================================================================
+#
+# Para planejamento de capacidade: uma única query carrega os agendamentos do
+# período, que viram uma matriz de ocupação [recurso, dia, slot de 15 minutos].
+# A soma acumulada de cada linha responde "quantos slots ocupados há em
+# [a, b)?" com uma subtração, então as janelas deslizantes de todas as durações,
+# dias e inícios candidatos saem de uma única operação vetorizada.
+#
+# A grade é a mesma do bitmap de ocupação: um agendamento fora da grade de 15
+# minutos ocupa os slots que toca inteiros (visão conservadora). Com recursos
+# cadastrados, um início está livre se algum recurso elegível estiver livre e
+# agendamentos sem recurso bloqueiam todos eles, como em recursos.py.
+
+SLOTS_DIA = ocupacao.SLOTS_DIA
+DURACAO_SLOT = ocupacao.DURACAO_SLOT
+
+
+@dataclass(frozen=True)
+class DisponibilidadeLote:
+    datas: tuple  # D datas consecutivas
+    duracoes: tuple  # K durações (minutos)
+    inicios: np.ndarray  # (U,) inícios candidatos em minutos, união do expediente de todos os dias
+    livres: np.ndarray  # (K, D, U) bool: início livre para a duração no dia
+
+    def horarios(self, duracao_minutos: int, data_agendamento: date) -> list:
+        """Inícios livres (minutos) de um dia para uma das durações calculadas."""
+        k = self.duracoes.index(duracao_minutos)
+        d = (data_agendamento - self.datas[0]).days
+        return self.inicios[self.livres[k, d]].tolist()
+
+    def por_dia(self, duracao_minutos: int) -> dict:
+        """{data: [minutos livres]}, no mesmo formato de services.calendario_disponibilidade."""
+        return {dia: self.horarios(duracao_minutos, dia) for dia in self.datas}
+
+    def contagem(self) -> np.ndarray:
+        """(K, D) quantidade de inícios livres por duração e dia."""
+        return self.livres.sum(axis=2)
+
+
+def _datas(data_inicio: date, data_fim: date) -> tuple:
+    return tuple(data_inicio + timedelta(days=i) for i in range((data_fim - data_inicio).days + 1))
+
+
+def _candidatos(datas: tuple):
+    """(U,) inícios do expediente (união dos dias) e (D, U) máscara dos permitidos em cada dia."""
+    atual = expediente.obter_expediente()
+    por_dia = [atual.inicios(dia, minimo_minutos=services.minimo_minutos_para(dia)) for dia in datas]
+    inicios = np.array(sorted({m for dia in por_dia for m in dia}), dtype=np.int32)
+    permitidos = np.zeros((len(datas), len(inicios)), dtype=bool)
+    for d, inicios_dia in enumerate(por_dia):
+        permitidos[d, np.searchsorted(inicios, inicios_dia)] = True
+    return inicios, permitidos
+
+
+def carregar_ocupacao(data_inicio: date, data_fim: date, recursos_ids: tuple = ()) -> np.ndarray:
+    """
+    Uma query: matriz (R, D, SLOTS_DIA) bool de slots ocupados, uma camada por
+    recurso informado. Sem recursos, uma única camada com todos os agendamentos.
+    """
+    linhas = Agendamento.objects.filter(
+        data__range=(data_inicio, data_fim), status__in=services.STATUS_ATIVOS,
+    ).values_list('data', 'recurso_id', 'horario_inicio', 'duracao_total_minutos')
+
+    camadas = {recurso_id: i for i, recurso_id in enumerate(recursos_ids)}
+    geral = len(recursos_ids)  # Última camada: agendamentos sem recurso (ou todos, sem recursos)
+    dias = (data_fim - data_inicio).days + 1
+
+    registros = []
+    for data_agendamento, recurso_id, horario_inicio, duracao in linhas:
+        if not recursos_ids or recurso_id is None:
+            camada = geral
+        elif recurso_id in camadas:
+            camada = camadas[recurso_id]
+        else:
+            continue  # Recurso inativo ou inelegível: não bloqueia os demais
+        inicio = services.horario_para_minutos(horario_inicio)
+        registros.append(((data_agendamento - data_inicio).days, camada, inicio, inicio + duracao))
+
+    # Marcação por diferenças: +1 no primeiro slot, -1 depois do último; a soma acumulada dá a ocupação
+    diferencas = np.zeros((geral + 1, dias, SLOTS_DIA + 1), dtype=np.int32)
+    if registros:
+        dia, camada, inicio, fim = np.array(registros, dtype=np.int32).T
+        primeiro = np.clip(inicio // DURACAO_SLOT, 0, SLOTS_DIA)
+        ultimo = np.clip(-(-fim // DURACAO_SLOT), 0, SLOTS_DIA)
+        np.add.at(diferencas, (camada, dia, primeiro), 1)
+        np.add.at(diferencas, (camada, dia, ultimo), -1)
+    ocupados = np.cumsum(diferencas[..., :SLOTS_DIA], axis=-1) > 0
+
+    if not recursos_ids:
+        return ocupados
+    return ocupados[:geral] | ocupados[geral]
+
+
+def calcular_disponibilidade_lote(data_inicio: date, data_fim: date, duracoes, servicos_ids=None) -> DisponibilidadeLote:
+    """
+    Inícios livres de todos os dias do período (inclusive) para cada duração, com
+    o expediente e o filtro de horários passados de services.calendario_disponibilidade.
+    Com recursos cadastrados, considera só os elegíveis para `servicos_ids`.
+    """
+    datas = _datas(data_inicio, data_fim)
+    duracoes = tuple(duracoes)
+    inicios, permitidos = _candidatos(datas)
+
+    if recursos.obter_recursos():
+        ids = tuple(recurso.id for recurso in recursos.elegiveis(servicos_ids))
+        if not ids:
+            return DisponibilidadeLote(datas, duracoes, inicios, np.zeros((len(duracoes),) + permitidos.shape, dtype=bool))
+        ocupados = carregar_ocupacao(data_inicio, data_fim, ids)
+    else:
+        ocupados = carregar_ocupacao(data_inicio, data_fim)
+
+    # acumulado[..., s] = slots ocupados em [0, s); janela [a, b) = acumulado[b] - acumulado[a]
+    acumulado = np.zeros(ocupados.shape[:-1] + (SLOTS_DIA + 1,), dtype=np.int32)
+    np.cumsum(ocupados, axis=-1, out=acumulado[..., 1:])
+
+    fins = inicios[None, :] + np.array(duracoes, dtype=np.int32)[:, None]  # (K, U)
+    primeiro = inicios // DURACAO_SLOT  # (U,)
+    ultimo = np.minimum(-(-fins // DURACAO_SLOT), SLOTS_DIA)  # (K, U)
+
+    # (R, D, K, U): slots ocupados na janela de cada duração e início, em cada recurso e dia
+    janelas = acumulado[:, :, ultimo] - acumulado[:, :, primeiro][:, :, None, :]
+    livres = (janelas == 0).any(axis=0).transpose(1, 0, 2)  # (K, D, U): algum recurso livre
+    livres &= permitidos[None, :, :]
+    livres &= (fins <= 24 * 60)[:, None, :]  # Não atravessa a meia-noite
+    return DisponibilidadeLote(datas, duracoes, inicios, livres)
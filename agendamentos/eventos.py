@@ -0,0 +1,185 @@
+# agendamentos/eventos.py
+
+import asyncio
+import json
+import weakref
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+
+from . import ocupacao
+from .services import minutos_para_horario
+
+# ==============================================================================
+# Eventos de Disponibilidade em Tempo Real (Server-Sent Events)
+# ==============================================================================
+#
+# Quem está na tela de agendamento observa algumas datas. Agendar, editar,
+# cancelar ou excluir um agendamento troca a versão do dia (signals ->
+# ocupacao.ocupar_intervalo e ocupacao.invalidar_dia); a central de cada event
+# loop lê as versões dos dias observados no cache compartilhado a cada intervalo e, quando
+# uma muda, compara o bitmap novo com o anterior e envia aos inscritos os slots
+# que foram ocupados e os que foram liberados.
+#
+# Uma central por event loop (um por worker ASGI): cem páginas abertas no mesmo
+# dia custam uma leitura de cache por intervalo, não cem.
+#
+# Só sob ASGI: um servidor WSGI consome o iterador assíncrono inteiro antes de
+# enviar qualquer byte, prendendo o worker pela duração da conexão sem entregar
+# nenhum evento. Fora do ASGI a tela de agendamento volta ao polling.
+
+MAX_DATAS = 7
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+def ao_vivo(request) -> bool:
+    """A requisição chegou por um servidor ASGI (capaz de manter o stream aberto)?"""
+    return isinstance(request, ASGIRequest)
+
+
+def intervalo_polling() -> float:
+    """Segundos entre recargas do dia observado quando não há eventos ao vivo."""
+    return _config('AGENDAMENTOS_EVENTOS_POLLING', 30)
+
+
+def _horarios(mascara: int) -> list:
+    """Slots (HH:MM) ligados na máscara."""
+    return [
+        minutos_para_horario(slot * ocupacao.DURACAO_SLOT)
+        for slot in range(ocupacao.SLOTS_DIA) if mascara >> slot & 1
+    ]
+
+
+def diferenca(data_agendamento: date, anterior: int, atual: int) -> list:
+    """Eventos (nome, dados) que levam o bitmap `anterior` ao `atual`."""
+    eventos = []
+    ocupados = atual & ~anterior
+    liberados = anterior & ~atual
+    if ocupados:
+        eventos.append(('ocupado', {'data': data_agendamento.isoformat(), 'slots': _horarios(ocupados)}))
+    if liberados:
+        eventos.append(('liberado', {'data': data_agendamento.isoformat(), 'slots': _horarios(liberados)}))
+    return eventos
+
+
+def formatar_evento(nome: str, dados: dict) -> str:
+    return f'event: {nome}\ndata: {json.dumps(dados)}\n\n'
+
+
+# ------------------------------------------------------------------------------
+# Central de eventos (uma por event loop)
+# ------------------------------------------------------------------------------
+
+class CentralEventos:
+
+    def __init__(self):
+        self.inscricoes = {}  # data -> set de asyncio.Queue
+        self.estado = {}  # data -> (versão, bitmap) da última verificação
+        self.tarefa = None
+
+    def inscrever(self, datas, fila: asyncio.Queue):
+        for dia in datas:
+            self.inscricoes.setdefault(dia, set()).add(fila)
+        if self.tarefa is None or self.tarefa.done():
+            self.tarefa = asyncio.get_running_loop().create_task(self._rodar())
+
+    def cancelar(self, datas, fila: asyncio.Queue):
+        for dia in datas:
+            filas = self.inscricoes.get(dia)
+            if filas is None:
+                continue
+            filas.discard(fila)
+            if not filas:
+                del self.inscricoes[dia]
+                self.estado.pop(dia, None)
+
+    def verificar(self) -> dict:
+        """
+        Uma rodada (síncrona, fora do event loop): lê as versões dos dias
+        observados e, para os que mudaram, o bitmap novo. Retorna {data: eventos}.
+        """
+        dias = list(self.inscricoes)
+        versoes = ocupacao.versoes_dias(dias)
+        eventos = {}
+        for dia in dias:
+            anterior = self.estado.get(dia)
+            if anterior is not None and anterior[0] == versoes[dia]:
+                continue
+            mapa = ocupacao.obter_mapa(dia)
+            if anterior is not None:
+                eventos[dia] = diferenca(dia, anterior[1], mapa)
+            if dia in self.inscricoes:  # O último inscrito pode ter saído durante a rodada
+                self.estado[dia] = (versoes[dia], mapa)
+        return eventos
+
+    async def _rodar(self):
+        intervalo = _config('AGENDAMENTOS_EVENTOS_INTERVALO', 1)
+        while self.inscricoes:
+            try:
+                eventos = await sync_to_async(self.verificar)()
+            except Exception:
+                eventos = {}  # Cache ou banco indisponível: tenta de novo no próximo ciclo
+            for dia, lista in eventos.items():
+                for fila in self.inscricoes.get(dia, ()):
+                    for evento in lista:
+                        fila.put_nowait(evento)
+            await asyncio.sleep(intervalo)
+
+
+_centrais = weakref.WeakKeyDictionary()
+
+
+def central() -> CentralEventos:
+    loop = asyncio.get_running_loop()
+    instancia = _centrais.get(loop)
+    if instancia is None:
+        instancia = _centrais[loop] = CentralEventos()
+    return instancia
+
+
+class FluxoEventos:
+    """
+    Corpo da resposta SSE: eventos "ocupado"/"liberado" das datas observadas,
+    comentários de keep-alive e encerramento após AGENDAMENTOS_EVENTOS_DURACAO
+    segundos (o EventSource do navegador reconecta sozinho).
+
+    O Django chama close() ao encerrar a resposta (inclusive quando o cliente
+    desconecta), o que cancela a inscrição na central.
+    """
+
+    def __init__(self, datas):
+        self.datas = datas
+        self._fila = None
+        self._central = None
+
+    def __aiter__(self):
+        return self._gerar()
+
+    async def _gerar(self):
+        loop = asyncio.get_running_loop()
+        self._fila = asyncio.Queue()
+        self._central = central()
+        self._central.inscrever(self.datas, self._fila)
+        try:
+            yield 'retry: 3000\n\n'
+            fim = loop.time() + _config('AGENDAMENTOS_EVENTOS_DURACAO', 300)
+            keep_alive = _config('AGENDAMENTOS_EVENTOS_KEEPALIVE', 15)
+            while (restante := fim - loop.time()) > 0:
+                try:
+                    nome, dados = await asyncio.wait_for(self._fila.get(), timeout=min(keep_alive, restante))
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield formatar_evento(nome, dados)
+        finally:
+            self.close()
+
+    def close(self):
+        if self._central is not None:
+            self._central.cancelar(self.datas, self._fila)
+            self._central = None
@@ -0,0 +1,156 @@
+# agendamentos/expediente.py
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import date
+
+from .cache_camadas import CacheDoisNiveis, VersaoCompartilhada
+from .models import FechamentoAgenda, HorarioFuncionamento, PausaExpediente
+
+# ==============================================================================
+# Expediente Compilado (modelos de slots em minutos por dia da semana)
+# ==============================================================================
+#
+# Horários de funcionamento, pausas e fechamentos ficam no banco (editáveis no
+# admin) e são compilados uma vez por versão: para cada dia da semana, uma tupla
+# ordenada com os inícios possíveis em minutos desde 00:00. As consultas de
+# disponibilidade trabalham só com esses inteiros, sem converter strings.
+# A versão é trocada pelos signals dos três modelos.
+
+CHAVE_VERSAO = 'expediente:versao'
+EXPEDIENTE_TIMEOUT = 24 * 60 * 60
+INTERVALO_PADRAO = 15
+DIA_INTEIRO = (0, 24 * 60)
+
+# Sem nenhum HorarioFuncionamento cadastrado: todos os dias, 08:00-18:00, almoço 12:00-14:00
+PERIODOS_PADRAO = ((8 * 60, 18 * 60),)
+PAUSAS_PADRAO = ((12 * 60, 14 * 60),)
+
+
+def _minutos(horario) -> int:
+    return horario.hour * 60 + horario.minute
+
+
+def compilar_inicios(periodos, pausas, intervalo_minutos: int = INTERVALO_PADRAO) -> tuple:
+    """Inícios (minutos) a cada `intervalo_minutos` dentro dos períodos, fora das pausas."""
+    inicios = set()
+    for abertura, fechamento in periodos:
+        for inicio in range(abertura, fechamento, intervalo_minutos):
+            if not any(pausa_inicio <= inicio < pausa_fim for pausa_inicio, pausa_fim in pausas):
+                inicios.add(inicio)
+    return tuple(sorted(inicios))
+
+
+@dataclass(frozen=True)
+class Expediente:
+    versao: int
+    periodos: tuple  # 7 tuplas de (abertura, fechamento), por dia da semana (0 = segunda)
+    pausas: tuple  # 7 tuplas de (inicio, fim)
+    fechamentos: dict  # data -> tupla de (inicio, fim)
+    fechamentos_anuais: dict  # (mês, dia) -> tupla de (inicio, fim)
+    modelos: tuple  # 7 tuplas de inícios no intervalo padrão
+
+    def modelo(self, dia_semana: int, intervalo_minutos: int = INTERVALO_PADRAO) -> tuple:
+        if intervalo_minutos == INTERVALO_PADRAO:
+            return self.modelos[dia_semana]
+        return compilar_inicios(self.periodos[dia_semana], self.pausas[dia_semana], intervalo_minutos)
+
+    def fechado_em(self, data_agendamento: date) -> tuple:
+        return (
+            self.fechamentos.get(data_agendamento, ())
+            + self.fechamentos_anuais.get((data_agendamento.month, data_agendamento.day), ())
+        )
+
+    def inicios(self, data_agendamento: date, intervalo_minutos: int = INTERVALO_PADRAO,
+                minimo_minutos: int = None) -> tuple:
+        """Inícios do dia (modelo do dia da semana menos os fechamentos), a partir de `minimo_minutos`."""
+        inicios = self.modelo(data_agendamento.weekday(), intervalo_minutos)
+        if minimo_minutos is not None:
+            inicios = inicios[bisect_left(inicios, minimo_minutos):]
+        fechamentos = self.fechado_em(data_agendamento)
+        if fechamentos:
+            inicios = tuple(m for m in inicios if not any(i <= m < f for i, f in fechamentos))
+        return inicios
+
+
+# ------------------------------------------------------------------------------
+# Snapshot por processo
+# ------------------------------------------------------------------------------
+
+_versao = VersaoCompartilhada(CHAVE_VERSAO)
+_linhas = CacheDoisNiveis('expediente:linhas', ttl_l1=0)
+_snapshot = None
+
+
+def versao_expediente() -> int:
+    return _versao.atual()
+
+
+def invalidar_expediente():
+    """Chamado pelos signals de HorarioFuncionamento, PausaExpediente e FechamentoAgenda."""
+    _versao.invalidar()
+
+
+def _ler_linhas():
+    periodos = [
+        (dia, _minutos(abertura), _minutos(fechamento))
+        for dia, abertura, fechamento in HorarioFuncionamento.objects.values_list('dia_semana', 'abertura', 'fechamento')
+    ]
+    pausas = [
+        (dia, _minutos(inicio), _minutos(fim))
+        for dia, inicio, fim in PausaExpediente.objects.values_list('dia_semana', 'inicio', 'fim')
+    ]
+    fechamentos = [
+        (data, None if inicio is None else _minutos(inicio), None if fim is None else _minutos(fim), anual)
+        for data, inicio, fim, anual in FechamentoAgenda.objects.values_list('data', 'inicio', 'fim', 'repetir_anualmente')
+    ]
+    return periodos, pausas, fechamentos
+
+
+def _compilar(versao: int, linhas) -> Expediente:
+    periodos_cadastrados, pausas_cadastradas, linhas_fechamento = linhas
+
+    if periodos_cadastrados:
+        periodos = tuple(
+            tuple(sorted((a, f) for d, a, f in periodos_cadastrados if d == dia)) for dia in range(7)
+        )
+        pausas = tuple(
+            tuple(sorted((i, f) for d, i, f in pausas_cadastradas if d is None or d == dia)) for dia in range(7)
+        )
+    else:
+        periodos = (PERIODOS_PADRAO,) * 7
+        pausas = (PAUSAS_PADRAO,) * 7
+
+    fechamentos = {}
+    fechamentos_anuais = {}
+    for data_fechamento, inicio, fim, anual in linhas_fechamento:
+        intervalo = DIA_INTEIRO if inicio is None else (inicio, fim)
+        if anual:
+            chave, destino = (data_fechamento.month, data_fechamento.day), fechamentos_anuais
+        else:
+            chave, destino = data_fechamento, fechamentos
+        destino[chave] = destino.get(chave, ()) + (intervalo,)
+
+    return Expediente(
+        versao=versao,
+        periodos=periodos,
+        pausas=pausas,
+        fechamentos=fechamentos,
+        fechamentos_anuais=fechamentos_anuais,
+        modelos=tuple(compilar_inicios(periodos[dia], pausas[dia]) for dia in range(7)),
+    )
+
+
+def obter_expediente() -> Expediente:
+    """Expediente compilado (três queries só quando a versão muda; o resultado fica no cache compartilhado)."""
+    global _snapshot
+    versao = versao_expediente()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.versao != versao:
+        snapshot = _compilar(versao, _linhas.get_or_compute(str(versao), _ler_linhas, EXPEDIENTE_TIMEOUT))
+        _snapshot = snapshot
+    return snapshot
+
+
+def inicios_do_dia(data_agendamento: date, minimo_minutos: int = None) -> tuple:
+    return obter_expediente().inicios(data_agendamento, minimo_minutos=minimo_minutos)
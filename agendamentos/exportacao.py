@@ -0,0 +1,118 @@
+# agendamentos/exportacao.py
+
+import csv
+from collections import defaultdict
+from datetime import date
+
+from django.http import StreamingHttpResponse
+
+from .models import Agendamento
+from .catalogo import obter_catalogo
+
+# ==============================================================================
+# Exportação de Agendamentos em CSV (streaming, memória constante)
+# ==============================================================================
+#
+# As linhas são lidas com .iterator() (cursor no servidor, em blocos) como
+# tuplas, sem instanciar modelos. A cada lote, os serviços de todos os
+# agendamentos do lote vêm em uma única query na tabela intermediária e os
+# nomes saem do snapshot do catálogo. Cada linha é enviada assim que gerada.
+
+TAMANHO_LOTE = 2000
+
+# (cabeçalho, campo em values_list)
+COLUNAS = (
+    ('ID', 'id'),
+    ('Data', 'data'),
+    ('Início', 'horario_inicio'),
+    ('Duração (min)', 'duracao_total_minutos'),
+    ('Status', 'status'),
+    ('Tutor', 'nome_tutor'),
+    ('Usuário', 'usuario__username'),
+    ('Pet', 'nome_pet'),
+    ('Tipo do Pet', 'tipo_pet'),
+    ('Forma de Pagamento', 'forma_pagamento'),
+    ('Valor Total', 'valor_total'),
+    ('CEP', 'cep'),
+    ('Cidade', 'cidade'),
+    ('Estado', 'estado'),
+    ('Criado em', 'data_criacao'),
+)
+
+
+class _Eco:
+    """Objeto com write() que devolve o texto: o csv.writer passa a gerar strings."""
+
+    def write(self, valor):
+        return valor
+
+
+def filtrar_agendamentos(parametros, queryset=None):
+    """
+    Aplica os filtros da exportação (inicio, fim, status e forma_pagamento; os dois
+    últimos aceitam vários valores separados por vírgula). Levanta ValueError.
+    """
+    queryset = Agendamento.objects.all() if queryset is None else queryset
+    if parametros.get('inicio'):
+        queryset = queryset.filter(data__gte=date.fromisoformat(parametros['inicio']))
+    if parametros.get('fim'):
+        queryset = queryset.filter(data__lte=date.fromisoformat(parametros['fim']))
+
+    status_validos = dict(Agendamento.STATUS_CHOICES)
+    formas_validas = dict(Agendamento.FORMA_PAGAMENTO_CHOICES)
+    for campo, validos in (('status', status_validos), ('forma_pagamento', formas_validas)):
+        valores = [v for v in parametros.get(campo, '').split(',') if v]
+        if any(v not in validos for v in valores):
+            raise ValueError(f'Valor inválido para {campo}')
+        if valores:
+            queryset = queryset.filter(**{f'{campo}__in': valores})
+    return queryset
+
+
+def _servicos_do_lote(ids):
+    through = Agendamento.servicos.through
+    servicos = defaultdict(list)
+    for agendamento_id, servico_id in (
+        through.objects.filter(agendamento_id__in=ids).order_by('id').values_list('agendamento_id', 'servico_id')
+    ):
+        servicos[agendamento_id].append(servico_id)
+    return servicos
+
+
+def linhas_csv(queryset, tamanho_lote: int = TAMANHO_LOTE):
+    """Gera o CSV linha a linha: cabeçalho e depois um lote de agendamentos por vez."""
+    escritor = csv.writer(_Eco(), delimiter=';')  # Excel em pt-BR abre direto com ';'
+    catalogo = obter_catalogo()
+
+    yield '\ufeff' + escritor.writerow([cabecalho for cabecalho, _ in COLUNAS] + ['Serviços'])
+
+    linhas = (
+        queryset.prefetch_related(None)
+        .order_by('data', 'horario_inicio', 'id')
+        .values_list(*(campo for _, campo in COLUNAS))
+        .iterator(chunk_size=tamanho_lote)
+    )
+    lote = []
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= tamanho_lote:
+            yield from _escrever_lote(escritor, catalogo, lote)
+            lote = []
+    if lote:
+        yield from _escrever_lote(escritor, catalogo, lote)
+
+
+def _escrever_lote(escritor, catalogo, lote):
+    servicos = _servicos_do_lote([linha[0] for linha in lote])
+    for linha in lote:
+        nomes = []
+        for servico_id in servicos.get(linha[0], ()):
+            servico = catalogo.get(servico_id)
+            nomes.append(servico.nome if servico else f'#{servico_id}')
+        yield escritor.writerow([*('' if valor is None else valor for valor in linha), ' + '.join(nomes)])
+
+
+def resposta_csv(queryset, nome_arquivo: str = 'agendamentos.csv') -> StreamingHttpResponse:
+    resposta = StreamingHttpResponse(linhas_csv(queryset), content_type='text/csv; charset=utf-8')
+    resposta['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return resposta
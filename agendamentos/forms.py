@@ -5,7 +5,8 @@ from django.core.exceptions import ValidationError
 from datetime import date
 import re
 
-from .models import Pet, PerfilUsuario, Servico, Agendamento
+from .models import Pet, PerfilUsuario, Agendamento
+from .catalogo import obter_catalogo
 
 # ==============================================================================
 # Formulários de Autenticação e Perfil
@@ -117,9 +118,34 @@ class DadosPessoaisForm(forms.ModelForm):
 # Formulário de Agendamento
 # ==============================================================================
 
+# Regras compartilhadas com a importação em lote (comando importar_agendamentos)
+
+def validar_data_agendamento(data):
+    if data and data < date.today():
+        raise ValidationError('Não é possível agendar para datas passadas.')
+    return data
+
+def normalizar_cep(valor):
+    cep = re.sub(r'[^0-9]', '', valor or '')
+    if len(cep) != 8:
+        raise ValidationError('CEP deve ter 8 dígitos.')
+    return f"{cep[:5]}-{cep[5:]}"
+
+def normalizar_estado(valor):
+    estado = valor or ''
+    if estado and len(estado) != 2:
+        raise ValidationError('Estado deve ter 2 caracteres (ex: SP, RJ).')
+    return estado.upper()
+
+def choices_servicos_ativos():
+    # Avaliado a cada renderização/validação, sempre sobre o snapshot atual do catálogo
+    return [(servico.id, str(servico)) for servico in obter_catalogo().ativos()]
+
 class AgendamentoForm(forms.ModelForm):
-    servicos = forms.ModelMultipleChoiceField(
-        queryset=Servico.objects.filter(ativo=True), 
+    # Escolhas vêm do snapshot do catálogo; cleaned_data['servicos'] é uma lista de IDs
+    servicos = forms.TypedMultipleChoiceField(
+        choices=choices_servicos_ativos,
+        coerce=int,
         widget=forms.CheckboxSelectMultiple(), 
         label='Serviços *'
     )
@@ -184,32 +210,23 @@ class AgendamentoForm(forms.ModelForm):
                 self.fields['horario_inicio'].widget.attrs.pop('disabled', None)
             
             # Preenche serviços selecionados
-            self.fields['servicos'].initial = self.instance.servicos.all()
+            self.fields['servicos'].initial = list(self.instance.servicos.values_list('id', flat=True))
 
     def clean_data(self):
-        data = self.cleaned_data.get('data')
-        if data and data < date.today():
-            raise ValidationError('Não é possível agendar para datas passadas.')
-        return data
+        return validar_data_agendamento(self.cleaned_data.get('data'))
 
     def clean_cep(self):
-        cep = re.sub(r'[^0-9]', '', self.cleaned_data.get('cep', ''))
-        if len(cep) != 8:
-            raise ValidationError('CEP deve ter 8 dígitos.')
-        return f"{cep[:5]}-{cep[5:]}"
+        return normalizar_cep(self.cleaned_data.get('cep', ''))
 
     def clean_estado(self):
-        estado = self.cleaned_data.get('estado', '')
-        if estado and len(estado) != 2:
-            raise ValidationError('Estado deve ter 2 caracteres (ex: SP, RJ).')
-        return estado.upper()
+        return normalizar_estado(self.cleaned_data.get('estado', ''))
     
     def save(self, commit=True):
         agendamento = super().save(commit=False)
         servicos = self.cleaned_data['servicos']
         
-        # O cálculo do valor total é feito no form antes de salvar
-        agendamento.valor_total = sum(servico.preco for servico in servicos)
+        # O cálculo do valor total é feito no form antes de salvar (preços do catálogo)
+        agendamento.valor_total = obter_catalogo().valor_total(servicos)
         
         if commit:
             agendamento.save()
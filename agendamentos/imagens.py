@@ -0,0 +1,110 @@
+# agendamentos/imagens.py
+
+import hashlib
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .tarefas import tarefa
+
+# ==============================================================================
+# Derivados das Imagens de Serviço (WebP/JPEG em várias larguras)
+# ==============================================================================
+#
+# O upload original (muitas vezes uma foto de celular com vários MB) é
+# convertido em versões menores. Os nomes levam o hash do conteúdo
+# (<hash>-<largura>.<ext>): um arquivo já gerado nunca muda, então pode ser
+# servido com cache longo, e reenviar a mesma foto não gera nada de novo.
+
+PASTA_DERIVADOS = 'servicos_imagens/derivados'
+LARGURAS = (320, 640, 960)
+FORMATOS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+QUALIDADE = 80
+
+
+def hash_conteudo(conteudo: bytes) -> str:
+    return hashlib.sha256(conteudo).hexdigest()[:16]
+
+
+def caminho_derivado(imagem_hash: str, largura: int, extensao: str) -> str:
+    return posixpath.join(PASTA_DERIVADOS, f'{imagem_hash}-{largura}.{extensao}')
+
+
+def larguras_para(largura_original: int) -> list:
+    """Larguras padrão que não ampliam a imagem; uma imagem pequena gera só a própria largura."""
+    larguras = [largura for largura in LARGURAS if largura <= largura_original]
+    return larguras or [largura_original]
+
+
+def _codificar(imagem: Image.Image, formato: str) -> bytes:
+    saida = BytesIO()
+    if formato == 'JPEG' and imagem.mode != 'RGB':
+        imagem = imagem.convert('RGB')  # JPEG não tem transparência
+    imagem.save(saida, formato, quality=QUALIDADE, optimize=True)
+    return saida.getvalue()
+
+
+def gerar_derivados(nome_imagem: str):
+    """
+    Gera (se ainda não existirem) os derivados da imagem guardada no storage.
+    Retorna (hash, larguras geradas).
+    """
+    with default_storage.open(nome_imagem, 'rb') as arquivo:
+        conteudo = arquivo.read()
+    imagem_hash = hash_conteudo(conteudo)
+
+    with Image.open(BytesIO(conteudo)) as original:
+        # Fotos de celular vêm "deitadas" com a rotação só no EXIF
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+        larguras = larguras_para(original.width)
+
+        for largura in larguras:
+            pendentes = [
+                (extensao, formato) for extensao, formato in FORMATOS.items()
+                if not default_storage.exists(caminho_derivado(imagem_hash, largura, extensao))
+            ]
+            if not pendentes:
+                continue
+            altura = max(1, round(original.height * largura / original.width))
+            redimensionada = original.resize((largura, altura), Image.LANCZOS)
+            for extensao, formato in pendentes:
+                default_storage.save(
+                    caminho_derivado(imagem_hash, largura, extensao),
+                    ContentFile(_codificar(redimensionada, formato)),
+                )
+
+    return imagem_hash, larguras
+
+
+def srcset(imagem_hash: str, larguras, extensao: str) -> str:
+    return ', '.join(
+        f'{default_storage.url(caminho_derivado(imagem_hash, largura, extensao))} {largura}w'
+        for largura in larguras
+    )
+
+
+@tarefa(fila='imagens')
+def processar_imagem_servico(servico_id: int):
+    """
+    Gera os derivados do serviço e grava hash e larguras (sem disparar signals
+    de save). Roda no worker; enquanto isso, os templates usam a imagem original.
+    A nova versão do catálogo chega aos workers web pelo cache compartilhado,
+    que por isso precisa ser o mesmo nos dois processos (banco ou Redis).
+    """
+    from .models import Servico
+    from .catalogo import invalidar_catalogo
+
+    servico = Servico.objects.filter(pk=servico_id).only('imagem').first()
+    if servico is None:
+        return
+    if servico.imagem:
+        imagem_hash, larguras = gerar_derivados(servico.imagem.name)
+    else:
+        imagem_hash, larguras = '', []
+    Servico.objects.filter(pk=servico_id).update(imagem_hash=imagem_hash, imagem_larguras=larguras)
+    invalidar_catalogo()
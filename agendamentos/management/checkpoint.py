@@ -0,0 +1,59 @@
+# agendamentos/management/checkpoint.py
+
+import json
+import os
+import time
+
+# ==============================================================================
+# Checkpoint e Progresso de Importações em Lote
+# ==============================================================================
+
+class Checkpoint:
+    """
+    Guarda, em um arquivo ao lado da entrada (<arquivo>.progresso), quantas
+    linhas de dados já foram gravadas. Só é atualizado depois que o lote foi
+    confirmado no banco, então retomar nunca pula linhas não gravadas.
+    """
+
+    def __init__(self, caminho_entrada: str):
+        self.caminho = f"{caminho_entrada}.progresso"
+        self._tamanho_entrada = os.path.getsize(caminho_entrada)
+
+    def carregar(self) -> int:
+        try:
+            with open(self.caminho, encoding='utf-8') as arquivo:
+                dados = json.load(arquivo)
+        except (FileNotFoundError, ValueError):
+            return 0
+        # Arquivo de entrada diferente (outro tamanho): recomeça do início
+        if dados.get('tamanho') != self._tamanho_entrada:
+            return 0
+        return dados.get('linhas', 0)
+
+    def salvar(self, linhas: int):
+        temporario = f"{self.caminho}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump({'linhas': linhas, 'tamanho': self._tamanho_entrada}, arquivo)
+        os.replace(temporario, self.caminho)
+
+    def remover(self):
+        try:
+            os.remove(self.caminho)
+        except FileNotFoundError:
+            pass
+
+
+class Vazao:
+    """Mede linhas por segundo de uma importação."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.linhas = 0
+
+    def registrar(self, linhas: int):
+        self.linhas += linhas
+
+    @property
+    def por_segundo(self) -> float:
+        decorrido = time.perf_counter() - self.inicio
+        return self.linhas / decorrido if decorrido > 0 else 0.0
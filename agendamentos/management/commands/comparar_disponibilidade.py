@@ -0,0 +1,87 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from agendamentos import disponibilidade_lote, expediente
+from agendamentos.services import checar_conflito_agendamento, minimo_minutos_para, minutos_para_horario
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o cálculo vetorizado de disponibilidade (vários dias x várias durações) '
+        'com a checagem slot a slot de checar_conflito_agendamento: tempo, queries e resultado.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', help='Primeiro dia (AAAA-MM-DD, padrão: hoje)')
+        parser.add_argument('--dias', type=int, default=90, help='Quantidade de dias (padrão: 90)')
+        parser.add_argument(
+            '--duracoes', default='15,30,45,60,75,90,105,120,150,180',
+            help='Durações em minutos, separadas por vírgula',
+        )
+        parser.add_argument('--servicos', default='', help='IDs de serviços (elegibilidade dos recursos)')
+        parser.add_argument('--repeticoes', type=int, default=3, help='Execuções do cálculo vetorizado (padrão: 3)')
+        parser.add_argument('--sem-laco', action='store_true', help='Mede só o cálculo vetorizado')
+
+    def handle(self, *args, **options):
+        try:
+            inicio = date.fromisoformat(options['inicio']) if options['inicio'] else timezone.localdate()
+            duracoes = [int(d) for d in options['duracoes'].split(',') if d]
+            servicos_ids = [int(s) for s in options['servicos'].split(',') if s] or None
+        except ValueError as e:
+            raise CommandError(f'Parâmetro inválido: {e}')
+        if options['dias'] < 1 or not duracoes or min(duracoes) < 1:
+            raise CommandError('Informe ao menos um dia e durações positivas.')
+        fim = inicio + timedelta(days=options['dias'] - 1)
+
+        self.stdout.write(f'{options["dias"]} dias x {len(duracoes)} durações, de {inicio} a {fim}')
+
+        # --- Vetorizado ---
+        tempos = []
+        for _ in range(max(1, options['repeticoes'])):
+            with CaptureQueriesContext(connection) as consultas:
+                comeco = time.perf_counter()
+                lote = disponibilidade_lote.calcular_disponibilidade_lote(inicio, fim, duracoes, servicos_ids)
+                tempos.append(time.perf_counter() - comeco)
+        vetorizado = min(tempos)
+        self.stdout.write(
+            f'vetorizado: {vetorizado * 1000:.1f} ms ({len(consultas)} queries, melhor de {len(tempos)}), '
+            f'{int(lote.contagem().sum())} inícios livres'
+        )
+        if options['sem_laco']:
+            return
+
+        # --- Slot a slot (checar_conflito_agendamento para cada dia, duração e início) ---
+        atual = expediente.obter_expediente()
+        divergencias = 0
+        checagens = 0
+        with CaptureQueriesContext(connection) as consultas:
+            comeco = time.perf_counter()
+            for duracao in duracoes:
+                for dia in lote.datas:
+                    candidatos = atual.inicios(dia, minimo_minutos=minimo_minutos_para(dia))
+                    livres = [
+                        m for m in candidatos
+                        if checar_conflito_agendamento(dia, minutos_para_horario(m), duracao, servicos_ids=servicos_ids)
+                    ]
+                    checagens += len(candidatos)
+                    if livres != lote.horarios(duracao, dia):
+                        divergencias += 1
+            laco = time.perf_counter() - comeco
+
+        self.stdout.write(
+            f'slot a slot: {laco * 1000:.1f} ms ({len(consultas)} queries, {checagens} checagens)'
+        )
+        if vetorizado > 0:
+            self.stdout.write(f'ganho: {laco / vetorizado:.0f}x')
+        if divergencias:
+            self.stdout.write(self.style.WARNING(
+                f'{divergencias} combinações de dia e duração com resultado diferente '
+                '(agendamentos fora da grade de 15 minutos ocupam o slot inteiro no cálculo vetorizado).'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Resultados idênticos.'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from agendamentos.models import Servico
+from agendamentos import imagens
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera os derivados redimensionados (WebP/JPEG) das imagens de serviço já enviadas. '
+        'Por padrão processa apenas serviços sem derivados; use --todos para refazer.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true', help='Reprocessa também os que já têm derivados')
+
+    def handle(self, *args, **options):
+        servicos = Servico.objects.exclude(imagem='').exclude(imagem__isnull=True)
+        if not options['todos']:
+            servicos = servicos.filter(imagem_hash='')
+
+        processados = 0
+        falhas = 0
+        for servico_id, nome in servicos.values_list('id', 'nome'):
+            try:
+                imagens.processar_imagem_servico(servico_id)
+                processados += 1
+            except (OSError, ValueError) as e:
+                # Arquivo ausente no storage ou imagem corrompida: segue para os próximos
+                falhas += 1
+                self.stderr.write(f'{nome} (#{servico_id}): {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Derivados gerados para {processados} serviços ({falhas} falhas).'))
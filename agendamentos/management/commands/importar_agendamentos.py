@@ -0,0 +1,316 @@
+import csv
+import json
+import re
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from agendamentos.models import Agendamento, Pet
+from agendamentos.catalogo import obter_catalogo
+from agendamentos.forms import validar_data_agendamento, normalizar_cep, normalizar_estado
+from agendamentos.services import (
+    STATUS_ATIVOS, bloquear_dia, calcular_duracao_total, carregar_intervalos_dia, horario_para_minutos,
+    inicio_no_expediente,
+)
+from agendamentos.management.checkpoint import Checkpoint, Vazao
+from agendamentos import busca, ocupacao, recursos, relatorios
+
+# Campos de texto copiados como estão (depois de strip)
+CAMPOS_TEXTO = ('nome_tutor', 'nome_pet', 'tipo_pet', 'rua', 'numero', 'bairro', 'cidade', 'complemento', 'observacoes')
+
+# Erros detalhados na saída; os demais só entram na contagem
+MAX_ERROS_EXIBIDOS = 50
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa agendamentos (e os pets dos tutores) de um arquivo CSV com cabeçalho ou NDJSON, '
+        'em lotes com bulk_create. Valida cada linha com as regras do formulário de agendamento '
+        'e checa conflitos de horário em memória. Pode ser retomada com --retomar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo .csv ou .ndjson/.jsonl')
+        parser.add_argument('--formato', choices=['csv', 'ndjson'], help='Padrão: pela extensão do arquivo')
+        parser.add_argument('--lote', type=int, default=1000, help='Linhas por lote de inserção (padrão: 1000)')
+        parser.add_argument('--delimitador', default=',', help='Separador de colunas do CSV (padrão: ",")')
+        parser.add_argument('--encoding', default='utf-8', help='Codificação do arquivo (padrão: utf-8)')
+        parser.add_argument('--retomar', action='store_true', help='Continua a partir do último lote gravado')
+        parser.add_argument(
+            '--permitir-passado', action='store_true',
+            help='Aceita datas passadas (histórico do sistema antigo); as demais regras continuam valendo',
+        )
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo']
+        formato = options['formato'] or ('csv' if caminho.lower().endswith('.csv') else 'ndjson')
+        tamanho_lote = options['lote']
+        self.permitir_passado = options['permitir_passado']
+        try:
+            checkpoint = Checkpoint(caminho)
+        except OSError as e:
+            raise CommandError(f'Não foi possível abrir {caminho}: {e}')
+
+        ja_importadas = checkpoint.carregar() if options['retomar'] else 0
+        if ja_importadas:
+            self.stdout.write(f'Retomando após {ja_importadas} linhas já importadas.')
+
+        self.catalogo = obter_catalogo()
+        self.servicos_por_nome = {s.nome.strip().lower(): s.id for s in self.catalogo.ativos()}
+        self.mapas = {}  # data -> bitmap de ocupação do lote atual, lido sob o lock do dia
+        self.agendas = {}  # data -> AgendaRecursos (quando há recursos cadastrados)
+        self.recursos = recursos.obter_recursos()
+        self.erros = 0
+        self.importados = 0
+
+        vazao = Vazao()
+        gravadas = ja_importadas
+        lidas = 0
+        lote = []  # (número da linha, dados validados)
+
+        with open(caminho, newline='', encoding=options['encoding']) as arquivo:
+            registros = self._ler_csv(arquivo, options['delimitador']) if formato == 'csv' else self._ler_ndjson(arquivo)
+            for lidas, registro in enumerate(registros, start=1):
+                if lidas <= ja_importadas:
+                    continue
+
+                if registro:
+                    try:
+                        lote.append((lidas, self._validar(registro)))
+                    except ValidationError as e:
+                        self._erro(lidas, '; '.join(e.messages))
+
+                if lidas - gravadas >= tamanho_lote:
+                    self._gravar(lote)
+                    vazao.registrar(lidas - gravadas)
+                    gravadas = lidas
+                    checkpoint.salvar(gravadas)
+                    lote = []
+                    self.stdout.write(f'{gravadas} linhas ({vazao.por_segundo:.0f} linhas/s)')
+
+        if lidas > gravadas:
+            self._gravar(lote)
+            vazao.registrar(lidas - gravadas)
+
+        checkpoint.remover()
+        self.stdout.write(self.style.SUCCESS(
+            f'Importação concluída: {self.importados} agendamentos importados, {self.erros} linhas rejeitadas, '
+            f'{vazao.linhas} linhas lidas nesta execução ({vazao.por_segundo:.0f} linhas/s).'
+        ))
+
+    # --------------------------------------------------------------------------
+    # Leitura
+    # --------------------------------------------------------------------------
+
+    def _ler_csv(self, arquivo, delimitador):
+        leitor = csv.reader(arquivo, delimiter=delimitador)
+        cabecalho = [nome.strip().lower() for nome in next(leitor, [])]
+        for linha in leitor:
+            yield dict(zip(cabecalho, linha)) if any(linha) else None
+
+    def _ler_ndjson(self, arquivo):
+        for texto in arquivo:
+            texto = texto.strip()
+            if not texto:
+                yield None
+                continue
+            try:
+                registro = json.loads(texto)
+            except ValueError:
+                registro = {'_invalido': 'JSON inválido'}
+            yield registro if isinstance(registro, dict) else {'_invalido': 'Linha não é um objeto JSON'}
+
+    # --------------------------------------------------------------------------
+    # Validação (mesmas regras do AgendamentoForm)
+    # --------------------------------------------------------------------------
+
+    def _validar(self, registro):
+        if '_invalido' in registro:
+            raise ValidationError(registro['_invalido'])
+
+        dados = {campo: str(registro.get(campo) or '').strip() for campo in CAMPOS_TEXTO}
+        dados['usuario'] = str(registro.get('usuario') or '').strip()
+        dados['raca'] = str(registro.get('raca') or '').strip()
+        dados['forma_pagamento'] = str(registro.get('forma_pagamento') or '').strip()
+        dados['status'] = str(registro.get('status') or 'agendado').strip()
+
+        erros = []
+        try:
+            dados['data'] = self._data(str(registro.get('data') or '').strip())
+            if not self.permitir_passado:
+                validar_data_agendamento(dados['data'])
+        except ValidationError as e:
+            erros.extend(e.messages)
+        try:
+            dados['horario_inicio'] = datetime.strptime(str(registro.get('horario_inicio') or '').strip(), '%H:%M').time()
+        except ValueError:
+            erros.append('Horário de início deve estar no formato HH:MM.')
+        for campo, normalizar in (('cep', normalizar_cep), ('estado', normalizar_estado)):
+            try:
+                dados[campo] = normalizar(str(registro.get(campo) or '').strip())
+            except ValidationError as e:
+                erros.extend(e.messages)
+        try:
+            dados['servicos'] = self._servicos(registro.get('servicos'))
+        except ValidationError as e:
+            erros.extend(e.messages)
+        # Quem ocupa a agenda começa em um dos inícios do expediente do dia (fora de pausas,
+        # fechamentos e feriados): a mesma regra de checar_conflito_agendamento
+        if (
+            dados['status'] in STATUS_ATIVOS and 'data' in dados and 'horario_inicio' in dados
+            and not inicio_no_expediente(dados['data'], horario_para_minutos(dados['horario_inicio']))
+        ):
+            erros.append('Horário fora do expediente do dia.')
+        if erros:
+            raise ValidationError(erros)
+
+        dados['duracao_total_minutos'] = calcular_duracao_total(dados['servicos'])
+        valor = registro.get('valor_total')
+        dados['valor_total'] = valor if valor not in (None, '') else self.catalogo.valor_total(dados['servicos'])
+
+        # Tamanhos, obrigatórios e choices dos campos do modelo, como no ModelForm
+        campos_modelo = {k: v for k, v in dados.items() if k not in ('usuario', 'raca', 'servicos')}
+        Agendamento(**campos_modelo).clean_fields(exclude=['usuario', 'pet', 'complemento', 'observacoes'])
+        return dados
+
+    def _data(self, texto):
+        for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+            try:
+                return datetime.strptime(texto, formato).date()
+            except ValueError:
+                pass
+        raise ValidationError('Data deve estar no formato AAAA-MM-DD ou DD/MM/AAAA.')
+
+    def _servicos(self, valor):
+        """Aceita lista (NDJSON) ou texto separado por '|' / ',' com IDs ou nomes de serviços ativos."""
+        itens = valor if isinstance(valor, list) else re.split(r'[|,]', str(valor or ''))
+        ids = []
+        for item in (str(i).strip() for i in itens):
+            if not item:
+                continue
+            servico_id = int(item) if item.isdigit() else self.servicos_por_nome.get(item.lower())
+            servico = self.catalogo.get(servico_id) if servico_id else None
+            if servico is None or not servico.ativo:
+                raise ValidationError(f'Serviço desconhecido ou inativo: {item}.')
+            ids.append(servico.id)
+        if not ids:
+            raise ValidationError('Informe ao menos um serviço.')
+        return list(dict.fromkeys(ids))
+
+    def _erro(self, linha, mensagem):
+        self.erros += 1
+        if self.erros <= MAX_ERROS_EXIBIDOS:
+            self.stderr.write(f'Linha {linha}: {mensagem}')
+        elif self.erros == MAX_ERROS_EXIBIDOS + 1:
+            self.stderr.write('Demais erros omitidos.')
+
+    # --------------------------------------------------------------------------
+    # Gravação em lote
+    # --------------------------------------------------------------------------
+
+    def _gravar(self, lote):
+        if not lote:
+            return
+        dias_ativos = sorted({d['data'] for _, d in lote if d['status'] in STATUS_ATIVOS})
+
+        with transaction.atomic():
+            # Trava os dias (em ordem, sem deadlock entre importações) e relê a ocupação
+            # de cada um já com o lock: entre um lote e outro o dia fica livre e o site
+            # (ou outra importação) pode ter agendado nele
+            self.mapas, self.agendas = {}, {}
+            for dia in dias_ativos:
+                bloquear_dia(dia)
+                if self.recursos:
+                    self.agendas[dia] = recursos.AgendaRecursos(
+                        recursos.carregar_intervalos_recursos(dia), self.recursos,
+                    )
+                else:
+                    self.mapas[dia] = ocupacao.construir_mapa(carregar_intervalos_dia(dia))
+
+            usuarios = dict(User.objects.filter(
+                username__in={d['usuario'] for _, d in lote if d['usuario']}
+            ).values_list('username', 'id'))
+
+            aceitos = []
+            for linha, dados in lote:
+                if dados['usuario'] and dados['usuario'] not in usuarios:
+                    self._erro(linha, f"Usuário inexistente: {dados['usuario']}.")
+                    continue
+                if dados['status'] in STATUS_ATIVOS:
+                    inicio = horario_para_minutos(dados['horario_inicio'])
+                    fim = inicio + dados['duracao_total_minutos']
+                    if not self._ocupar(dados, inicio, fim):
+                        self._erro(linha, f"Conflito de horário em {dados['data']} às {dados['horario_inicio']:%H:%M}.")
+                        continue
+                aceitos.append(dados)
+
+            pets, novos_pets = self._pets(aceitos, usuarios)
+
+            agendamentos = Agendamento.objects.bulk_create([
+                Agendamento(
+                    usuario_id=usuarios.get(dados['usuario']),
+                    pet_id=pets.get((usuarios.get(dados['usuario']), dados['nome_pet'])),
+                    **{k: v for k, v in dados.items() if k not in ('usuario', 'raca', 'servicos')},
+                )
+                for dados in aceitos
+            ])
+            through = Agendamento.servicos.through
+            through.objects.bulk_create([
+                through(agendamento_id=agendamento.pk, servico_id=servico_id)
+                for agendamento, dados in zip(agendamentos, aceitos)
+                for servico_id in dados['servicos']
+            ])
+
+            # bulk_create não dispara signals: índice de busca e resumos são atualizados aqui
+            busca.indexar('agendamento', [a.pk for a in agendamentos])
+            busca.indexar('pet', novos_pets)
+            for dia in sorted({dados['data'] for dados in aceitos}):
+                relatorios.recalcular_dia(dia)
+
+        for dia in dias_ativos:
+            ocupacao.invalidar_dia(dia)
+        self.importados += len(aceitos)
+
+    def _ocupar(self, dados, inicio, fim) -> bool:
+        """Reserva o intervalo na ocupação do lote (atribuindo um recurso, se houver)."""
+        if self.recursos:
+            agenda = self.agendas[dados['data']]
+            elegiveis = [r for r in self.recursos if r.atende(dados['servicos'])]
+            recurso_id = agenda.escolher(elegiveis, inicio, fim)
+            if recurso_id is None:
+                return False
+            agenda.ocupar(recurso_id, inicio, fim)
+            dados['recurso_id'] = recurso_id
+            return True
+        mapa = self.mapas[dados['data']]
+        if not ocupacao.intervalo_livre(mapa, inicio, fim):
+            return False
+        self.mapas[dados['data']] = mapa | ocupacao.mascara_intervalo(inicio, fim)
+        return True
+
+    def _pets(self, aceitos, usuarios):
+        """Reaproveita o pet do tutor com o mesmo nome ou cria os que faltam, em uma inserção."""
+        chaves = {(usuarios[d['usuario']], d['nome_pet']): d for d in aceitos if d['usuario']}
+        if not chaves:
+            return {}, []
+
+        pets = {
+            (dono_id, nome): pet_id
+            for dono_id, nome, pet_id in Pet.objects.filter(
+                dono_id__in={dono for dono, _ in chaves}, nome__in={nome for _, nome in chaves},
+            ).values_list('dono_id', 'nome', 'id')
+        }
+        tipos = dict(Pet.TIPO_CHOICES)
+        novos = Pet.objects.bulk_create([
+            Pet(
+                dono_id=dono_id, nome=nome, raca=dados['raca'][:100],
+                tipo=dados['tipo_pet'] if dados['tipo_pet'] in tipos else 'outro',
+            )
+            for (dono_id, nome), dados in chaves.items() if (dono_id, nome) not in pets
+        ])
+        for pet in novos:
+            pets[(pet.dono_id, pet.nome)] = pet.pk
+        return pets, [pet.pk for pet in novos]
@@ -0,0 +1,121 @@
+import csv
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from agendamentos.models import CepLocal
+from agendamentos.management.checkpoint import Checkpoint, Vazao
+
+# Nomes de coluna aceitos para cada campo (cabeçalhos comuns das bases públicas)
+COLUNAS = {
+    'cep': ('cep',),
+    'rua': ('rua', 'logradouro', 'endereco'),
+    'bairro': ('bairro',),
+    'cidade': ('cidade', 'localidade', 'municipio'),
+    'estado': ('estado', 'uf'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa uma base de CEPs (CSV com cabeçalho) para a tabela local em lotes, '
+        'com memória constante. Pode ser retomada de onde parou com --retomar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo CSV')
+        parser.add_argument('--lote', type=int, default=5000, help='Linhas por lote de inserção (padrão: 5000)')
+        parser.add_argument('--delimitador', default=',', help='Separador de colunas (padrão: ",")')
+        parser.add_argument('--encoding', default='utf-8', help='Codificação do arquivo (padrão: utf-8)')
+        parser.add_argument('--retomar', action='store_true', help='Continua a partir do último lote gravado')
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo']
+        tamanho_lote = options['lote']
+        try:
+            checkpoint = Checkpoint(caminho)
+        except OSError as e:
+            raise CommandError(f'Não foi possível abrir {caminho}: {e}')
+
+        ja_importadas = checkpoint.carregar() if options['retomar'] else 0
+        if ja_importadas:
+            self.stdout.write(f'Retomando após {ja_importadas} linhas já importadas.')
+
+        vazao = Vazao()
+        gravadas = ja_importadas  # Linhas de dados já confirmadas no banco
+        lidas = 0
+        ignoradas = 0
+        lote = {}  # cep -> CepLocal (um CEP repetido no mesmo lote fica com a última linha)
+
+        with open(caminho, newline='', encoding=options['encoding']) as arquivo:
+            leitor = csv.reader(arquivo, delimiter=options['delimitador'])
+            indices = self._mapear_colunas(next(leitor, []))
+
+            for lidas, linha in enumerate(leitor, start=1):
+                if lidas <= ja_importadas:
+                    continue
+
+                cep = self._linha_para_cep(linha, indices)
+                if cep is None:
+                    ignoradas += 1
+                else:
+                    lote[cep.cep] = cep
+
+                if lidas - gravadas >= tamanho_lote:
+                    self._gravar(lote)
+                    vazao.registrar(lidas - gravadas)
+                    gravadas = lidas
+                    checkpoint.salvar(gravadas)
+                    lote = {}
+                    self.stdout.write(f'{gravadas} linhas ({vazao.por_segundo:.0f} linhas/s)')
+
+        if lidas > gravadas:
+            self._gravar(lote)
+            vazao.registrar(lidas - gravadas)
+
+        checkpoint.remover()
+        self.stdout.write(self.style.SUCCESS(
+            f'Importação concluída: {vazao.linhas} linhas nesta execução, {ignoradas} ignoradas '
+            f'({vazao.por_segundo:.0f} linhas/s).'
+        ))
+
+    def _mapear_colunas(self, cabecalho):
+        nomes = [nome.strip().lower() for nome in cabecalho]
+        indices = {}
+        for campo, aceitos in COLUNAS.items():
+            for nome in aceitos:
+                if nome in nomes:
+                    indices[campo] = nomes.index(nome)
+                    break
+        faltando = {'cep', 'cidade', 'estado'} - indices.keys()
+        if faltando:
+            raise CommandError(f'Colunas obrigatórias ausentes no cabeçalho: {", ".join(sorted(faltando))}')
+        return indices
+
+    def _linha_para_cep(self, linha, indices):
+        try:
+            valores = {campo: linha[indice].strip() for campo, indice in indices.items()}
+        except IndexError:
+            return None
+        cep = re.sub(r'[^0-9]', '', valores.pop('cep'))
+        if len(cep) != 8:
+            return None
+        return CepLocal(
+            cep=cep,
+            rua=valores.get('rua', '')[:200],
+            bairro=valores.get('bairro', '')[:100],
+            cidade=valores['cidade'][:100],
+            estado=valores['estado'][:2].upper(),
+        )
+
+    def _gravar(self, lote):
+        if not lote:
+            return
+        with transaction.atomic():
+            CepLocal.objects.bulk_create(
+                list(lote.values()),
+                update_conflicts=True,
+                unique_fields=['cep'],
+                update_fields=['rua', 'bairro', 'cidade', 'estado'],
+            )
@@ -0,0 +1,236 @@
+import random
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from agendamentos.models import Agendamento, CepLocal, PerfilUsuario, Pet, Servico
+from agendamentos.catalogo import obter_catalogo
+from agendamentos.services import carregar_intervalos_periodo
+from agendamentos.management.checkpoint import Vazao
+from agendamentos import busca, expediente, ocupacao, relatorios
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Felipe', 'Gabriela', 'Heitor', 'Isabela', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Tiago', 'Vanessa', 'William']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Pereira', 'Costa', 'Rodrigues', 'Almeida',
+              'Nascimento', 'Lima', 'Araújo', 'Fernandes', 'Carvalho', 'Gomes', 'Ribeiro']
+NOMES_PETS = ['Rex', 'Mel', 'Thor', 'Luna', 'Bob', 'Nina', 'Fred', 'Amora', 'Toby', 'Pipoca',
+              'Max', 'Belinha', 'Simba', 'Lola', 'Zeus', 'Mia', 'Pretinha', 'Billy', 'Kiara', 'Paçoca']
+RACAS = {
+    'cachorro': ['SRD', 'Poodle', 'Shih Tzu', 'Labrador', 'Yorkshire', 'Golden Retriever'],
+    'gato': ['SRD', 'Siamês', 'Persa', 'Maine Coon'],
+    'passaro': ['Calopsita', 'Periquito'],
+    'roedor': ['Hamster', 'Porquinho-da-índia'],
+    'outro': [''],
+}
+TIPOS_PETS = ['cachorro'] * 6 + ['gato'] * 3 + ['passaro', 'roedor', 'outro']
+
+# (nome, duração em minutos, preço)
+SERVICOS = [
+    ('Banho', 45, '50.00'), ('Tosa Completa', 60, '80.00'), ('Tosa Higiênica', 30, '40.00'),
+    ('Hidratação', 30, '35.00'), ('Corte de Unhas', 15, '20.00'), ('Limpeza de Ouvidos', 15, '20.00'),
+    ('Escovação Dental', 15, '25.00'), ('Banho Medicamentoso', 60, '70.00'), ('Consulta Veterinária', 30, '120.00'),
+    ('Vacinação', 15, '90.00'), ('Curativo', 30, '60.00'), ('Desembolo', 45, '55.00'),
+]
+CIDADES = [('São Paulo', 'SP'), ('Campinas', 'SP'), ('Rio de Janeiro', 'RJ'), ('Belo Horizonte', 'MG'),
+           ('Curitiba', 'PR'), ('Porto Alegre', 'RS'), ('Salvador', 'BA'), ('Recife', 'PE')]
+BAIRROS = ['Centro', 'Jardim América', 'Vila Nova', 'Boa Vista', 'Santa Cecília', 'Liberdade', 'Bela Vista']
+RUAS = ['Rua das Flores', 'Avenida Brasil', 'Rua XV de Novembro', 'Rua São José', 'Avenida Paulista',
+        'Rua dos Andradas', 'Rua Sete de Setembro']
+FORMAS_PAGAMENTO = [forma for forma, _ in Agendamento.FORMA_PAGAMENTO_CHOICES]
+
+
+class Command(BaseCommand):
+    help = (
+        'Popula o banco com dados sintéticos em volume realista, com bulk_create: usuários '
+        '(com perfil e pets), serviços, CEPs locais e anos de histórico de agendamentos sem '
+        'sobreposição. Para ambientes de teste de carga, nunca para produção.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=500, help='Usuários a criar (padrão: 500)')
+        parser.add_argument('--pets', type=int, default=2, help='Pets por usuário (padrão: 2)')
+        parser.add_argument('--servicos', type=int, default=len(SERVICOS), help='Serviços a criar (padrão: %(default)s)')
+        parser.add_argument('--ceps', type=int, default=200, help='CEPs locais a criar (padrão: 200)')
+        parser.add_argument('--dias-historico', type=int, default=730, help='Dias passados com agendamentos (padrão: 730)')
+        parser.add_argument('--dias-futuros', type=int, default=30, help='Dias futuros com agendamentos (padrão: 30)')
+        parser.add_argument('--por-dia', type=int, default=12, help='Agendamentos por dia, no máximo (padrão: 12)')
+        parser.add_argument('--lote', type=int, default=2000, help='Agendamentos por lote de inserção (padrão: 2000)')
+        parser.add_argument('--prefixo', default='carga', help='Prefixo dos usernames (padrão: carga)')
+        parser.add_argument('--senha', default='carga123', help='Senha de todos os usuários criados')
+        parser.add_argument('--semente', type=int, default=1, help='Semente aleatória (padrão: 1)')
+
+    def handle(self, *args, **options):
+        if min(options['usuarios'], options['pets'], options['por_dia'], options['lote']) < 1:
+            raise CommandError('Usuários, pets, agendamentos por dia e lote devem ser positivos.')
+        if User.objects.filter(username__startswith=options['prefixo']).exists():
+            raise CommandError(f"Já existem usuários com o prefixo '{options['prefixo']}'. Use outro --prefixo.")
+
+        self.aleatorio = random.Random(options['semente'])
+        vazao = Vazao()
+
+        with transaction.atomic():
+            self._servicos(options['servicos'])
+            ceps = self._ceps(options['ceps'])
+            usuarios = self._usuarios(options['usuarios'], options['prefixo'], options['senha'])
+            pets = self._pets(usuarios, options['pets'])
+        vazao.registrar(len(usuarios) + len(pets))
+        self.stdout.write(f'{len(usuarios)} usuários, {len(pets)} pets e {len(ceps)} CEPs criados.')
+
+        total = self._agendamentos(options, usuarios, pets, ceps, vazao)
+        self.stdout.write(self.style.SUCCESS(
+            f'Dados criados: {total} agendamentos ({vazao.por_segundo:.0f} linhas/s). '
+            f"Login: {options['prefixo']}000001 / {options['senha']}"
+        ))
+
+    # --------------------------------------------------------------------------
+    # Cadastros
+    # --------------------------------------------------------------------------
+
+    def _servicos(self, quantidade):
+        """Cria os serviços que faltam, pelo nome: rodar de novo (com outro --prefixo) reaproveita os existentes."""
+        for i in range(quantidade):
+            nome, duracao, preco = SERVICOS[i % len(SERVICOS)]
+            if i >= len(SERVICOS):
+                nome = f'{nome} {i // len(SERVICOS) + 1}'
+            Servico.objects.get_or_create(nome=nome, defaults={'duracao_minutos': duracao, 'preco': Decimal(preco)})
+
+    def _ceps(self, quantidade):
+        ceps = []
+        for _ in range(quantidade):
+            cidade, estado = self.aleatorio.choice(CIDADES)
+            ceps.append(CepLocal(
+                cep=f'{self.aleatorio.randrange(10**7, 10**8):08d}', rua=self.aleatorio.choice(RUAS),
+                bairro=self.aleatorio.choice(BAIRROS), cidade=cidade, estado=estado,
+            ))
+        CepLocal.objects.bulk_create(ceps, ignore_conflicts=True)
+        return ceps
+
+    def _usuarios(self, quantidade, prefixo, senha):
+        senha_hash = make_password(senha)  # Um único hash: o algoritmo é lento de propósito
+        usuarios = User.objects.bulk_create([
+            User(
+                username=f'{prefixo}{i:06d}', password=senha_hash, email=f'{prefixo}{i:06d}@exemplo.com',
+                first_name=self.aleatorio.choice(NOMES), last_name=self.aleatorio.choice(SOBRENOMES),
+            )
+            for i in range(1, quantidade + 1)
+        ])
+        perfis = PerfilUsuario.objects.bulk_create([
+            PerfilUsuario(
+                usuario=usuario,
+                cpf=f'{self.aleatorio.randrange(10**10, 10**11):011d}',
+                telefone=f'(11) 9{self.aleatorio.randrange(10**7, 10**8)}',
+            )
+            for usuario in usuarios
+        ])
+        busca.indexar('perfil', [perfil.pk for perfil in perfis])
+        return usuarios
+
+    def _pets(self, usuarios, por_usuario):
+        novos = []
+        for usuario in usuarios:
+            for _ in range(por_usuario):
+                tipo = self.aleatorio.choice(TIPOS_PETS)
+                novos.append(Pet(
+                    dono=usuario, nome=self.aleatorio.choice(NOMES_PETS), tipo=tipo,
+                    raca=self.aleatorio.choice(RACAS[tipo]), idade=self.aleatorio.randint(0, 15),
+                ))
+        pets = Pet.objects.bulk_create(novos)
+        busca.indexar('pet', [pet.pk for pet in pets])
+        return pets
+
+    # --------------------------------------------------------------------------
+    # Histórico de agendamentos
+    # --------------------------------------------------------------------------
+
+    def _status(self, dia, hoje):
+        sorteio = self.aleatorio.random()
+        if dia < hoje:
+            return 'realizado' if sorteio < 0.85 else 'cancelado'
+        return 'agendado' if sorteio < 0.7 else 'confirmado' if sorteio < 0.95 else 'cancelado'
+
+    def _agendamentos_do_dia(self, dia, hoje, maximo, mapa, usuarios, pets_por_dono, ceps, catalogo, servicos):
+        """Agendamentos do dia sem sobreposição (o bitmap de ocupação do dia fica em memória)."""
+        inicios = list(expediente.obter_expediente().inicios(dia))
+        self.aleatorio.shuffle(inicios)
+        dados = []
+        for inicio in inicios:
+            if len(dados) >= maximo:
+                break
+            escolhidos = self.aleatorio.sample(servicos, k=min(len(servicos), self.aleatorio.choice((1, 1, 2, 3))))
+            duracao = max(15, catalogo.duracao_total(escolhidos))
+            if not ocupacao.intervalo_livre(mapa, inicio, inicio + duracao):
+                continue
+            mapa |= ocupacao.mascara_intervalo(inicio, inicio + duracao)
+
+            usuario = self.aleatorio.choice(usuarios)
+            pet = self.aleatorio.choice(pets_por_dono[usuario.pk])
+            cep = self.aleatorio.choice(ceps) if ceps else None
+            status = self._status(dia, hoje)
+            dados.append((Agendamento(
+                usuario=usuario, pet=pet, nome_tutor=f'{usuario.first_name} {usuario.last_name}',
+                nome_pet=pet.nome, tipo_pet=pet.tipo, data=dia,
+                horario_inicio=time(inicio // 60, inicio % 60), duracao_total_minutos=duracao,
+                cep=f'{cep.cep[:5]}-{cep.cep[5:]}' if cep else '01001-000',
+                rua=cep.rua if cep else 'Praça da Sé', numero=str(self.aleatorio.randint(1, 3000)),
+                bairro=cep.bairro if cep else 'Sé', cidade=cep.cidade if cep else 'São Paulo',
+                estado=cep.estado if cep else 'SP',
+                forma_pagamento=self.aleatorio.choice(FORMAS_PAGAMENTO),
+                valor_total=catalogo.valor_total(escolhidos), status=status,
+                motivo_cancelamento='Cancelado pelo tutor' if status == 'cancelado' else '',
+            ), escolhidos))
+        return dados
+
+    def _agendamentos(self, options, usuarios, pets, ceps, vazao):
+        catalogo = obter_catalogo()
+        servicos = [servico.id for servico in catalogo.ativos()]
+        if not servicos:
+            raise CommandError('Nenhum serviço ativo: use --servicos maior que zero.')
+        pets_por_dono = {}
+        for pet in pets:
+            pets_por_dono.setdefault(pet.dono_id, []).append(pet)
+
+        hoje = timezone.localdate()
+        dia = hoje - timedelta(days=options['dias_historico'])
+        ultimo = hoje + timedelta(days=options['dias_futuros'])
+        # Agendamentos que já existem no período também ocupam a agenda (uma query)
+        existentes = carregar_intervalos_periodo(dia, ultimo)
+        lote = []
+        total = 0
+        while dia <= ultimo:
+            maximo = self.aleatorio.randint(options['por_dia'] // 2, options['por_dia'])
+            mapa = ocupacao.construir_mapa(existentes.get(dia, []))
+            lote.extend(self._agendamentos_do_dia(
+                dia, hoje, maximo, mapa, usuarios, pets_por_dono, ceps, catalogo, servicos,
+            ))
+            if len(lote) >= options['lote'] or dia == ultimo:
+                self._gravar(lote)
+                total += len(lote)
+                vazao.registrar(len(lote))
+                self.stdout.write(f'{total} agendamentos até {dia} ({vazao.por_segundo:.0f} linhas/s)')
+                lote = []
+            dia += timedelta(days=1)
+        return total
+
+    def _gravar(self, lote):
+        if not lote:
+            return
+        dias = sorted({agendamento.data for agendamento, _ in lote})
+        with transaction.atomic():
+            agendamentos = Agendamento.objects.bulk_create([agendamento for agendamento, _ in lote])
+            through = Agendamento.servicos.through
+            through.objects.bulk_create([
+                through(agendamento_id=agendamento.pk, servico_id=servico_id)
+                for agendamento, (_, servicos_ids) in zip(agendamentos, lote)
+                for servico_id in servicos_ids
+            ])
+            # bulk_create não dispara signals: índice de busca e resumos são atualizados aqui
+            busca.indexar('agendamento', [agendamento.pk for agendamento in agendamentos])
+            for dia in dias:
+                relatorios.recalcular_dia(dia)
+        for dia in dias:
+            ocupacao.invalidar_dia(dia)
@@ -0,0 +1,38 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agendamentos import relatorios
+from agendamentos.management.checkpoint import Vazao
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula a tabela de resumos diários a partir dos agendamentos. Sem datas, '
+        'reconstrói todos os dias que têm agendamentos ou resumos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', help='Primeiro dia (AAAA-MM-DD)')
+        parser.add_argument('--fim', help='Último dia (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        try:
+            inicio = date.fromisoformat(options['inicio']) if options['inicio'] else None
+            fim = date.fromisoformat(options['fim']) if options['fim'] else None
+        except ValueError as e:
+            raise CommandError(f'Data inválida: {e}')
+        if inicio and fim and fim < inicio:
+            raise CommandError('A data final deve ser igual ou posterior à inicial.')
+
+        vazao = Vazao()
+        dias = relatorios.dias_com_dados(inicio, fim)
+        for numero, dia in enumerate(dias, start=1):
+            relatorios.recalcular_dia(dia)
+            vazao.registrar(1)
+            if numero % 100 == 0:
+                self.stdout.write(f'{numero}/{len(dias)} dias ({vazao.por_segundo:.0f} dias/s)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumos recalculados para {len(dias)} dias ({vazao.por_segundo:.0f} dias/s).'
+        ))
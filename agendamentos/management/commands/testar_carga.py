@@ -0,0 +1,317 @@
+import http.cookiejar
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import timedelta
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from agendamentos.models import CepLocal, Pet
+from agendamentos.catalogo import obter_catalogo
+from agendamentos.services import gerar_horarios_possiveis
+
+# Peso padrão de cada endpoint na mistura de tráfego
+MIX_PADRAO = 'home=15,disponibilidade=45,agendar=10,meus_agendamentos=20,cep=10'
+
+
+def percentil(valores_ordenados: list, p: float) -> float:
+    """Percentil pelo método do posto mais próximo (valores já ordenados)."""
+    if not valores_ordenados:
+        return 0.0
+    posto = max(1, math.ceil(p / 100 * len(valores_ordenados)))
+    return valores_ordenados[posto - 1]
+
+
+class Estatisticas:
+    """Latências (ms), queries e erros por endpoint, compartilhados entre as threads."""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.latencias = {}
+        self.queries = {}
+        self.erros = {}
+
+    def registrar(self, endpoint: str, latencia_ms: float, queries, erro: bool):
+        with self._trava:
+            self.latencias.setdefault(endpoint, []).append(latencia_ms)
+            if queries is not None:  # Pelo servidor HTTP as queries não são visíveis
+                self.queries.setdefault(endpoint, []).append(queries)
+            self.erros[endpoint] = self.erros.get(endpoint, 0) + erro
+
+# ------------------------------------------------------------------------------
+# Clientes (mesma interface: requisitar devolve o status HTTP)
+# ------------------------------------------------------------------------------
+
+class ClienteInterno:
+    """Cliente de testes do Django no próprio processo, já autenticado."""
+
+    def __init__(self, host, usuario):
+        self.cliente = Client(HTTP_HOST=host)
+        self.cliente.force_login(usuario)
+
+    def requisitar(self, metodo, caminho, params=None, dados=None) -> int:
+        if metodo == 'POST':
+            return self.cliente.post(caminho, dados, secure=True).status_code
+        return self.cliente.get(caminho, params, secure=True).status_code
+
+
+class _SemRedirecionar(urllib.request.HTTPRedirectHandler):
+    """Mede só a requisição pedida: redirecionamentos voltam como HTTPError com o status 3xx."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class ClienteHttp:
+    """Sessão HTTP (cookies e CSRF) contra um servidor de verdade, autenticada pelo formulário de login."""
+
+    def __init__(self, base, username, senha, timeout):
+        self.base = base.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.abridor = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _SemRedirecionar)
+
+        caminho = reverse('login')
+        self.requisitar('GET', caminho)  # Recebe o cookie de CSRF
+        status = self.requisitar('POST', caminho, dados={'username': username, 'password': senha})
+        if status != 302:
+            raise CommandError(f'Falha no login de {username} em {self.base} (HTTP {status}).')
+
+    def _csrf(self) -> str:
+        return next((cookie.value for cookie in self.cookies if cookie.name == settings.CSRF_COOKIE_NAME), '')
+
+    def requisitar(self, metodo, caminho, params=None, dados=None) -> int:
+        url = self.base + caminho + (f'?{urlencode(params, doseq=True)}' if params else '')
+        corpo = None
+        if dados is not None:
+            corpo = urlencode({**dados, 'csrfmiddlewaretoken': self._csrf()}, doseq=True).encode()
+        pedido = urllib.request.Request(url, data=corpo, method=metodo, headers={'Referer': self.base + caminho})
+        try:
+            with self.abridor.open(pedido, timeout=self.timeout) as resposta:
+                resposta.read()
+                return resposta.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+class Command(BaseCommand):
+    help = (
+        'Teste de carga: várias threads repetem uma mistura de tráfego (home, horários disponíveis, '
+        'agendamentos, meus agendamentos e CEP) com usuários criados por popular_dados e mostram '
+        'vazão, latência p50/p95/p99 e queries por endpoint. Sem --url usa o cliente de testes do '
+        'Django no próprio processo (números só comparáveis entre si); com --url, o servidor de verdade. '
+        'O endpoint "agendar" grava agendamentos: exige --permitir-escrita.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=500, help='Total de requisições medidas (padrão: 500)')
+        parser.add_argument('--concorrencia', type=int, default=4, help='Threads simultâneas (padrão: 4)')
+        parser.add_argument('--mix', default=MIX_PADRAO, help=f'Pesos por endpoint (padrão: {MIX_PADRAO})')
+        parser.add_argument('--aquecimento', type=int, default=10, help='Requisições iniciais não medidas, por thread')
+        parser.add_argument('--prefixo', default='carga', help='Prefixo dos usuários de popular_dados (padrão: carga)')
+        parser.add_argument('--dias', type=int, default=30, help='Datas futuras sorteadas nas consultas (padrão: 30)')
+        parser.add_argument('--semente', type=int, default=1, help='Semente aleatória (padrão: 1)')
+        parser.add_argument(
+            '--url', help='Servidor a testar por HTTP (ex.: http://127.0.0.1:8000), usando o mesmo banco populado',
+        )
+        parser.add_argument('--senha', default='carga123', help='Senha dos usuários de popular_dados (modo --url)')
+        parser.add_argument('--timeout', type=float, default=30, help='Timeout de cada requisição HTTP (s)')
+        parser.add_argument(
+            '--permitir-escrita', action='store_true',
+            help='Confirma que o banco é de testes: o endpoint "agendar" grava agendamentos de verdade',
+        )
+
+    def handle(self, *args, **options):
+        self.mix = self._mix(options['mix'])
+        if options['requisicoes'] < 1 or options['concorrencia'] < 1 or options['dias'] < 1:
+            raise CommandError('Requisições, concorrência e dias devem ser positivos.')
+        self.url = options['url']
+        if self.url and urlsplit(self.url).scheme not in ('http', 'https'):
+            raise CommandError(f'URL inválida: {self.url}')
+        if not self.url and not settings.DEBUG:
+            raise CommandError(
+                'DEBUG=False: o banco configurado pode ser o de produção. Rode em processo só com um '
+                'banco de testes (DEBUG=True) ou meça um servidor com --url.'
+            )
+        if self.mix.get('agendar') and not options['permitir_escrita']:
+            raise CommandError(
+                'O endpoint "agendar" grava agendamentos de verdade. Use um banco de testes e passe '
+                '--permitir-escrita, ou tire agendar da mistura (--mix).'
+            )
+
+        self.usuarios = list(User.objects.filter(username__startswith=options['prefixo']).values_list('id', flat=True))
+        if not self.usuarios:
+            raise CommandError(f"Nenhum usuário com o prefixo '{options['prefixo']}': rode popular_dados antes.")
+        self.servicos = [servico.id for servico in obter_catalogo().ativos()]
+        if not self.servicos:
+            raise CommandError('Nenhum serviço ativo.')
+        self.ceps = list(CepLocal.objects.values_list('cep', 'rua', 'bairro', 'cidade', 'estado')[:1000])
+        hoje = timezone.localdate()
+        self.datas = [hoje + timedelta(days=i) for i in range(1, options['dias'] + 1)]
+        self.host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h not in ('*', '')), 'localhost')
+        self.senha = options['senha']
+        self.timeout = options['timeout']
+
+        self.estatisticas = Estatisticas()
+        self._restantes = options['requisicoes']
+        self._trava = threading.Lock()
+
+        self.stdout.write(
+            f"{options['requisicoes']} requisições, {options['concorrencia']} threads, "
+            f"{len(self.usuarios)} usuários, mistura: {options['mix']}, alvo: {self.url or 'em processo'}"
+        )
+        # Logins em sequência, antes da carga (cada um grava uma sessão)
+        sessoes = [self._sessao(random.Random(options['semente'] + i)) for i in range(options['concorrencia'])]
+        inicio = time.perf_counter()
+        if options['concorrencia'] == 1:
+            self._trabalhar(sessoes[0], options['aquecimento'])
+        else:
+            threads = [
+                threading.Thread(target=self._trabalhar, args=(sessao, options['aquecimento']))
+                for sessao in sessoes
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        decorrido = time.perf_counter() - inicio
+        self._relatorio(decorrido)
+
+    def _mix(self, texto):
+        pesos = {}
+        try:
+            for item in texto.split(','):
+                nome, peso = item.split('=')
+                pesos[nome.strip()] = int(peso)
+        except ValueError:
+            raise CommandError(f'Mistura inválida: {texto}')
+        desconhecidos = set(pesos) - {'home', 'disponibilidade', 'agendar', 'meus_agendamentos', 'cep'}
+        if desconhecidos:
+            raise CommandError(f'Endpoints desconhecidos: {", ".join(sorted(desconhecidos))}')
+        if sum(pesos.values()) <= 0:
+            raise CommandError('A mistura precisa de ao menos um peso positivo.')
+        return pesos
+
+    # --------------------------------------------------------------------------
+    # Threads
+    # --------------------------------------------------------------------------
+
+    def _proxima(self) -> bool:
+        with self._trava:
+            if self._restantes <= 0:
+                return False
+            self._restantes -= 1
+            return True
+
+    def _sessao(self, aleatorio):
+        usuario = User.objects.get(pk=aleatorio.choice(self.usuarios))
+        if self.url:
+            cliente = ClienteHttp(self.url, usuario.username, self.senha, self.timeout)
+        else:
+            cliente = ClienteInterno(self.host, usuario)
+        pets = list(Pet.objects.filter(dono=usuario).values_list('id', 'nome', 'tipo'))
+        return cliente, aleatorio, pets
+
+    def _trabalhar(self, sessao, aquecimento):
+        cliente, aleatorio, pets = sessao
+        nomes, pesos = zip(*self.mix.items())
+        try:
+            for _ in range(aquecimento):
+                try:
+                    self._requisitar(cliente, aleatorio.choices(nomes, pesos)[0], aleatorio, pets)
+                except Exception:
+                    pass  # Erros do aquecimento não entram nas estatísticas
+            while self._proxima():
+                endpoint = aleatorio.choices(nomes, pesos)[0]
+                if self.url:
+                    latencia, erro = self._medir(cliente, endpoint, aleatorio, pets)
+                    queries = None
+                else:
+                    with CaptureQueriesContext(connection) as consultas:
+                        latencia, erro = self._medir(cliente, endpoint, aleatorio, pets)
+                    queries = len(consultas)
+                self.estatisticas.registrar(endpoint, latencia, queries, erro)
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    def _medir(self, cliente, endpoint, aleatorio, pets):
+        comeco = time.perf_counter()
+        try:
+            erro = self._requisitar(cliente, endpoint, aleatorio, pets) >= 500
+        except Exception:
+            erro = True  # Ex.: "database is locked" no SQLite sob escrita concorrente, timeout de rede
+        return (time.perf_counter() - comeco) * 1000, erro
+
+    def _requisitar(self, cliente, endpoint, aleatorio, pets) -> int:
+        if endpoint == 'home':
+            return cliente.requisitar('GET', reverse('home'))
+        if endpoint == 'meus_agendamentos':
+            return cliente.requisitar('GET', reverse('meus_agendamentos'))
+        if endpoint == 'cep':
+            cep = aleatorio.choice(self.ceps)[0] if self.ceps else '01001000'
+            return cliente.requisitar('GET', reverse('consultar_cep'), {'cep': cep})
+
+        servicos = aleatorio.sample(self.servicos, k=min(len(self.servicos), aleatorio.choice((1, 1, 2))))
+        data = aleatorio.choice(self.datas)
+        if endpoint == 'disponibilidade':
+            return cliente.requisitar('GET', reverse('verificar_horarios_disponiveis'), {
+                'data': data.isoformat(), 'servicos_ids': ','.join(map(str, servicos)),
+            })
+
+        # agendar: horário sorteado do expediente; conflitos voltam como redirecionamento com mensagem
+        horarios = gerar_horarios_possiveis(data_agendamento=data) or ['08:00']
+        pet_id, nome_pet, tipo_pet = aleatorio.choice(pets) if pets else ('', 'Rex', 'cachorro')
+        cep, rua, bairro, cidade, estado = aleatorio.choice(self.ceps) if self.ceps else (
+            '01001000', 'Praça da Sé', 'Sé', 'São Paulo', 'SP',
+        )
+        return cliente.requisitar('POST', reverse('agendar_servico'), dados={
+            'servicos': servicos, 'pet': pet_id, 'nome_tutor': 'Tutor Carga', 'nome_pet': nome_pet,
+            'tipo_pet': tipo_pet, 'data': data.isoformat(), 'horario_inicio': aleatorio.choice(horarios),
+            'cep': cep, 'rua': rua, 'numero': '100', 'bairro': bairro, 'cidade': cidade, 'estado': estado,
+            'forma_pagamento': 'pix', 'observacoes': 'teste de carga',
+        })
+
+    # --------------------------------------------------------------------------
+    # Relatório
+    # --------------------------------------------------------------------------
+
+    def _relatorio(self, decorrido):
+        estatisticas = self.estatisticas
+        total = sum(len(latencias) for latencias in estatisticas.latencias.values())
+        self.stdout.write(
+            f"\n{'endpoint':<20}{'req':>6}{'erros':>7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'queries':>9}{'máx':>6}"
+        )
+        for endpoint in sorted(estatisticas.latencias):
+            latencias = sorted(estatisticas.latencias[endpoint])
+            queries = estatisticas.queries.get(endpoint)
+            colunas_queries = f'{sum(queries) / len(queries):>9.1f}{max(queries):>6}' if queries else f"{'-':>9}{'-':>6}"
+            self.stdout.write(
+                f'{endpoint:<20}{len(latencias):>6}{estatisticas.erros[endpoint]:>7}'
+                f'{len(latencias) / decorrido:>9.1f}{percentil(latencias, 50):>9.1f}'
+                f'{percentil(latencias, 95):>9.1f}{percentil(latencias, 99):>9.1f}{colunas_queries}'
+            )
+        erros = sum(estatisticas.erros.values())
+        estilo = self.style.WARNING if erros else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f'\nTotal: {total} requisições em {decorrido:.2f}s ({total / decorrido:.1f} req/s), {erros} erros.'
+        ))
+        if not self.url:
+            self.stdout.write(self.style.WARNING(
+                'Números em processo: cliente de testes do Django em threads de um único processo, sem '
+                'servidor, rede nem workers do gunicorn. Servem só para comparar versões do código entre '
+                'si; para vazão e latência reais use --url contra o servidor implantado.'
+            ))
@@ -0,0 +1,100 @@
+import multiprocessing
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from agendamentos import tarefas
+
+# A cada quantos segundos procura tarefas travadas (worker anterior interrompido)
+INTERVALO_RECUPERACAO = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa as tarefas em segundo plano gravadas no banco. Cada fila tem seu próprio '
+        'pool e limite de concorrência (ex.: --fila imagens=2 --fila padrao=4).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fila', action='append', default=[], metavar='NOME[=N]',
+            help='Fila a processar e sua concorrência (padrão: todas as filas registradas)',
+        )
+        parser.add_argument('--concorrencia', type=int, default=2, help='Concorrência das filas sem =N (padrão: 2)')
+        parser.add_argument(
+            '--modo', choices=['threads', 'processos'], default='threads',
+            help='Pool de threads (padrão) ou de processos (tarefas pesadas de CPU; requer fork)',
+        )
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Espera entre consultas com a fila vazia (s)')
+        parser.add_argument('--uma-vez', action='store_true', help='Sai quando não houver mais tarefas vencidas')
+
+    def handle(self, *args, **options):
+        filas = self._filas(options['fila'], options['concorrencia'])
+        worker = tarefas.identificador_worker()
+        parar = threading.Event()
+        for sinal in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sinal, lambda *_: parar.set())
+
+        processos = options['modo'] == 'processos'
+        if processos:
+            contexto = multiprocessing.get_context('fork')
+            executores = {fila: ProcessPoolExecutor(n, mp_context=contexto) for fila, n in filas.items()}
+        else:
+            executores = {fila: ThreadPoolExecutor(n, thread_name_prefix=f'tarefa-{fila}') for fila, n in filas.items()}
+
+        descricao = ', '.join(f'{fila}={n}' for fila, n in filas.items())
+        self.stdout.write(f'Worker {worker} ({options["modo"]}) processando: {descricao}')
+
+        em_andamento = {fila: set() for fila in filas}
+        executadas = 0
+        proxima_recuperacao = 0
+        try:
+            while not parar.is_set():
+                if time.monotonic() >= proxima_recuperacao:
+                    recuperadas = tarefas.recuperar_travadas()
+                    if recuperadas:
+                        self.stdout.write(f'{recuperadas} tarefas travadas devolvidas à fila.')
+                    proxima_recuperacao = time.monotonic() + INTERVALO_RECUPERACAO
+
+                reservou = False
+                for fila, limite in filas.items():
+                    ativas = {futuro for futuro in em_andamento[fila] if not futuro.done()}
+                    ids = tarefas.reservar(fila, limite - len(ativas), worker)
+                    if ids and processos:
+                        # O pool cria os filhos por fork ao receber tarefas: nenhuma
+                        # conexão aberta pode ser herdada e compartilhada com eles
+                        connections.close_all()
+                    for tarefa_id in ids:
+                        ativas.add(executores[fila].submit(tarefas.executar_por_id, tarefa_id))
+                    em_andamento[fila] = ativas
+                    executadas += len(ids)
+                    reservou = reservou or bool(ids)
+
+                if options['uma_vez'] and not reservou and not any(em_andamento.values()):
+                    break
+                if not reservou:
+                    parar.wait(options['intervalo'])
+        finally:
+            for executor in executores.values():
+                executor.shutdown(wait=True)
+
+        self.stdout.write(self.style.SUCCESS(f'Worker encerrado: {executadas} tarefas executadas.'))
+
+    def _filas(self, especificacoes, concorrencia):
+        if not especificacoes:
+            nomes = sorted({fila for _, fila, _ in tarefas._registro.values()}) or [tarefas.FILA_PADRAO]
+            return {nome: concorrencia for nome in nomes}
+        filas = {}
+        for especificacao in especificacoes:
+            nome, _, limite = especificacao.partition('=')
+            try:
+                filas[nome.strip()] = int(limite) if limite else concorrencia
+            except ValueError:
+                raise CommandError(f'Concorrência inválida em --fila {especificacao}')
+            if filas[nome.strip()] < 1:
+                raise CommandError(f'A concorrência da fila {nome} deve ser pelo menos 1')
+        return filas
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0008_servico_imagem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiaAgenda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(unique=True, verbose_name='Data')),
+                ('versao', models.PositiveIntegerField(default=0, verbose_name='Versão')),
+            ],
+            options={
+                'verbose_name': 'Dia da Agenda',
+                'verbose_name_plural': 'Dias da Agenda',
+            },
+        ),
+    ]
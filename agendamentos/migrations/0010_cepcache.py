@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0009_diaagenda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CepCache',
+            fields=[
+                ('cep', models.CharField(max_length=8, primary_key=True, serialize=False, verbose_name='CEP')),
+                ('encontrado', models.BooleanField(default=True, verbose_name='Encontrado')),
+                ('rua', models.CharField(blank=True, max_length=200, verbose_name='Rua')),
+                ('bairro', models.CharField(blank=True, max_length=100, verbose_name='Bairro')),
+                ('cidade', models.CharField(blank=True, max_length=100, verbose_name='Cidade')),
+                ('estado', models.CharField(blank=True, max_length=2, verbose_name='Estado')),
+                ('atualizado_em', models.DateTimeField(verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'CEP em Cache',
+                'verbose_name_plural': 'CEPs em Cache',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0010_cepcache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CepLocal',
+            fields=[
+                ('cep', models.CharField(max_length=8, primary_key=True, serialize=False, verbose_name='CEP')),
+                ('rua', models.CharField(blank=True, max_length=200, verbose_name='Rua')),
+                ('bairro', models.CharField(blank=True, max_length=100, verbose_name='Bairro')),
+                ('cidade', models.CharField(max_length=100, verbose_name='Cidade')),
+                ('estado', models.CharField(max_length=2, verbose_name='Estado')),
+            ],
+            options={
+                'verbose_name': 'CEP Local',
+                'verbose_name_plural': 'CEPs Locais',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0011_ceplocal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['usuario', '-data', 'horario_inicio', 'id'], name='agendamento_usuario_data_idx'),
+        ),
+    ]
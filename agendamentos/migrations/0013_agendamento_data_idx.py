@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0012_agendamento_usuario_data_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['data', 'horario_inicio'], name='agendamento_data_idx'),
+        ),
+    ]
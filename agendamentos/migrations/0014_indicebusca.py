@@ -0,0 +1,119 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:09
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# SQLite: tabela FTS5 de conteúdo externo, sincronizada por triggers
+SQL_SQLITE = [
+    """CREATE VIRTUAL TABLE agendamentos_indicebusca_fts USING fts5(
+        documento, content='agendamentos_indicebusca', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER agendamentos_indicebusca_ai AFTER INSERT ON agendamentos_indicebusca BEGIN
+        INSERT INTO agendamentos_indicebusca_fts(rowid, documento) VALUES (new.id, new.documento);
+    END""",
+    """CREATE TRIGGER agendamentos_indicebusca_ad AFTER DELETE ON agendamentos_indicebusca BEGIN
+        INSERT INTO agendamentos_indicebusca_fts(agendamentos_indicebusca_fts, rowid, documento)
+        VALUES ('delete', old.id, old.documento);
+    END""",
+    """CREATE TRIGGER agendamentos_indicebusca_au AFTER UPDATE ON agendamentos_indicebusca BEGIN
+        INSERT INTO agendamentos_indicebusca_fts(agendamentos_indicebusca_fts, rowid, documento)
+        VALUES ('delete', old.id, old.documento);
+        INSERT INTO agendamentos_indicebusca_fts(rowid, documento) VALUES (new.id, new.documento);
+    END""",
+]
+
+SQL_SQLITE_REVERSO = [
+    'DROP TRIGGER IF EXISTS agendamentos_indicebusca_au',
+    'DROP TRIGGER IF EXISTS agendamentos_indicebusca_ad',
+    'DROP TRIGGER IF EXISTS agendamentos_indicebusca_ai',
+    'DROP TABLE IF EXISTS agendamentos_indicebusca_fts',
+]
+
+# PostgreSQL: índice GIN de trigramas (atende LIKE '%termo%')
+SQL_POSTGRESQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX agendamentos_indicebusca_trgm ON agendamentos_indicebusca USING gin (documento gin_trgm_ops)',
+]
+
+SQL_POSTGRESQL_REVERSO = [
+    'DROP INDEX IF EXISTS agendamentos_indicebusca_trgm',
+]
+
+
+def _executar(schema_editor, por_banco):
+    for sql in por_banco.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def criar_indice_textual(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQL_SQLITE, 'postgresql': SQL_POSTGRESQL})
+
+
+def remover_indice_textual(apps, schema_editor):
+    _executar(schema_editor, {'sqlite': SQL_SQLITE_REVERSO, 'postgresql': SQL_POSTGRESQL_REVERSO})
+
+
+# Cópia congelada de busca.TIPOS e busca.normalizar: a migração não pode acompanhar
+# mudanças posteriores no módulo (nem quebrar se ele for renomeado ou removido)
+TIPOS_BUSCA = {
+    'agendamento': ('Agendamento', (
+        'nome_pet', 'nome_tutor', 'tipo_pet', 'cep', 'rua', 'numero', 'bairro', 'cidade', 'estado',
+    )),
+    'pet': ('Pet', (
+        'nome', 'raca', 'tipo', 'dono__username', 'dono__first_name', 'dono__last_name',
+    )),
+    'perfil': ('PerfilUsuario', (
+        'cpf', 'telefone', 'usuario__username', 'usuario__first_name', 'usuario__last_name', 'usuario__email',
+    )),
+}
+
+
+def _normalizar(texto):
+    sem_acentos = unicodedata.normalize('NFKD', texto or '')
+    sem_acentos = ''.join(c for c in sem_acentos if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'[0-9a-z]+', sem_acentos.lower()))
+
+
+def indexar_existentes(apps, schema_editor, lote=2000):
+    IndiceBusca = apps.get_model('agendamentos', 'IndiceBusca')
+    for tipo, (nome_modelo, campos) in TIPOS_BUSCA.items():
+        linhas = apps.get_model('agendamentos', nome_modelo).objects.order_by('pk').values_list('pk', *campos)
+        ultimo = 0
+        while True:
+            pagina = list(linhas.filter(pk__gt=ultimo)[:lote])
+            if not pagina:
+                break
+            IndiceBusca.objects.bulk_create([
+                IndiceBusca(tipo=tipo, objeto_id=pk, documento=_normalizar(' '.join(str(v) for v in valores if v)))
+                for pk, *valores in pagina
+            ])
+            ultimo = pagina[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0013_agendamento_data_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBusca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('agendamento', 'Agendamento'), ('pet', 'Pet'), ('perfil', 'Perfil de Usuário')], max_length=20, verbose_name='Tipo')),
+                ('objeto_id', models.PositiveBigIntegerField(verbose_name='ID do Objeto')),
+                ('documento', models.TextField(verbose_name='Documento')),
+            ],
+            options={
+                'verbose_name': 'Índice de Busca',
+                'verbose_name_plural': 'Índice de Busca',
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='indicebusca_tipo_objeto_uniq')],
+            },
+        ),
+        migrations.RunPython(criar_indice_textual, remover_indice_textual),
+        migrations.RunPython(indexar_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0014_indicebusca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('status', models.CharField(choices=[('agendado', 'Agendado'), ('confirmado', 'Confirmado'), ('realizado', 'Realizado'), ('cancelado', 'Cancelado')], max_length=20, verbose_name='Status')),
+                ('forma_pagamento', models.CharField(choices=[('dinheiro', 'Dinheiro'), ('pix', 'PIX'), ('cartao_credito', 'Cartão de Crédito'), ('cartao_debito', 'Cartão de Débito'), ('transferencia', 'Transferência Bancária')], max_length=20, verbose_name='Forma de Pagamento')),
+                ('quantidade', models.PositiveIntegerField(default=0, verbose_name='Quantidade')),
+                ('valor_total', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Valor Total')),
+                ('minutos', models.PositiveIntegerField(default=0, verbose_name='Minutos Agendados')),
+                ('servico', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='agendamentos.servico', verbose_name='Serviço')),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário',
+                'verbose_name_plural': 'Resumos Diários',
+                'constraints': [models.UniqueConstraint(fields=('data', 'servico', 'status', 'forma_pagamento'), name='resumodiario_servico_uniq'), models.UniqueConstraint(condition=models.Q(('servico__isnull', True)), fields=('data', 'status', 'forma_pagamento'), name='resumodiario_total_uniq')],
+            },
+        ),
+    ]
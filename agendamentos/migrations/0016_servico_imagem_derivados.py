@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0015_resumodiario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servico',
+            name='imagem_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16, verbose_name='Hash da Imagem'),
+        ),
+        migrations.AddField(
+            model_name='servico',
+            name='imagem_larguras',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Larguras Geradas'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0016_servico_imagem_derivados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tarefa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fila', models.CharField(default='padrao', max_length=50, verbose_name='Fila')),
+                ('nome', models.CharField(max_length=100, verbose_name='Tarefa')),
+                ('argumentos', models.JSONField(blank=True, default=dict, verbose_name='Argumentos')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=20, verbose_name='Status')),
+                ('tentativas', models.PositiveIntegerField(default=0, verbose_name='Tentativas')),
+                ('max_tentativas', models.PositiveIntegerField(default=3, verbose_name='Máximo de Tentativas')),
+                ('executar_apos', models.DateTimeField(verbose_name='Executar Após')),
+                ('iniciada_em', models.DateTimeField(blank=True, null=True, verbose_name='Iniciada em')),
+                ('concluida_em', models.DateTimeField(blank=True, null=True, verbose_name='Concluída em')),
+                ('worker', models.CharField(blank=True, max_length=100, verbose_name='Worker')),
+                ('erro', models.TextField(blank=True, verbose_name='Último Erro')),
+                ('criada_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Tarefa',
+                'verbose_name_plural': 'Tarefas',
+                'ordering': ['-criada_em'],
+                'indexes': [models.Index(fields=['status', 'fila', 'executar_apos'], name='tarefa_proximas_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0017_tarefa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recurso',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, verbose_name='Nome')),
+                ('tipo', models.CharField(choices=[('profissional', 'Profissional'), ('veiculo', 'Veículo')], default='profissional', max_length=20, verbose_name='Tipo')),
+                ('ativo', models.BooleanField(default=True, verbose_name='Ativo')),
+                ('servicos', models.ManyToManyField(blank=True, help_text='Deixe vazio para um recurso que executa todos os serviços.', related_name='recursos', to='agendamentos.servico', verbose_name='Serviços que executa')),
+            ],
+            options={
+                'verbose_name': 'Recurso',
+                'verbose_name_plural': 'Recursos',
+                'ordering': ['nome'],
+            },
+        ),
+        migrations.AddField(
+            model_name='agendamento',
+            name='recurso',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='agendamentos', to='agendamentos.recurso', verbose_name='Recurso'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0018_recurso'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FechamentoAgenda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('inicio', models.TimeField(blank=True, null=True, verbose_name='Início')),
+                ('fim', models.TimeField(blank=True, null=True, verbose_name='Fim')),
+                ('motivo', models.CharField(blank=True, max_length=100, verbose_name='Motivo')),
+                ('repetir_anualmente', models.BooleanField(default=False, help_text='Para feriados de data fixa (ex.: 25/12).', verbose_name='Repetir todo ano')),
+            ],
+            options={
+                'verbose_name': 'Feriado / Fechamento',
+                'verbose_name_plural': 'Feriados e Fechamentos',
+                'ordering': ['data', 'inicio'],
+            },
+        ),
+        migrations.CreateModel(
+            name='HorarioFuncionamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(choices=[(0, 'Segunda-feira'), (1, 'Terça-feira'), (2, 'Quarta-feira'), (3, 'Quinta-feira'), (4, 'Sexta-feira'), (5, 'Sábado'), (6, 'Domingo')], verbose_name='Dia da Semana')),
+                ('abertura', models.TimeField(verbose_name='Abertura')),
+                ('fechamento', models.TimeField(verbose_name='Fechamento')),
+            ],
+            options={
+                'verbose_name': 'Horário de Funcionamento',
+                'verbose_name_plural': 'Horários de Funcionamento',
+                'ordering': ['dia_semana', 'abertura'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PausaExpediente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(blank=True, choices=[(0, 'Segunda-feira'), (1, 'Terça-feira'), (2, 'Quarta-feira'), (3, 'Quinta-feira'), (4, 'Sexta-feira'), (5, 'Sábado'), (6, 'Domingo')], help_text='Deixe vazio para aplicar a todos os dias.', null=True, verbose_name='Dia da Semana')),
+                ('inicio', models.TimeField(verbose_name='Início')),
+                ('fim', models.TimeField(verbose_name='Fim')),
+                ('descricao', models.CharField(blank=True, max_length=100, verbose_name='Descrição')),
+            ],
+            options={
+                'verbose_name': 'Pausa do Expediente',
+                'verbose_name_plural': 'Pausas do Expediente',
+                'ordering': ['dia_semana', 'inicio'],
+            },
+        ),
+    ]
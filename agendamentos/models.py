@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from datetime import timedelta, datetime # Adicionando importação ao topo
 
@@ -77,6 +78,9 @@ class Servico(models.Model):
         null=True, 
         blank=True
     )
+    # Derivados redimensionados da imagem (gerados por imagens.py)
+    imagem_hash = models.CharField(max_length=16, blank=True, editable=False, verbose_name='Hash da Imagem')
+    imagem_larguras = models.JSONField(default=list, blank=True, editable=False, verbose_name='Larguras Geradas')
     
     class Meta:
         verbose_name = 'Serviço'
@@ -86,6 +90,35 @@ class Servico(models.Model):
     def __str__(self):
         return f"{self.nome} - R$ {self.preco}"
 
+class Recurso(models.Model):
+    """
+    Profissional ou veículo que executa atendimentos em paralelo com os demais.
+    Sem nenhum recurso cadastrado, a agenda funciona como uma fila única.
+    """
+    TIPO_CHOICES = [
+        ('profissional', 'Profissional'),
+        ('veiculo', 'Veículo'),
+    ]
+
+    nome = models.CharField(max_length=100, verbose_name='Nome')
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, default='profissional', verbose_name='Tipo')
+    ativo = models.BooleanField(default=True, verbose_name='Ativo')
+    servicos = models.ManyToManyField(
+        Servico,
+        blank=True,
+        related_name='recursos',
+        verbose_name='Serviços que executa',
+        help_text="Deixe vazio para um recurso que executa todos os serviços."
+    )
+
+    class Meta:
+        verbose_name = 'Recurso'
+        verbose_name_plural = 'Recursos'
+        ordering = ['nome']
+
+    def __str__(self):
+        return self.nome
+
 class Agendamento(models.Model):
     STATUS_CHOICES = [
         ('agendado', 'Agendado'),
@@ -106,6 +139,10 @@ class Agendamento(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='agendamentos')
     servicos = models.ManyToManyField(Servico, verbose_name='Serviços')
     pet = models.ForeignKey(Pet, on_delete=models.CASCADE, null=True, blank=True, verbose_name='Pet')
+    # Atribuído na reserva; agendamentos sem recurso (anteriores aos recursos) ocupam todos
+    recurso = models.ForeignKey(
+        Recurso, on_delete=models.PROTECT, null=True, blank=True, related_name='agendamentos', verbose_name='Recurso'
+    )
     
     # Informações do agendamento
     nome_tutor = models.CharField(max_length=100, verbose_name='Nome do Tutor')
@@ -149,6 +186,12 @@ class Agendamento(models.Model):
         verbose_name = 'Agendamento'
         verbose_name_plural = 'Agendamentos'
         ordering = ['-data', 'horario_inicio']
+        indexes = [
+            # date_hierarchy do admin e consultas de disponibilidade por dia
+            models.Index(fields=['data', 'horario_inicio'], name='agendamento_data_idx'),
+            # Listagem paginada por cursor em "Meus Agendamentos"
+            models.Index(fields=['usuario', '-data', 'horario_inicio', 'id'], name='agendamento_usuario_data_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nome_pet} - {self.data} {self.horario_inicio}"
@@ -156,4 +199,256 @@ class Agendamento(models.Model):
     def calcular_valor_total(self):
         # O uso de self.servicos.all() força o Django a buscar os dados no banco.
         # Poderia ser mais eficiente se já estivessem carregados.
-        return sum(servico.preco for servico in self.servicos.all())
\ No newline at end of file
+        return sum(servico.preco for servico in self.servicos.all())
+
+class DiaAgenda(models.Model):
+    """
+    Uma linha por dia com agendamentos. Serve de trava: toda reserva atualiza a
+    linha do seu dia dentro da transação, serializando apenas as reservas daquele
+    dia (lock de linha no PostgreSQL; no SQLite, o lock de escrita do banco).
+    """
+    data = models.DateField(unique=True, verbose_name='Data')
+    versao = models.PositiveIntegerField(default=0, verbose_name='Versão')
+
+    class Meta:
+        verbose_name = 'Dia da Agenda'
+        verbose_name_plural = 'Dias da Agenda'
+
+    def __str__(self):
+        return f"{self.data} (v{self.versao})"
+
+# ==============================================================================
+# Calendário de Funcionamento (expediente, pausas, feriados e fechamentos)
+# ==============================================================================
+
+DIAS_SEMANA_CHOICES = [
+    (0, 'Segunda-feira'),
+    (1, 'Terça-feira'),
+    (2, 'Quarta-feira'),
+    (3, 'Quinta-feira'),
+    (4, 'Sexta-feira'),
+    (5, 'Sábado'),
+    (6, 'Domingo'),
+]
+
+def validar_grade(**horarios):
+    """Os horários do expediente precisam cair na grade de slots do índice de ocupação."""
+    from .ocupacao import DURACAO_SLOT
+    erros = {
+        campo: f'Use um horário múltiplo de {DURACAO_SLOT} minutos (ex.: 08:00, 08:15, 08:30).'
+        for campo, horario in horarios.items()
+        if horario and (horario.minute % DURACAO_SLOT or horario.second or horario.microsecond)
+    }
+    if erros:
+        raise ValidationError(erros)
+
+class HorarioFuncionamento(models.Model):
+    """
+    Período de atendimento em um dia da semana (pode haver mais de um por dia).
+    Sem nenhum período cadastrado vale o expediente padrão: todos os dias,
+    08:00 às 18:00, com almoço das 12:00 às 14:00.
+    """
+    dia_semana = models.PositiveSmallIntegerField(choices=DIAS_SEMANA_CHOICES, verbose_name='Dia da Semana')
+    abertura = models.TimeField(verbose_name='Abertura')
+    fechamento = models.TimeField(verbose_name='Fechamento')
+
+    class Meta:
+        verbose_name = 'Horário de Funcionamento'
+        verbose_name_plural = 'Horários de Funcionamento'
+        ordering = ['dia_semana', 'abertura']
+
+    def clean(self):
+        validar_grade(abertura=self.abertura, fechamento=self.fechamento)
+        if self.abertura and self.fechamento and self.fechamento <= self.abertura:
+            raise ValidationError({'fechamento': 'O fechamento deve ser depois da abertura.'})
+
+    def __str__(self):
+        return f"{self.get_dia_semana_display()} {self.abertura:%H:%M}-{self.fechamento:%H:%M}"
+
+class PausaExpediente(models.Model):
+    """Intervalo sem início de atendimentos (almoço, reunião) em um dia da semana ou em todos."""
+    dia_semana = models.PositiveSmallIntegerField(
+        choices=DIAS_SEMANA_CHOICES, null=True, blank=True, verbose_name='Dia da Semana',
+        help_text="Deixe vazio para aplicar a todos os dias."
+    )
+    inicio = models.TimeField(verbose_name='Início')
+    fim = models.TimeField(verbose_name='Fim')
+    descricao = models.CharField(max_length=100, blank=True, verbose_name='Descrição')
+
+    class Meta:
+        verbose_name = 'Pausa do Expediente'
+        verbose_name_plural = 'Pausas do Expediente'
+        ordering = ['dia_semana', 'inicio']
+
+    def clean(self):
+        validar_grade(inicio=self.inicio, fim=self.fim)
+        if self.inicio and self.fim and self.fim <= self.inicio:
+            raise ValidationError({'fim': 'O fim deve ser depois do início.'})
+
+    def __str__(self):
+        dia = self.get_dia_semana_display() if self.dia_semana is not None else 'Todos os dias'
+        return f"{dia} {self.inicio:%H:%M}-{self.fim:%H:%M}"
+
+class FechamentoAgenda(models.Model):
+    """Feriado ou fechamento em uma data: o dia inteiro ou apenas um intervalo."""
+    data = models.DateField(verbose_name='Data')
+    inicio = models.TimeField(null=True, blank=True, verbose_name='Início')
+    fim = models.TimeField(null=True, blank=True, verbose_name='Fim')
+    motivo = models.CharField(max_length=100, blank=True, verbose_name='Motivo')
+    repetir_anualmente = models.BooleanField(
+        default=False, verbose_name='Repetir todo ano',
+        help_text="Para feriados de data fixa (ex.: 25/12)."
+    )
+
+    class Meta:
+        verbose_name = 'Feriado / Fechamento'
+        verbose_name_plural = 'Feriados e Fechamentos'
+        ordering = ['data', 'inicio']
+
+    def clean(self):
+        if (self.inicio is None) != (self.fim is None):
+            raise ValidationError('Informe início e fim, ou deixe ambos vazios para fechar o dia inteiro.')
+        validar_grade(inicio=self.inicio, fim=self.fim)
+        if self.inicio and self.fim and self.fim <= self.inicio:
+            raise ValidationError({'fim': 'O fim deve ser depois do início.'})
+
+    def __str__(self):
+        if self.inicio is None:
+            return f"{self.data:%d/%m/%Y} (dia inteiro) {self.motivo}".strip()
+        return f"{self.data:%d/%m/%Y} {self.inicio:%H:%M}-{self.fim:%H:%M} {self.motivo}".strip()
+
+
+class CepCache(models.Model):
+    """Resultado de consultas de CEP, inclusive as negativas ("CEP não encontrado")."""
+    cep = models.CharField(max_length=8, primary_key=True, verbose_name='CEP')
+    encontrado = models.BooleanField(default=True, verbose_name='Encontrado')
+    rua = models.CharField(max_length=200, blank=True, verbose_name='Rua')
+    bairro = models.CharField(max_length=100, blank=True, verbose_name='Bairro')
+    cidade = models.CharField(max_length=100, blank=True, verbose_name='Cidade')
+    estado = models.CharField(max_length=2, blank=True, verbose_name='Estado')
+    atualizado_em = models.DateTimeField(verbose_name='Atualizado em')
+
+    class Meta:
+        verbose_name = 'CEP em Cache'
+        verbose_name_plural = 'CEPs em Cache'
+
+    def __str__(self):
+        return self.cep
+
+
+class CepLocal(models.Model):
+    """Base de CEPs importada de um arquivo (comando importar_ceps), consultada antes do provedor."""
+    cep = models.CharField(max_length=8, primary_key=True, verbose_name='CEP')
+    rua = models.CharField(max_length=200, blank=True, verbose_name='Rua')
+    bairro = models.CharField(max_length=100, blank=True, verbose_name='Bairro')
+    cidade = models.CharField(max_length=100, verbose_name='Cidade')
+    estado = models.CharField(max_length=2, verbose_name='Estado')
+
+    class Meta:
+        verbose_name = 'CEP Local'
+        verbose_name_plural = 'CEPs Locais'
+
+    def __str__(self):
+        return f"{self.cep} - {self.cidade}/{self.estado}"
+
+
+class IndiceBusca(models.Model):
+    """
+    Documento de busca (texto normalizado, sem acentos) de agendamentos, pets e
+    perfis, mantido pelos signals. No SQLite é espelhado em uma tabela FTS5; no
+    PostgreSQL tem índice GIN de trigramas. Consultado pelo módulo busca.py.
+    """
+    TIPO_CHOICES = [
+        ('agendamento', 'Agendamento'),
+        ('pet', 'Pet'),
+        ('perfil', 'Perfil de Usuário'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, verbose_name='Tipo')
+    objeto_id = models.PositiveBigIntegerField(verbose_name='ID do Objeto')
+    documento = models.TextField(verbose_name='Documento')
+
+    class Meta:
+        verbose_name = 'Índice de Busca'
+        verbose_name_plural = 'Índice de Busca'
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'objeto_id'], name='indicebusca_tipo_objeto_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.objeto_id}"
+
+
+class ResumoDiario(models.Model):
+    """
+    Agregado de agendamentos por (data, serviço, status, forma de pagamento),
+    recalculado por dia pelos signals a cada criação, edição ou cancelamento.
+    Linhas com servico vazio são os totais dos agendamentos; as demais contam
+    quantas vezes cada serviço aparece (o valor não é rateado entre serviços).
+    """
+    data = models.DateField(verbose_name='Data')
+    servico = models.ForeignKey(Servico, on_delete=models.CASCADE, null=True, blank=True, verbose_name='Serviço')
+    status = models.CharField(max_length=20, choices=Agendamento.STATUS_CHOICES, verbose_name='Status')
+    forma_pagamento = models.CharField(
+        max_length=20, choices=Agendamento.FORMA_PAGAMENTO_CHOICES, verbose_name='Forma de Pagamento'
+    )
+    quantidade = models.PositiveIntegerField(default=0, verbose_name='Quantidade')
+    valor_total = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Valor Total')
+    minutos = models.PositiveIntegerField(default=0, verbose_name='Minutos Agendados')
+
+    class Meta:
+        verbose_name = 'Resumo Diário'
+        verbose_name_plural = 'Resumos Diários'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['data', 'servico', 'status', 'forma_pagamento'],
+                name='resumodiario_servico_uniq',
+            ),
+            # NULL não conflita em UNIQUE: os totais do dia têm uma restrição própria
+            models.UniqueConstraint(
+                fields=['data', 'status', 'forma_pagamento'],
+                condition=models.Q(servico__isnull=True),
+                name='resumodiario_total_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.data} {self.servico_id or 'total'} {self.status}/{self.forma_pagamento}: {self.quantidade}"
+
+
+class Tarefa(models.Model):
+    """
+    Trabalho em segundo plano persistido no banco (sem broker externo). Criado por
+    tarefas.enfileirar() e executado pelo comando `manage.py worker`.
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluida', 'Concluída'),
+        ('falhou', 'Falhou'),
+    ]
+
+    fila = models.CharField(max_length=50, default='padrao', verbose_name='Fila')
+    nome = models.CharField(max_length=100, verbose_name='Tarefa')
+    argumentos = models.JSONField(default=dict, blank=True, verbose_name='Argumentos')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente', verbose_name='Status')
+    tentativas = models.PositiveIntegerField(default=0, verbose_name='Tentativas')
+    max_tentativas = models.PositiveIntegerField(default=3, verbose_name='Máximo de Tentativas')
+    executar_apos = models.DateTimeField(verbose_name='Executar Após')
+    iniciada_em = models.DateTimeField(null=True, blank=True, verbose_name='Iniciada em')
+    concluida_em = models.DateTimeField(null=True, blank=True, verbose_name='Concluída em')
+    worker = models.CharField(max_length=100, blank=True, verbose_name='Worker')
+    erro = models.TextField(blank=True, verbose_name='Último Erro')
+    criada_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Tarefa'
+        verbose_name_plural = 'Tarefas'
+        ordering = ['-criada_em']
+        indexes = [
+            # Busca das próximas tarefas de uma fila pelo worker
+            models.Index(fields=['status', 'fila', 'executar_apos'], name='tarefa_proximas_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nome} [{self.fila}] #{self.pk} ({self.status})"
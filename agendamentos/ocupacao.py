@@ -0,0 +1,226 @@
+# agendamentos/ocupacao.py
+
+import time
+from contextlib import contextmanager
+from datetime import date
+
+from django.conf import settings
+from django.db import transaction
+from . import services
+from .cache_camadas import CacheDoisNiveis
+
+# ==============================================================================
+# Índice de Ocupação por Dia (bitmap de slots de 15 minutos)
+# ==============================================================================
+#
+# Cada dia é representado por um inteiro em que o bit N indica que o slot
+# [N*15, N*15 + 15) minutos está ocupado por algum agendamento ativo. São 96 slots
+# (00:00 às 24:00), então o expediente inteiro cabe em um único inteiro pequeno.
+#
+# O mapa fica em um backend de cache do Django (configurável por
+# AGENDAMENTOS_OCUPACAO_CACHE) para ser compartilhado entre os workers do gunicorn,
+# sem L1: um L1 em outro processo ficaria para trás. Ele é reconstruído do banco
+# na primeira leitura (um único processo por vez, os demais aguardam o resultado).
+# É um índice de leitura: a validação final do agendamento é feita contra o banco.
+#
+# A chave inclui a versão do dia, como em recursos.agenda_do_dia. Um agendamento
+# que entra na agenda só liga bits: após o commit, o mapa da versão corrente recebe
+# o intervalo por OR e passa para uma versão nova, sem consultar o banco. Um que sai
+# só troca a versão (agora e após o commit), e o mapa é reconstruído na próxima
+# leitura. Detalhes e a trava que evita atualizações perdidas em _aplicar_mascara().
+
+DURACAO_SLOT = 15
+SLOTS_DIA = 24 * 60 // DURACAO_SLOT
+MAPA_CHEIO = (1 << SLOTS_DIA) - 1
+
+
+_mapas = CacheDoisNiveis(
+    'ocupacao', alias=lambda: getattr(settings, 'AGENDAMENTOS_OCUPACAO_CACHE', 'default'), ttl_l1=0,
+)
+
+
+def _timeout():
+    # Limita o tempo de vida de um mapa que ficou para trás (ex.: transação desfeita)
+    return getattr(settings, 'AGENDAMENTOS_OCUPACAO_TIMEOUT', 60 * 60)
+
+
+def _chave(data_agendamento: date, versao: int = None) -> str:
+    if versao is None:
+        versao = versao_dia(data_agendamento)
+    return f'{data_agendamento.isoformat()}:{versao}'
+
+
+def slots_da_duracao(duracao_minutos: int) -> int:
+    """Quantidade de slots cobertos por uma duração (arredondada para cima)."""
+    return -(-duracao_minutos // DURACAO_SLOT)
+
+
+def mascara_intervalo(inicio_minutos: int, fim_minutos: int) -> int:
+    """
+    Máscara com os bits de todos os slots tocados pelo intervalo [inicio, fim).
+    Intervalos fora da grade de 15 minutos ocupam o slot inteiro (visão conservadora).
+    """
+    primeiro = max(0, inicio_minutos // DURACAO_SLOT)
+    ultimo = min(SLOTS_DIA, slots_da_duracao(fim_minutos))
+    if ultimo <= primeiro:
+        return 0
+    return ((1 << (ultimo - primeiro)) - 1) << primeiro
+
+
+def construir_mapa(intervalos) -> int:
+    """Monta o bitmap de ocupação a partir de intervalos (inicio, fim) em minutos."""
+    mapa = 0
+    for inicio, fim in intervalos:
+        mapa |= mascara_intervalo(inicio, fim)
+    return mapa
+
+
+def obter_mapa(data_agendamento: date) -> int:
+    """Bitmap do dia; em caso de cache miss é reconstruído do banco (uma query)."""
+    return _mapas.get_or_compute(
+        _chave(data_agendamento),
+        lambda: construir_mapa(services.carregar_intervalos_dia(data_agendamento)),
+        _timeout(),
+    )
+
+
+def invalidar_dia(data_agendamento: date):
+    """
+    Troca a versão do dia (agora e após o commit): o mapa é reconstruído na
+    próxima leitura. É o caminho de intervalos que saem da agenda: com
+    agendamentos sobrepostos não há como saber, só pelo bitmap, se um slot
+    liberado continua ocupado por outro.
+    """
+    incrementar_versao_dia(data_agendamento)
+
+
+def ocupar_intervalo(data_agendamento: date, inicio_minutos: int, fim_minutos: int):
+    """
+    Liga os slots do intervalo no mapa do dia após o commit (na hora, fora de
+    uma transação). Antes do commit nada muda: o intervalo ainda pode ser desfeito,
+    e um mapa com os bits dele ficaria com slots ocupados que ninguém libera.
+    Leituras na própria transação veem o mapa anterior; a reserva revalida no banco.
+    """
+    mascara = mascara_intervalo(inicio_minutos, fim_minutos)
+    # Um callback por intervalo: um savepoint desfeito descarta só o dele
+    transaction.on_commit(lambda: _aplicar_mascara(data_agendamento, mascara), robust=True)
+
+
+def _aplicar_mascara(data_agendamento: date, mascara: int):
+    """
+    Ler a versão, gravar mapa | máscara sob uma versão nova e apontar a versão
+    para ela é um compare-and-set: dois ORs simultâneos sobre o mesmo mapa
+    perderiam um dos intervalos, e um OR gravado por cima da troca de um
+    cancelamento traria de volta o slot liberado. O cache não tem CAS, então
+    tudo que troca a versão do dia o faz sob a trava do dia (cache.add, atômico
+    no banco e no Redis). Sem a trava ou sem o mapa em cache, só troca a versão.
+    """
+    with _trava_versao(data_agendamento) as travada:
+        versao = _mapas.l2.get(_chave_versao(data_agendamento))
+        mapa = _mapas.get(_chave(data_agendamento, versao)) if travada and versao else None
+        if mapa is None:
+            _gravar_versao(data_agendamento, time.time_ns())
+            return
+        nova = max(time.time_ns(), versao + 1)
+        _mapas.set(_chave(data_agendamento, nova), mapa | mascara, _timeout())
+        _gravar_versao(data_agendamento, nova)
+
+
+# ------------------------------------------------------------------------------
+# Versão da disponibilidade de cada dia
+# ------------------------------------------------------------------------------
+#
+# Todo intervalo que entra ou sai da agenda troca a versão do dia (um timestamp
+# em nanossegundos, que também serve de Last-Modified). O endpoint de horários
+# usa a versão para responder 304 sem ler os agendamentos.
+
+VERSAO_TIMEOUT = 7 * 24 * 60 * 60
+
+
+def _espera_trava():
+    # Quem segura a trava da versão faz só alguns acessos ao cache
+    return getattr(settings, 'AGENDAMENTOS_OCUPACAO_TRAVA_ESPERA', 1.0)
+
+
+def _chave_versao(data_agendamento: date) -> str:
+    return f'ocupacao:versao:{data_agendamento.isoformat()}'
+
+
+def versao_dia(data_agendamento: date) -> int:
+    """Versão atual da disponibilidade do dia (só cache, nunca o banco)."""
+    cache = _mapas.l2
+    chave = _chave_versao(data_agendamento)
+    versao = cache.get(chave)
+    if versao is None:
+        # Primeiro acesso ou despejo do cache: começa com um valor novo (no pior caso, um 200 a mais)
+        cache.add(chave, time.time_ns(), VERSAO_TIMEOUT)
+        versao = cache.get(chave)
+    return versao
+
+
+def versoes_dias(datas) -> dict:
+    """Versões de vários dias com uma leitura do cache ({data: versão})."""
+    chaves = {_chave_versao(dia): dia for dia in datas}
+    encontradas = _mapas.l2.get_many(list(chaves))
+    return {
+        dia: encontradas[chave] if chave in encontradas else versao_dia(dia)
+        for chave, dia in chaves.items()
+    }
+
+
+@contextmanager
+def _trava_versao(data_agendamento: date):
+    """
+    Trava da versão do dia no cache compartilhado, aguardando até
+    AGENDAMENTOS_OCUPACAO_TRAVA_ESPERA segundos. Entrega se foi obtida: quem
+    só troca a versão segue mesmo sem ela (a troca nunca deixa um mapa errado à vista).
+    """
+    chave = f'versao:{data_agendamento.isoformat()}'
+    limite = time.monotonic() + _espera_trava()
+    token = _mapas._travar(chave)
+    while token is None and time.monotonic() < limite:
+        time.sleep(0.005)
+        token = _mapas._travar(chave)
+    try:
+        yield token is not None
+    finally:
+        if token is not None:
+            _mapas._destravar(chave, token)
+
+
+def _gravar_versao(data_agendamento: date, versao: int):
+    _mapas.l2.set(_chave_versao(data_agendamento), versao, VERSAO_TIMEOUT)
+
+
+def _trocar_versao(data_agendamento: date):
+    with _trava_versao(data_agendamento):
+        _gravar_versao(data_agendamento, time.time_ns())
+
+
+def incrementar_versao_dia(data_agendamento: date):
+    """
+    Troca a versão do dia agora e de novo após o commit: uma resposta calculada
+    entre o signal e o commit ainda vê o banco antigo e não pode ficar com a versão nova.
+    """
+    _trocar_versao(data_agendamento)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _trocar_versao(data_agendamento))
+
+
+def intervalo_livre(mapa: int, inicio_minutos: int, fim_minutos: int) -> bool:
+    """Checagem de conflito: um único AND entre o mapa e a máscara do intervalo."""
+    return mapa & mascara_intervalo(inicio_minutos, fim_minutos) == 0
+
+
+def inicios_livres(mapa: int, duracao_minutos: int) -> int:
+    """
+    Máscara dos slots em que um atendimento da duração informada pode começar.
+
+    Janela deslizante sobre o inteiro: o bit N do resultado fica ligado se os slots
+    N .. N+k-1 estiverem todos livres (k = slots da duração).
+    """
+    livres = ~mapa & MAPA_CHEIO
+    janela = livres
+    for deslocamento in range(1, slots_da_duracao(duracao_minutos)):
+        janela &= livres >> deslocamento
+    return janela
@@ -0,0 +1,191 @@
+# agendamentos/recursos.py
+
+from bisect import bisect_right, insort
+from dataclasses import dataclass
+from datetime import date
+
+from .cache_camadas import CacheDoisNiveis, VersaoCompartilhada
+from .models import Agendamento, Recurso
+from . import ocupacao, services
+
+# ==============================================================================
+# Agenda por Recurso (profissionais e veículos em paralelo)
+# ==============================================================================
+#
+# Cada recurso ativo tem sua própria fila: um horário está disponível se ao
+# menos um recurso elegível para os serviços pedidos estiver livre no intervalo
+# inteiro. Agendamentos sem recurso (feitos antes do cadastro dos recursos)
+# continuam ocupando todos eles. Sem recursos cadastrados, services.py usa o
+# bitmap de ocupação da loja inteira, como antes.
+#
+# A ocupação de cada recurso no dia é uma lista ordenada de blocos disjuntos;
+# "o recurso está livre em [inicio, fim)?" é um bisect: O(log n) por recurso.
+
+CHAVE_VERSAO = 'recursos:versao'
+RECURSOS_TIMEOUT = 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class RecursoAgenda:
+    id: int
+    nome: str
+    servicos: frozenset  # vazio = executa todos os serviços
+
+    def atende(self, servicos_ids) -> bool:
+        return not self.servicos or self.servicos.issuperset(servicos_ids)
+
+
+# ------------------------------------------------------------------------------
+# Snapshot dos recursos ativos (versionado como o catálogo)
+# ------------------------------------------------------------------------------
+
+_versao = VersaoCompartilhada(CHAVE_VERSAO)
+_linhas = CacheDoisNiveis('recursos:linhas', ttl_l1=0)
+_snapshot = (None, ())
+
+
+def versao_recursos() -> int:
+    return _versao.atual()
+
+
+def invalidar_recursos():
+    """Chamado pelos signals de Recurso."""
+    _versao.invalidar()
+
+
+def _ler_linhas() -> list:
+    # Uma query: uma linha por (recurso, serviço elegível), ou (recurso, None) se não houver restrição
+    linhas = {}
+    for recurso_id, nome, servico_id in Recurso.objects.filter(ativo=True).values_list('id', 'nome', 'servicos'):
+        servicos = linhas.setdefault(recurso_id, (recurso_id, nome, []))[2]
+        if servico_id is not None:
+            servicos.append(servico_id)
+    return [(recurso_id, nome, tuple(servicos)) for recurso_id, nome, servicos in linhas.values()]
+
+
+def obter_recursos() -> tuple:
+    """Recursos ativos, em ordem de nome (sem query enquanto a versão não mudar)."""
+    global _snapshot
+    versao = versao_recursos()
+    snapshot = _snapshot
+    if snapshot[0] != versao:
+        linhas = _linhas.get_or_compute(str(versao), _ler_linhas, RECURSOS_TIMEOUT)
+        snapshot = (versao, tuple(RecursoAgenda(rid, nome, frozenset(servicos)) for rid, nome, servicos in linhas))
+        _snapshot = snapshot
+    return snapshot[1]
+
+
+def elegiveis(servicos_ids=None) -> list:
+    """Recursos ativos que executam todos os serviços informados (None = qualquer serviço)."""
+    recursos = obter_recursos()
+    if servicos_ids is None:
+        return list(recursos)
+    servicos_ids = {int(getattr(sid, 'pk', sid)) for sid in servicos_ids if sid}
+    return [recurso for recurso in recursos if recurso.atende(servicos_ids)]
+
+
+# ------------------------------------------------------------------------------
+# Índice de intervalos
+# ------------------------------------------------------------------------------
+
+class IndiceRecurso:
+    """Blocos ocupados disjuntos e ordenados de um recurso em um dia."""
+
+    __slots__ = ('inicios', 'fins', 'minutos')
+
+    def __init__(self, intervalos=()):
+        blocos = services.mesclar_intervalos(sorted(intervalos))
+        self.inicios = [inicio for inicio, _ in blocos]
+        self.fins = [fim for _, fim in blocos]
+        self.minutos = sum(fim - inicio for inicio, fim in blocos)
+
+    def livre(self, inicio: int, fim: int) -> bool:
+        # Primeiro bloco que termina depois do início pedido: livre se ele começa no fim ou depois
+        i = bisect_right(self.fins, inicio)
+        return i == len(self.fins) or self.inicios[i] >= fim
+
+    def ocupar(self, inicio: int, fim: int):
+        """Acrescenta um intervalo (importação em lote), mantendo os blocos disjuntos."""
+        intervalos = list(zip(self.inicios, self.fins))
+        insort(intervalos, (inicio, fim))
+        self.__init__(intervalos)
+
+
+class AgendaRecursos:
+    """Índices de todos os recursos ativos em um dia."""
+
+    def __init__(self, intervalos_por_recurso: dict, recursos=None):
+        recursos = obter_recursos() if recursos is None else recursos
+        # Agendamentos sem recurso (chave None) bloqueiam todos os recursos
+        gerais = intervalos_por_recurso.get(None, [])
+        self.indices = {
+            recurso.id: IndiceRecurso(intervalos_por_recurso.get(recurso.id, []) + gerais)
+            for recurso in recursos
+        }
+
+    def escolher(self, recursos, inicio: int, fim: int, preferido: int = None):
+        """
+        Recurso livre em [inicio, fim) entre os informados: o preferido (edição,
+        para não trocar de profissional à toa) ou o menos ocupado do dia. None se não houver.
+        """
+        livres = [r.id for r in recursos if r.id in self.indices and self.indices[r.id].livre(inicio, fim)]
+        if not livres:
+            return None
+        if preferido in livres:
+            return preferido
+        return min(livres, key=lambda recurso_id: self.indices[recurso_id].minutos)
+
+    def algum_livre(self, recursos, inicio: int, fim: int) -> bool:
+        return any(r.id in self.indices and self.indices[r.id].livre(inicio, fim) for r in recursos)
+
+    def inicios_livres(self, recursos, candidatos, duracao_minutos: int) -> list:
+        return [c for c in candidatos if self.algum_livre(recursos, c, c + duracao_minutos)]
+
+    def ocupar(self, recurso_id: int, inicio: int, fim: int):
+        self.indices[recurso_id].ocupar(inicio, fim)
+
+
+# ------------------------------------------------------------------------------
+# Carga do banco
+# ------------------------------------------------------------------------------
+
+def _agrupar(linhas, por_dia: bool) -> dict:
+    grupos = {}
+    for *chave, horario_inicio, duracao in linhas:
+        inicio = services.horario_para_minutos(horario_inicio)
+        destino = grupos.setdefault(chave[0], {}) if por_dia else grupos
+        destino.setdefault(chave[-1], []).append((inicio, inicio + duracao))
+    return grupos
+
+
+def carregar_intervalos_recursos(data_agendamento: date, agendamento_id: int = None) -> dict:
+    """Uma query: {recurso_id ou None: [(inicio, fim)]} dos agendamentos ativos do dia."""
+    agendamentos = Agendamento.objects.filter(data=data_agendamento, status__in=services.STATUS_ATIVOS)
+    if agendamento_id:
+        agendamentos = agendamentos.exclude(id=agendamento_id)
+    return _agrupar(agendamentos.values_list('recurso_id', 'horario_inicio', 'duracao_total_minutos'), False)
+
+
+def carregar_intervalos_recursos_periodo(data_inicio: date, data_fim: date) -> dict:
+    """Uma query: {data: {recurso_id ou None: [(inicio, fim)]}} do período (inclusive)."""
+    linhas = Agendamento.objects.filter(
+        data__range=(data_inicio, data_fim), status__in=services.STATUS_ATIVOS,
+    ).values_list('data', 'recurso_id', 'horario_inicio', 'duracao_total_minutos')
+    return _agrupar(linhas, True)
+
+
+_intervalos_dia = CacheDoisNiveis('ocupacao_recursos', tamanho_l1=256)
+
+
+def agenda_do_dia(data_agendamento: date, agendamento_id: int = None) -> AgendaRecursos:
+    """
+    Agenda dos recursos no dia. Sem agendamento a desconsiderar, os intervalos vêm
+    do cache, sob a versão de disponibilidade do dia (que muda a cada alteração).
+    """
+    if agendamento_id:
+        return AgendaRecursos(carregar_intervalos_recursos(data_agendamento, agendamento_id))
+    chave = f'{data_agendamento.isoformat()}:{ocupacao.versao_dia(data_agendamento)}'
+    intervalos = _intervalos_dia.get_or_compute(
+        chave, lambda: carregar_intervalos_recursos(data_agendamento), ocupacao.VERSAO_TIMEOUT,
+    )
+    return AgendaRecursos(intervalos)
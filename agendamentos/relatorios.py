@@ -0,0 +1,175 @@
+# agendamentos/relatorios.py
+
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import Agendamento, ResumoDiario
+from .catalogo import obter_catalogo
+from . import services
+
+# ==============================================================================
+# Resumos Diários (receita, status, pagamento e serviços por dia)
+# ==============================================================================
+#
+# Cada dia com agendamentos tem poucas linhas em ResumoDiario. Alterar um
+# agendamento recalcula apenas o(s) dia(s) afetado(s) — O(agendamentos do dia) —
+# e os relatórios leem só a tabela de resumo: um mês custa O(dias), não
+# O(agendamentos).
+
+MAX_DIAS_RELATORIO = 366
+
+# Dias com recálculo pendente na thread (conexão) atual, feito após o commit
+_pendentes = threading.local()
+
+
+def agendar_recalculo(data: date):
+    """
+    Recalcula o dia depois do commit da transação atual (na hora, fora de uma).
+    Usado pelos signals: dentro da transação de quem alterou o agendamento o
+    lock do dia inverteria a ordem de travas entre remarcações A->B e B->A, e
+    um agendamento com serviços dispararia o recálculo duas vezes (post_save e
+    m2m_changed). Os dias se acumulam e o primeiro callback após o commit
+    recalcula todos, um por transação.
+    """
+    dias = getattr(_pendentes, 'dias', None)
+    if dias is None:
+        dias = _pendentes.dias = set()
+    dias.add(data)
+    # Um callback por chamada: se um savepoint desfeito descartar um deles, outro cobre o dia.
+    # robust: uma falha no resumo é registrada no log e não derruba quem já gravou o agendamento
+    transaction.on_commit(_recalcular_pendentes, robust=True)
+
+
+def _recalcular_pendentes():
+    dias = getattr(_pendentes, 'dias', None)
+    while dias:
+        dia = min(dias)
+        recalcular_dia(dia)
+        dias.discard(dia)  # Só depois de recalculado: com erro, o próximo commit da thread tenta de novo
+
+
+def recalcular_dia(data: date):
+    """Refaz as linhas de resumo de um dia a partir dos agendamentos."""
+    with transaction.atomic():
+        # Serializa com reservas e outros recálculos do mesmo dia
+        services.bloquear_dia(data)
+
+        agendamentos = Agendamento.objects.filter(data=data)
+        totais = agendamentos.values('status', 'forma_pagamento').annotate(
+            quantidade=Count('id'),
+            valor=Sum('valor_total'),
+            minutos=Sum('duracao_total_minutos'),
+        ).order_by()
+        por_servico = Agendamento.servicos.through.objects.filter(agendamento__data=data).values(
+            'servico_id', 'agendamento__status', 'agendamento__forma_pagamento',
+        ).annotate(
+            quantidade=Count('id'),
+            minutos=Sum('agendamento__duracao_total_minutos'),
+        ).order_by()
+
+        linhas = [
+            ResumoDiario(
+                data=data, status=t['status'], forma_pagamento=t['forma_pagamento'],
+                quantidade=t['quantidade'], valor_total=t['valor'] or 0, minutos=t['minutos'] or 0,
+            )
+            for t in totais
+        ]
+        linhas += [
+            ResumoDiario(
+                data=data, servico_id=s['servico_id'], status=s['agendamento__status'],
+                forma_pagamento=s['agendamento__forma_pagamento'],
+                quantidade=s['quantidade'], minutos=s['minutos'] or 0,
+            )
+            for s in por_servico
+        ]
+
+        ResumoDiario.objects.filter(data=data).delete()
+        ResumoDiario.objects.bulk_create(linhas)
+
+
+def dias_com_dados(data_inicio: date = None, data_fim: date = None):
+    """Dias que têm agendamentos ou resumos (estes podem estar obsoletos) no período."""
+    filtros = {}
+    if data_inicio:
+        filtros['data__gte'] = data_inicio
+    if data_fim:
+        filtros['data__lte'] = data_fim
+    dias = set(Agendamento.objects.filter(**filtros).values_list('data', flat=True).distinct())
+    dias |= set(ResumoDiario.objects.filter(**filtros).values_list('data', flat=True).distinct())
+    return sorted(dias)
+
+# ------------------------------------------------------------------------------
+# Leitura (painel da equipe)
+# ------------------------------------------------------------------------------
+
+def _receita(status, valor):
+    return Decimal(0) if status == 'cancelado' else (valor or Decimal(0))
+
+
+def resumo_periodo(data_inicio: date, data_fim: date) -> dict:
+    """
+    Consolida o período lendo apenas ResumoDiario. A receita desconsidera
+    agendamentos cancelados; quantidades por status incluem todos.
+    """
+    linhas = ResumoDiario.objects.filter(data__gte=data_inicio, data__lte=data_fim)
+
+    totais = linhas.filter(servico__isnull=True).values_list(
+        'data', 'status', 'forma_pagamento', 'quantidade', 'valor_total', 'minutos'
+    )
+    por_dia = {}
+    por_status = {}
+    por_pagamento = {}
+    geral = {'quantidade': 0, 'receita': Decimal(0), 'minutos': 0}
+
+    for dia, status, forma, quantidade, valor, minutos in totais:
+        receita = _receita(status, valor)
+        item = por_dia.setdefault(dia, {'quantidade': 0, 'cancelados': 0, 'receita': Decimal(0)})
+        item['quantidade'] += quantidade
+        item['receita'] += receita
+        if status == 'cancelado':
+            item['cancelados'] += quantidade
+        else:
+            geral['minutos'] += minutos
+
+        status_item = por_status.setdefault(status, {'quantidade': 0, 'valor': Decimal(0)})
+        status_item['quantidade'] += quantidade
+        status_item['valor'] += valor or 0
+
+        pagamento_item = por_pagamento.setdefault(forma, {'quantidade': 0, 'receita': Decimal(0)})
+        pagamento_item['quantidade'] += quantidade
+        pagamento_item['receita'] += receita
+
+        geral['quantidade'] += quantidade
+        geral['receita'] += receita
+
+    catalogo = obter_catalogo()
+    por_servico = []
+    servicos = linhas.filter(servico__isnull=False).exclude(status='cancelado').values('servico_id').annotate(
+        quantidade=Sum('quantidade'), minutos=Sum('minutos'),
+    ).order_by('-quantidade', 'servico_id')
+    for s in servicos:
+        servico = catalogo.get(s['servico_id'])
+        por_servico.append({
+            'id': s['servico_id'],
+            'nome': servico.nome if servico else '',
+            'quantidade': s['quantidade'],
+            'minutos': s['minutos'],
+        })
+
+    return {
+        'totais': geral,
+        'por_dia': [{'data': dia, **por_dia[dia]} for dia in sorted(por_dia)],
+        'por_status': por_status,
+        'por_forma_pagamento': por_pagamento,
+        'por_servico': por_servico,
+    }
+
+
+def periodo_do_mes(referencia: date):
+    inicio = referencia.replace(day=1)
+    proximo = (inicio + timedelta(days=32)).replace(day=1)
+    return inicio, proximo - timedelta(days=1)
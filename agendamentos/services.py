@@ -1,8 +1,17 @@
 # agendamentos/services.py
 
+from bisect import bisect_left, bisect_right
 from datetime import datetime, timedelta, date, time
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch, Q
+from django.db.models.functions import Substr
 from django.utils import timezone
-from .models import Servico, Agendamento
+from .models import Servico, Agendamento, DiaAgenda
+from .catalogo import obter_catalogo
+from . import expediente, ocupacao, recursos
+
+# Status que ocupam a agenda (agendamentos cancelados ou realizados liberam o slot)
+STATUS_ATIVOS = ['agendado', 'confirmado']
 
 # ==============================================================================
 # Funções de Auxílio para Cálculo de Duração e Slot
@@ -14,83 +23,432 @@ def calcular_duracao_total(servicos_ids: list) -> int:
     # Converte as IDs (strings) para inteiros
     servicos_ids = [int(sid) for sid in servicos_ids if sid]
     
-    # Busca e soma a duração_minutos dos serviços
-    duracao_soma = sum(
-        Servico.objects.filter(id=sid).values_list('duracao_minutos', flat=True).first() or 0 
-        for sid in servicos_ids
-    )
+    # Soma a duracao_minutos a partir do snapshot do catálogo (sem query)
+    duracao_soma = obter_catalogo().duracao_total(servicos_ids)
     
     # Retorna a duração mínima de 15 minutos (ou a soma)
     return max(15, duracao_soma)
 
-def gerar_horarios_possiveis(intervalo_minutos=15) -> list:
+def gerar_horarios_possiveis(intervalo_minutos=15, data_agendamento: date = None) -> list:
     """
-    Gera uma lista de strings de horário ('HH:MM') em um intervalo de 15 minutos, 
-    excluindo o horário de almoço.
+    Gera uma lista de strings de horário ('HH:MM') a cada `intervalo_minutos`,
+    conforme o expediente cadastrado (padrão: 08:00-18:00, sem o almoço).
+    Com `data_agendamento`, usa o modelo daquele dia e descarta os fechamentos;
+    sem ela, reúne os horários de todos os dias da semana.
     """
-    horarios = []
-    # Define o horário de início (8:00) e fim (18:00) do dia de trabalho
-    inicio = datetime.strptime("08:00", "%H:%M")
-    fim = datetime.strptime("18:00", "%H:%M")
-    
-    # Intervalo de almoço
-    almoco_inicio = datetime.strptime("12:00", "%H:%M")
-    almoco_fim = datetime.strptime("14:00", "%H:%M")
-
-    current = inicio
-    while current < fim:
-        # Pula o intervalo de almoço
-        if current >= almoco_inicio and current < almoco_fim:
-            current += timedelta(minutes=intervalo_minutos)
-            continue
-            
-        horarios.append(current.strftime("%H:%M"))
-        current += timedelta(minutes=intervalo_minutos)
-        
-    return horarios
+    atual = expediente.obter_expediente()
+    if data_agendamento is not None:
+        inicios = atual.inicios(data_agendamento, intervalo_minutos)
+    else:
+        inicios = sorted({m for dia in range(7) for m in atual.modelo(dia, intervalo_minutos)})
+    return [minutos_para_horario(m) for m in inicios]
+
+def inicio_no_expediente(data_agendamento: date, inicio_minutos: int) -> bool:
+    """O início (em minutos) é um dos inícios do expediente do dia?"""
+    inicios_dia = expediente.inicios_do_dia(data_agendamento)
+    i = bisect_left(inicios_dia, inicio_minutos)
+    return i < len(inicios_dia) and inicios_dia[i] == inicio_minutos
 
 def checar_conflito_agendamento(
     data_agendamento: date, 
     horario_inicio_str: str, 
     duracao_minutos: int, 
-    agendamento_id: int = None
+    agendamento_id: int = None,
+    servicos_ids: list = None
 ) -> bool:
     """
     Verifica se o intervalo completo (inicio + duração) está livre,
     considerando agendamentos existentes. Retorna True se estiver LIVRE.
+    Com recursos cadastrados, basta um recurso elegível para `servicos_ids` estar livre.
+    Inícios fora do expediente do dia (pausas, dias fechados, feriados) nunca estão livres.
     """
     
-    # Converte horário de início (string 'HH:MM') para objeto datetime completo
-    horario_inicio_dt = datetime.strptime(horario_inicio_str, '%H:%M')
-    horario_inicio_completo = datetime.combine(data_agendamento, horario_inicio_dt.time())
+    inicio = horario_para_minutos(horario_inicio_str)
+    fim = inicio + duracao_minutos
+
+    if not inicio_no_expediente(data_agendamento, inicio):
+        return False
+
+    if recursos.obter_recursos():
+        agenda = recursos.agenda_do_dia(data_agendamento, agendamento_id)
+        return agenda.algum_livre(recursos.elegiveis(servicos_ids), inicio, fim)
     
-    # Calcular o horário de fim do novo agendamento
-    horario_fim_agendamento = horario_inicio_completo + timedelta(minutes=duracao_minutos)
+    # Na edição, o próprio agendamento precisa ser desconsiderado: consulta os
+    # intervalos do dia sem ele (o bitmap não sabe a quem pertence cada slot).
+    if agendamento_id:
+        intervalos = carregar_intervalos_dia(data_agendamento, agendamento_id)
+        return bool(calcular_inicios_livres(intervalos, [inicio], duracao_minutos))
     
-    # 1. Buscar agendamentos existentes no mesmo dia (excluindo o que está sendo editado)
+    # Caso comum: um AND entre o bitmap de ocupação do dia e a máscara do intervalo
+    return ocupacao.intervalo_livre(ocupacao.obter_mapa(data_agendamento), inicio, fim)
+
+# ==============================================================================
+# Motor de Disponibilidade (varredura única sobre intervalos em minutos)
+# ==============================================================================
+
+def horario_para_minutos(horario) -> int:
+    """Converte um horário ('HH:MM' ou datetime.time) em minutos desde 00:00."""
+    if isinstance(horario, str):
+        horas, minutos = horario.split(':')
+        return int(horas) * 60 + int(minutos)
+    return horario.hour * 60 + horario.minute
+
+def minutos_para_horario(minutos: int) -> str:
+    """Converte minutos desde 00:00 em uma string 'HH:MM'."""
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+def carregar_intervalos_dia(data_agendamento: date, agendamento_id: int = None) -> list:
+    """
+    Carrega, com uma única query, os agendamentos ativos do dia como uma lista
+    ordenada de intervalos (inicio, fim) em minutos.
+    """
     agendamentos_dia = Agendamento.objects.filter(
         data=data_agendamento,
-        status__in=['agendado', 'confirmado']
+        status__in=STATUS_ATIVOS
     )
     if agendamento_id:
         agendamentos_dia = agendamentos_dia.exclude(id=agendamento_id)
-    
-    # 2. Checar conflito com cada agendamento existente
-    for agendamento in agendamentos_dia:
-        
-        # Início do agendamento existente (TimeField + Data)
-        agendamento_inicio = datetime.combine(data_agendamento, agendamento.horario_inicio)
-        
-        # Fim do agendamento existente (Início + Duração)
-        agendamento_fim = agendamento_inicio + timedelta(minutes=agendamento.duracao_total_minutos)
-
-        # Lógica de Conflito
-        conflito = (
-            (horario_inicio_completo < agendamento_fim) and 
-            (horario_fim_agendamento > agendamento_inicio)
+
+    intervalos = []
+    for horario_inicio, duracao in agendamentos_dia.values_list('horario_inicio', 'duracao_total_minutos'):
+        inicio = horario_para_minutos(horario_inicio)
+        intervalos.append((inicio, inicio + duracao))
+    intervalos.sort()
+    return intervalos
+
+def mesclar_intervalos(intervalos: list) -> list:
+    """Une intervalos ordenados que se sobrepõem ou se tocam em blocos ocupados disjuntos."""
+    blocos = []
+    for inicio, fim in intervalos:
+        if blocos and inicio <= blocos[-1][1]:
+            if fim > blocos[-1][1]:
+                blocos[-1][1] = fim
+        else:
+            blocos.append([inicio, fim])
+    return blocos
+
+def calcular_inicios_livres(intervalos: list, candidatos: list, duracao_minutos: int) -> list:
+    """
+    Retorna os candidatos (minutos, em ordem crescente) cujo intervalo
+    [inicio, inicio + duração) não sobrepõe nenhum intervalo ocupado.
+
+    Os intervalos devem estar ordenados pelo início. Depois de mesclados em blocos
+    disjuntos, candidatos e blocos avançam juntos: a varredura é O(candidatos + blocos).
+    """
+    blocos = mesclar_intervalos(intervalos)
+    livres = []
+    i = 0
+    total = len(blocos)
+
+    for inicio in candidatos:
+        # Avança até o primeiro bloco que ainda não terminou neste início
+        while i < total and blocos[i][1] <= inicio:
+            i += 1
+        if i == total or blocos[i][0] >= inicio + duracao_minutos:
+            livres.append(inicio)
+
+    return livres
+
+def horarios_disponiveis(
+    data_agendamento: date,
+    duracao_minutos: int,
+    minimo_minutos: int = None,
+    agendamento_id: int = None,
+    servicos_ids: list = None
+) -> list:
+    """
+    Lista os horários ('HH:MM') livres do dia para a duração informada.
+    Sem agendamento a desconsiderar, usa o bitmap de ocupação (nenhuma query em
+    cache hit); caso contrário, faz uma única query e uma varredura.
+    `minimo_minutos` descarta slots anteriores a esse horário (ex.: horas já passadas de hoje).
+    Com recursos cadastrados, consulta o índice de cada recurso elegível para `servicos_ids`.
+    """
+    candidatos = expediente.inicios_do_dia(data_agendamento, minimo_minutos)
+
+    if recursos.obter_recursos():
+        agenda = recursos.agenda_do_dia(data_agendamento, agendamento_id)
+        livres = agenda.inicios_livres(recursos.elegiveis(servicos_ids), candidatos, duracao_minutos)
+    elif agendamento_id:
+        intervalos = carregar_intervalos_dia(data_agendamento, agendamento_id)
+        livres = calcular_inicios_livres(intervalos, candidatos, duracao_minutos)
+    else:
+        mapa = ocupacao.obter_mapa(data_agendamento)
+        inicios = ocupacao.inicios_livres(mapa, duracao_minutos)
+        livres = [
+            c for c in candidatos
+            if (inicios >> (c // ocupacao.DURACAO_SLOT) & 1 if c % ocupacao.DURACAO_SLOT == 0
+                # Fora da grade (expediente gravado sem validação): a janela não coincide com os slots
+                else ocupacao.intervalo_livre(mapa, c, c + duracao_minutos))
+        ]
+    return [minutos_para_horario(m) for m in livres]
+
+def minimo_minutos_para(data_agendamento: date):
+    """
+    Primeiro minuto agendável na data: None para datas futuras, o horário atual
+    + 15 minutos para hoje e o fim do dia (nenhum slot) para datas passadas.
+    """
+    agora_local = timezone.localtime(timezone.now())
+    hoje = agora_local.date()
+    if data_agendamento > hoje:
+        return None
+    if data_agendamento < hoje:
+        return 24 * 60
+
+    hora_minima_para_agendar = agora_local + timedelta(minutes=15)
+    if hora_minima_para_agendar.date() > hoje:
+        return 24 * 60  # Já não há mais horários hoje
+    return horario_para_minutos(hora_minima_para_agendar.time())
+
+# ==============================================================================
+# Calendário de Disponibilidade (vários dias com uma única query)
+# ==============================================================================
+
+MAX_DIAS_CALENDARIO = 62
+
+def carregar_intervalos_periodo(data_inicio: date, data_fim: date) -> dict:
+    """
+    Carrega, com uma única query de intervalo, os agendamentos ativos entre as
+    datas (inclusive), agrupados por dia como listas ordenadas de (inicio, fim) em minutos.
+    """
+    linhas = Agendamento.objects.filter(
+        data__range=(data_inicio, data_fim),
+        status__in=STATUS_ATIVOS
+    ).order_by('data', 'horario_inicio').values_list('data', 'horario_inicio', 'duracao_total_minutos')
+
+    intervalos_por_dia = {}
+    for data_agendamento, horario_inicio, duracao in linhas:
+        inicio = horario_para_minutos(horario_inicio)
+        intervalos_por_dia.setdefault(data_agendamento, []).append((inicio, inicio + duracao))
+    return intervalos_por_dia
+
+def calendario_disponibilidade(
+    data_inicio: date, data_fim: date, duracao_minutos: int, servicos_ids: list = None
+) -> dict:
+    """
+    Retorna {data: [minutos livres]} para cada dia do período, respeitando o
+    filtro de horários passados. Custa uma única query, qualquer que seja o período.
+    """
+    atual = expediente.obter_expediente()
+    ativos = recursos.obter_recursos()
+    if ativos:
+        elegiveis = recursos.elegiveis(servicos_ids)
+        intervalos_por_dia = recursos.carregar_intervalos_recursos_periodo(data_inicio, data_fim)
+    else:
+        intervalos_por_dia = carregar_intervalos_periodo(data_inicio, data_fim)
+
+    calendario = {}
+    dia = data_inicio
+    while dia <= data_fim:
+        candidatos = atual.inicios(dia, minimo_minutos=minimo_minutos_para(dia))
+        if ativos:
+            agenda = recursos.AgendaRecursos(intervalos_por_dia.get(dia, {}), ativos)
+            calendario[dia] = agenda.inicios_livres(elegiveis, candidatos, duracao_minutos)
+        else:
+            calendario[dia] = calcular_inicios_livres(intervalos_por_dia.get(dia, []), candidatos, duracao_minutos)
+        dia += timedelta(days=1)
+    return calendario
+
+
+# ==============================================================================
+# Próximos Horários Livres (busca adiante, parando nos primeiros N)
+# ==============================================================================
+
+MAX_DIAS_PROXIMOS = 90
+MAX_PROXIMOS = 20
+JANELA_INICIAL_PROXIMOS = 7
+
+# Preferência de período do dia: faixa [inicio, fim) de minutos para o início do atendimento
+PERIODOS_DO_DIA = {
+    'manha': (0, 12 * 60),
+    'tarde': (12 * 60, 18 * 60),
+    'noite': (18 * 60, 24 * 60),
+}
+
+def inicios_nas_lacunas(inicios_blocos: list, fins_blocos: list, candidatos: tuple, duracao_minutos: int, limite: int) -> list:
+    """
+    Busca por lacunas: percorre os espaços livres entre blocos ocupados disjuntos e
+    ordenados e, com bisect, pega os candidatos (ordenados) que cabem inteiros em
+    cada um. Para assim que encontra `limite` inícios.
+    """
+    livres = []
+    anterior = 0
+    for inicio_bloco, fim_bloco in zip(inicios_blocos + [24 * 60], fins_blocos + [24 * 60]):
+        # Candidatos c com anterior <= c e c + duração <= início do bloco
+        primeiro = bisect_left(candidatos, anterior)
+        ultimo = bisect_right(candidatos, inicio_bloco - duracao_minutos)
+        if primeiro < ultimo:
+            livres.extend(candidatos[primeiro:min(ultimo, primeiro + limite - len(livres))])
+            if len(livres) >= limite:
+                break
+        anterior = max(anterior, fim_bloco)
+    return livres
+
+def _filtrar_periodo(candidatos: tuple, periodo) -> tuple:
+    if periodo is None:
+        return candidatos
+    inicio, fim = periodo
+    return candidatos[bisect_left(candidatos, inicio):bisect_left(candidatos, fim)]
+
+def proximos_horarios(
+    servicos_ids: list,
+    a_partir: date = None,
+    periodo: tuple = None,
+    quantidade: int = 5,
+    max_dias: int = MAX_DIAS_PROXIMOS
+) -> list:
+    """
+    Os primeiros `quantidade` (data, minutos) livres a partir de `a_partir` (padrão:
+    hoje), com início dentro de `periodo` (faixa de minutos, ex.: PERIODOS_DO_DIA['manha']).
+
+    Os agendamentos são lidos por janelas de dias com uma query de intervalo cada
+    (7 dias, depois 14, 28...): no caso comum a primeira janela já basta e a
+    busca termina sem ler o resto do horizonte de `max_dias`.
+    """
+    duracao = calcular_duracao_total(servicos_ids)
+    hoje = timezone.localdate()
+    dia = max(a_partir or hoje, hoje)
+    ultimo_dia = dia + timedelta(days=max_dias - 1)
+
+    atual = expediente.obter_expediente()
+    ativos = recursos.obter_recursos()
+    elegiveis = recursos.elegiveis(servicos_ids) if ativos else ()
+    if ativos and not elegiveis:
+        return []
+
+    encontrados = []
+    janela = JANELA_INICIAL_PROXIMOS
+    while dia <= ultimo_dia and len(encontrados) < quantidade:
+        fim_janela = min(dia + timedelta(days=janela - 1), ultimo_dia)
+        if ativos:
+            intervalos_por_dia = recursos.carregar_intervalos_recursos_periodo(dia, fim_janela)
+        else:
+            intervalos_por_dia = carregar_intervalos_periodo(dia, fim_janela)
+
+        while dia <= fim_janela and len(encontrados) < quantidade:
+            candidatos = _filtrar_periodo(atual.inicios(dia, minimo_minutos=minimo_minutos_para(dia)), periodo)
+            restantes = quantidade - len(encontrados)
+            if candidatos and ativos:
+                agenda = recursos.AgendaRecursos(intervalos_por_dia.get(dia, {}), ativos)
+                livres = set()
+                for recurso in elegiveis:
+                    indice = agenda.indices[recurso.id]
+                    livres.update(inicios_nas_lacunas(indice.inicios, indice.fins, candidatos, duracao, restantes))
+                livres = sorted(livres)[:restantes]
+            elif candidatos:
+                blocos = mesclar_intervalos(intervalos_por_dia.get(dia, []))
+                livres = inicios_nas_lacunas(
+                    [inicio for inicio, _ in blocos], [fim for _, fim in blocos], candidatos, duracao, restantes,
+                )
+            else:
+                livres = []
+            encontrados.extend((dia, minutos) for minutos in livres)
+            dia += timedelta(days=1)
+        janela *= 2
+    return encontrados
+
+
+# ==============================================================================
+# Reserva Transacional (sem agendamentos sobrepostos, mesmo sob concorrência)
+# ==============================================================================
+
+class HorarioIndisponivel(Exception):
+    """O intervalo pedido foi ocupado por outro agendamento."""
+
+def bloquear_dia(data_agendamento: date):
+    """
+    Trava a linha DiaAgenda do dia até o fim da transação atual. No caso comum
+    custa um único UPDATE; a linha só é criada no primeiro agendamento do dia.
+    """
+    while not DiaAgenda.objects.filter(data=data_agendamento).update(versao=F('versao') + 1):
+        try:
+            with transaction.atomic():
+                DiaAgenda.objects.create(data=data_agendamento)
+        except IntegrityError:
+            pass  # Outra reserva criou a linha primeiro; o UPDATE seguinte espera por ela
+
+def reservar_horario(agendamento: Agendamento, servicos_ids: list, agendamento_id: int = None) -> Agendamento:
+    """
+    Grava o agendamento e seus serviços em uma transação que serializa as reservas
+    do mesmo dia. A checagem de conflito é refeita contra o banco depois do lock,
+    então duas reservas simultâneas para o mesmo horário nunca passam juntas.
+    Com recursos cadastrados, atribui um recurso elegível livre (na edição, mantém
+    o atual se possível). Levanta HorarioIndisponivel se o intervalo estiver ocupado.
+    """
+    with transaction.atomic():
+        bloquear_dia(agendamento.data)
+
+        inicio = horario_para_minutos(agendamento.horario_inicio)
+        fim = inicio + agendamento.duracao_total_minutos
+        if recursos.obter_recursos():
+            agenda = recursos.AgendaRecursos(recursos.carregar_intervalos_recursos(agendamento.data, agendamento_id))
+            recurso_id = agenda.escolher(
+                recursos.elegiveis(servicos_ids), inicio, fim, preferido=agendamento.recurso_id,
+            )
+            if recurso_id is None:
+                raise HorarioIndisponivel()
+            agendamento.recurso_id = recurso_id
+        elif not calcular_inicios_livres(
+            carregar_intervalos_dia(agendamento.data, agendamento_id), [inicio], agendamento.duracao_total_minutos
+        ):
+            raise HorarioIndisponivel()
+
+        agendamento.save()
+        agendamento.servicos.set(servicos_ids)
+    return agendamento
+
+
+# ==============================================================================
+# Listagem "Meus Agendamentos" (paginação por cursor)
+# ==============================================================================
+
+AGENDAMENTOS_POR_PAGINA = 20
+
+# Apenas as colunas exibidas na listagem (os campos de texto longos ficam de fora)
+CAMPOS_LISTAGEM = (
+    'id', 'nome_pet', 'status', 'data', 'horario_inicio', 'duracao_total_minutos',
+    'rua', 'numero', 'bairro', 'complemento', 'data_criacao',
+)
+TAMANHO_RESUMO_OBSERVACOES = 140
+
+def codificar_cursor(agendamento) -> str:
+    return f"{agendamento.data.isoformat()}_{agendamento.horario_inicio.strftime('%H%M')}_{agendamento.id}"
+
+def decodificar_cursor(cursor: str):
+    """Converte o cursor em (data, horario, id); None se ausente ou inválido."""
+    try:
+        data_str, horario_str, id_str = cursor.split('_')
+        return date.fromisoformat(data_str), datetime.strptime(horario_str, '%H%M').time(), int(id_str)
+    except (AttributeError, ValueError):
+        return None
+
+def pagina_agendamentos(queryset, cursor: str = None, por_pagina: int = AGENDAMENTOS_POR_PAGINA):
+    """
+    Uma página da listagem em ordem (-data, horario_inicio, id), a partir do cursor.
+    Usa paginação por cursor (keyset): o custo não cresce com o número de páginas.
+    Retorna (agendamentos, cursor da próxima página ou None). Custa duas queries:
+    a página e o prefetch dos serviços.
+    """
+    queryset = (
+        queryset
+        .only(*CAMPOS_LISTAGEM)
+        .annotate(observacoes_resumo=Substr('observacoes', 1, TAMANHO_RESUMO_OBSERVACOES))
+        .prefetch_related(Prefetch('servicos', queryset=Servico.objects.only('id', 'nome')))
+        .order_by('-data', 'horario_inicio', 'id')
+    )
+
+    posicao = decodificar_cursor(cursor)
+    if posicao:
+        data_cursor, horario_cursor, id_cursor = posicao
+        queryset = queryset.filter(
+            Q(data__lt=data_cursor)
+            | Q(data=data_cursor, horario_inicio__gt=horario_cursor)
+            | Q(data=data_cursor, horario_inicio=horario_cursor, id__gt=id_cursor)
         )
 
-        if conflito:
-            return False  # Slot OCUPADO
-            
-    return True # Slot LIVRE
\ No newline at end of file
+    # Busca um item a mais só para saber se existe próxima página
+    agendamentos = list(queryset[:por_pagina + 1])
+    proximo_cursor = None
+    if len(agendamentos) > por_pagina:
+        agendamentos = agendamentos[:por_pagina]
+        proximo_cursor = codificar_cursor(agendamentos[-1])
+    return agendamentos, proximo_cursor
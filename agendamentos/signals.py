@@ -0,0 +1,179 @@
+# agendamentos/signals.py
+
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import (
+    Servico, Agendamento, Pet, PerfilUsuario, Recurso,
+    HorarioFuncionamento, PausaExpediente, FechamentoAgenda,
+)
+from .catalogo import invalidar_catalogo
+from .services import STATUS_ATIVOS, horario_para_minutos
+from . import busca, expediente, imagens, ocupacao, recursos, relatorios
+
+# ==============================================================================
+# Catálogo de Serviços
+# ==============================================================================
+
+@receiver(post_save, sender=Servico)
+@receiver(post_delete, sender=Servico)
+def servico_alterado(sender, instance, **kwargs):
+    """Qualquer alteração em Servico (inclusive list_editable do admin) invalida o snapshot."""
+    invalidar_catalogo()
+
+@receiver(pre_save, sender=Servico)
+def guardar_imagem_anterior(sender, instance, **kwargs):
+    instance._imagem_anterior = None
+    if instance.pk:
+        instance._imagem_anterior = Servico.objects.filter(pk=instance.pk).values_list('imagem', flat=True).first()
+
+@receiver(post_save, sender=Servico)
+def gerar_derivados_da_imagem(sender, instance, **kwargs):
+    """Nova imagem (ou imagem removida): agenda a geração dos derivados no worker."""
+    if (instance.imagem.name or None) != (getattr(instance, '_imagem_anterior', None) or None):
+        imagens.processar_imagem_servico.enfileirar(instance.pk)
+
+# ==============================================================================
+# Recursos (profissionais e veículos)
+# ==============================================================================
+
+@receiver(post_save, sender=Recurso)
+@receiver(post_delete, sender=Recurso)
+def recurso_alterado(sender, instance, **kwargs):
+    recursos.invalidar_recursos()
+
+@receiver(m2m_changed, sender=Recurso.servicos.through)
+def elegibilidade_alterada(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        recursos.invalidar_recursos()
+
+# ==============================================================================
+# Expediente (horários de funcionamento, pausas e fechamentos)
+# ==============================================================================
+
+@receiver(post_save, sender=HorarioFuncionamento)
+@receiver(post_delete, sender=HorarioFuncionamento)
+@receiver(post_save, sender=PausaExpediente)
+@receiver(post_delete, sender=PausaExpediente)
+@receiver(post_save, sender=FechamentoAgenda)
+@receiver(post_delete, sender=FechamentoAgenda)
+def expediente_alterado(sender, instance, **kwargs):
+    """Os modelos de horários são recompilados na próxima consulta."""
+    expediente.invalidar_expediente()
+
+# ==============================================================================
+# Índice de Ocupação (agendar, editar, cancelar e excluir)
+# ==============================================================================
+
+# Trocar só o recurso também altera a disponibilidade (libera um profissional, ocupa outro)
+CAMPOS_OCUPACAO = ('data', 'horario_inicio', 'duracao_total_minutos', 'status', 'recurso_id')
+# Campos que entram nos resumos diários (além de data, duração e status)
+CAMPOS_RESUMO = ('forma_pagamento', 'valor_total')
+
+def _estado_ocupacao(agendamento):
+    return tuple(getattr(agendamento, campo) for campo in CAMPOS_OCUPACAO)
+
+def _estado_resumo(agendamento):
+    return tuple(getattr(agendamento, campo) for campo in CAMPOS_OCUPACAO + CAMPOS_RESUMO)
+
+@receiver(pre_save, sender=Agendamento)
+def guardar_estado_anterior(sender, instance, **kwargs):
+    """Guarda como o agendamento ocupava a agenda (e os resumos) antes da alteração."""
+    instance._ocupacao_anterior = None
+    instance._resumo_anterior = None
+    if instance.pk:
+        anterior = (
+            Agendamento.objects.filter(pk=instance.pk).values_list(*CAMPOS_OCUPACAO, *CAMPOS_RESUMO).first()
+        )
+        if anterior:
+            instance._ocupacao_anterior = anterior[:len(CAMPOS_OCUPACAO)]
+            instance._resumo_anterior = anterior
+
+@receiver(post_save, sender=Agendamento)
+def atualizar_ocupacao(sender, instance, **kwargs):
+    anterior = getattr(instance, '_ocupacao_anterior', None)
+    atual = _estado_ocupacao(instance)
+    if anterior == atual:
+        return  # Alterou apenas campos que não afetam a agenda
+
+    # Saiu da agenda (cancelamento, troca de data/horário/recurso): o dia é reconstruído
+    dia_reconstruido = None
+    if anterior and anterior[3] in STATUS_ATIVOS:
+        dia_reconstruido = anterior[0]
+        ocupacao.invalidar_dia(dia_reconstruido)
+    # Entrou nela: os slots são ligados no mapa após o commit, sem reconstruir o dia
+    if atual[3] in STATUS_ATIVOS and atual[0] != dia_reconstruido:
+        inicio = horario_para_minutos(atual[1])
+        ocupacao.ocupar_intervalo(atual[0], inicio, inicio + atual[2])
+
+@receiver(post_delete, sender=Agendamento)
+def liberar_ocupacao(sender, instance, **kwargs):
+    if instance.status in STATUS_ATIVOS:
+        ocupacao.invalidar_dia(instance.data)
+
+# ==============================================================================
+# Resumos Diários (recalculados após o commit, uma vez por dia)
+# ==============================================================================
+
+@receiver(post_save, sender=Agendamento)
+def atualizar_resumos(sender, instance, **kwargs):
+    anterior = getattr(instance, '_resumo_anterior', None)
+    if anterior == _estado_resumo(instance):
+        return
+    dias = {instance.data}
+    if anterior:
+        dias.add(anterior[0])
+    for dia in dias:
+        relatorios.agendar_recalculo(dia)
+
+@receiver(post_delete, sender=Agendamento)
+def remover_dos_resumos(sender, instance, **kwargs):
+    relatorios.agendar_recalculo(instance.data)
+
+@receiver(m2m_changed, sender=Agendamento.servicos.through)
+def servicos_do_agendamento_alterados(sender, instance, action, reverse, pk_set, **kwargs):
+    """Contagens por serviço mudam quando o M2M muda (nos dois sentidos da relação)."""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            relatorios.agendar_recalculo(instance.data)
+        return
+
+    # Pelo lado do serviço: os dias vêm dos agendamentos afetados
+    if action == 'pre_clear':
+        instance._dias_resumo = set(instance.agendamento_set.values_list('data', flat=True))
+        return
+    if action == 'post_clear':
+        dias = getattr(instance, '_dias_resumo', set())
+    elif action in ('post_add', 'post_remove'):
+        dias = set(Agendamento.objects.filter(pk__in=pk_set).values_list('data', flat=True))
+    else:
+        return
+    for dia in dias:
+        relatorios.agendar_recalculo(dia)
+
+# ==============================================================================
+# Índice de Busca Textual
+# ==============================================================================
+
+TIPOS_BUSCA = {Agendamento: 'agendamento', Pet: 'pet', PerfilUsuario: 'perfil'}
+
+@receiver(post_save, sender=Agendamento)
+@receiver(post_save, sender=Pet)
+@receiver(post_save, sender=PerfilUsuario)
+def indexar_para_busca(sender, instance, **kwargs):
+    busca.indexar(TIPOS_BUSCA[sender], [instance.pk])
+
+@receiver(post_delete, sender=Agendamento)
+@receiver(post_delete, sender=Pet)
+@receiver(post_delete, sender=PerfilUsuario)
+def remover_da_busca(sender, instance, **kwargs):
+    busca.remover(TIPOS_BUSCA[sender], [instance.pk])
+
+@receiver(post_save, sender=User)
+def reindexar_dados_do_usuario(sender, instance, created, **kwargs):
+    """Nome, username e e-mail do usuário fazem parte dos documentos do perfil e dos pets."""
+    if created:
+        return
+    busca.indexar('perfil', PerfilUsuario.objects.filter(usuario=instance).values_list('pk', flat=True))
+    busca.indexar('pet', Pet.objects.filter(dono=instance).values_list('pk', flat=True))
@@ -0,0 +1,194 @@
+# agendamentos/tarefas.py
+
+import os
+import random
+import secrets
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+
+from .models import Tarefa
+
+# ==============================================================================
+# Fila de Tarefas em Segundo Plano (persistida no banco)
+# ==============================================================================
+#
+# Funções marcadas com @tarefa podem ser enfileiradas: enfileirar() grava uma
+# linha em Tarefa (na mesma transação de quem chamou, então a tarefa só existe
+# se os dados que ela vai processar também existirem) e o comando
+# `manage.py worker` reserva e executa as linhas pendentes, com novas
+# tentativas e backoff exponencial em caso de erro.
+
+FILA_PADRAO = 'padrao'
+
+# nome -> (função, fila, máximo de tentativas)
+_registro = {}
+
+
+class TarefaDesconhecida(Exception):
+    """Nenhuma função registrada com o nome da tarefa."""
+
+
+def _config(nome, padrao):
+    return getattr(settings, nome, padrao)
+
+
+def tarefa(nome=None, fila=FILA_PADRAO, max_tentativas=3):
+    """
+    Registra a função como tarefa. A função continua podendo ser chamada
+    diretamente; `funcao.enfileirar(*args, **kwargs)` a agenda para o worker.
+    Argumentos precisam ser serializáveis em JSON.
+    """
+    def decorar(funcao):
+        nome_tarefa = nome or f'{funcao.__module__}.{funcao.__qualname__}'
+        _registro[nome_tarefa] = (funcao, fila, max_tentativas)
+        funcao.nome_tarefa = nome_tarefa
+        funcao.enfileirar = lambda *args, **kwargs: enfileirar(nome_tarefa, *args, **kwargs)
+        return funcao
+    return decorar
+
+
+def enfileirar(nome: str, *args, atraso: float = 0, **kwargs) -> Tarefa:
+    if nome not in _registro:
+        raise TarefaDesconhecida(nome)
+    _, fila, max_tentativas = _registro[nome]
+    registro = Tarefa.objects.create(
+        fila=fila,
+        nome=nome,
+        argumentos={'args': list(args), 'kwargs': kwargs},
+        max_tentativas=max_tentativas,
+        executar_apos=timezone.now() + timedelta(seconds=atraso),
+    )
+    if _config('AGENDAMENTOS_TAREFAS_IMEDIATAS', False) and not atraso:
+        executar(registro)
+    return registro
+
+# ------------------------------------------------------------------------------
+# Execução (usado pelo worker)
+# ------------------------------------------------------------------------------
+
+def identificador_worker() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def reservar(fila: str, quantidade: int, worker: str) -> list:
+    """
+    Marca até `quantidade` tarefas vencidas da fila como "executando" para este
+    worker e devolve seus IDs. No PostgreSQL usa SKIP LOCKED (vários workers não
+    disputam as mesmas linhas); no SQLite a escrita já é serializada.
+
+    O UPDATE só vale para linhas ainda pendentes e grava um identificador único
+    desta reserva; os IDs devolvidos são relidos por ele, então uma linha que
+    outro worker levou entre a seleção e o UPDATE não é executada duas vezes.
+    """
+    if quantidade <= 0:
+        return []
+    agora = timezone.now()
+    reserva = f'{worker}:{secrets.token_hex(4)}'
+    with transaction.atomic():
+        candidatas = Tarefa.objects.filter(status='pendente', fila=fila, executar_apos__lte=agora)
+        if connection.features.has_select_for_update_skip_locked:
+            candidatas = candidatas.select_for_update(skip_locked=True)
+        ids = list(candidatas.order_by('executar_apos', 'id').values_list('id', flat=True)[:quantidade])
+        if not ids:
+            return []
+        reservadas = Tarefa.objects.filter(id__in=ids, status='pendente').update(
+            status='executando', worker=reserva, iniciada_em=agora,
+        )
+        if reservadas == len(ids):
+            return ids
+        return list(
+            Tarefa.objects.filter(id__in=ids, status='executando', worker=reserva)
+            .order_by('executar_apos', 'id').values_list('id', flat=True)
+        )
+
+
+def _backoff(tentativas: int) -> float:
+    base = _config('AGENDAMENTOS_TAREFAS_BACKOFF', 10)
+    espera = min(base * 2 ** (tentativas - 1), _config('AGENDAMENTOS_TAREFAS_BACKOFF_MAXIMO', 3600))
+    return espera * random.uniform(0.8, 1.2)  # Espalha as novas tentativas de falhas simultâneas
+
+
+def executar(registro: Tarefa):
+    """Executa uma tarefa e grava o resultado: concluída, nova tentativa agendada ou falha definitiva."""
+    funcao = _registro.get(registro.nome, (None,))[0]
+    registro.tentativas += 1
+    try:
+        if funcao is None:
+            raise TarefaDesconhecida(registro.nome)
+        funcao(*registro.argumentos.get('args', []), **registro.argumentos.get('kwargs', {}))
+    except Exception:
+        registro.erro = traceback.format_exc()
+        if registro.tentativas < registro.max_tentativas:
+            registro.status = 'pendente'
+            registro.executar_apos = timezone.now() + timedelta(seconds=_backoff(registro.tentativas))
+        else:
+            registro.status = 'falhou'
+            registro.concluida_em = timezone.now()
+    else:
+        registro.status = 'concluida'
+        registro.erro = ''
+        registro.concluida_em = timezone.now()
+    _com_novas_tentativas(lambda: Tarefa.objects.filter(pk=registro.pk).update(
+        status=registro.status, tentativas=registro.tentativas, erro=registro.erro,
+        executar_apos=registro.executar_apos, concluida_em=registro.concluida_em,
+    ))
+
+
+def _com_novas_tentativas(operacao, tentativas=5):
+    """
+    Executa uma operação curta no banco, tentando de novo se a tabela estiver
+    travada por outra escrita (o SQLite pode falhar na hora, sem esperar pelo
+    lock). Perder a gravação do resultado deixaria a tarefa "executando" até
+    recuperar_travadas() devolvê-la à fila, e ela rodaria de novo.
+    """
+    for tentativa in range(1, tentativas + 1):
+        try:
+            return operacao()
+        except OperationalError:
+            if tentativa == tentativas:
+                raise
+            time.sleep(0.05 * tentativa)
+
+
+def executar_por_id(tarefa_id: int):
+    """Ponto de entrada das threads/processos do worker."""
+    try:
+        registro = _com_novas_tentativas(
+            lambda: Tarefa.objects.filter(pk=tarefa_id, status='executando').first()
+        )
+        if registro:
+            executar(registro)
+    finally:
+        # Cada thread do pool tem sua própria conexão; não deixa conexões abertas para trás
+        connection.close()
+
+
+def recuperar_travadas() -> int:
+    """Devolve à fila tarefas "executando" há mais que AGENDAMENTOS_TAREFAS_TIMEOUT (worker interrompido)."""
+    limite = timezone.now() - timedelta(seconds=_config('AGENDAMENTOS_TAREFAS_TIMEOUT', 600))
+    return Tarefa.objects.filter(status='executando', iniciada_em__lt=limite).update(
+        status='pendente', worker='', executar_apos=timezone.now(),
+    )
+
+
+def executar_pendentes(filas=None) -> int:
+    """Executa em sequência, no processo atual, tudo o que estiver vencido (testes e cron)."""
+    worker = identificador_worker()
+    total = 0
+    if filas is None:
+        filas = Tarefa.objects.filter(status='pendente').values_list('fila', flat=True).distinct().order_by()
+    for fila in sorted(set(filas)):
+        while True:
+            ids = reservar(fila, 100, worker)
+            if not ids:
+                break
+            for registro in Tarefa.objects.filter(id__in=ids).order_by('executar_apos', 'id'):
+                executar(registro)
+            total += len(ids)
+    return total
@@ -0,0 +1,27 @@
+from django import template
+
+register = template.Library()
+
+# Larguras de exibição dos cards (grade col-lg-3 / col-md-4 / col-sm-6)
+SIZES_CARD = '(min-width: 992px) 25vw, (min-width: 768px) 33vw, (min-width: 576px) 50vw, 100vw'
+
+@register.inclusion_tag('agendamentos/imagem_servico.html')
+def imagem_servico(servico, classe='', estilo='', sizes=SIZES_CARD):
+    """
+    <picture> com srcset WebP/JPEG dos derivados e carregamento lazy. Enquanto
+    os derivados não existem, usa a imagem original.
+    """
+    larguras = servico.imagem_larguras
+    fallback = ''
+    if servico.imagem_hash and larguras:
+        # src para navegadores sem srcset: a largura intermediária disponível
+        fallback = servico.imagem_srcset('jpg').split(', ')[min(1, len(larguras) - 1)].rsplit(' ', 1)[0]
+    return {
+        'servico': servico,
+        'srcset_webp': servico.imagem_srcset('webp'),
+        'srcset_jpeg': servico.imagem_srcset('jpg'),
+        'fallback': fallback,
+        'classe': classe,
+        'estilo': estilo,
+        'sizes': sizes,
+    }
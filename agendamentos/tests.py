@@ -1,19 +1,98 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import random
+import tempfile
+import threading
+import time as relogio
+from io import BytesIO, StringIO
+
+from asgiref.sync import sync_to_async
+from PIL import Image
+from django.test import TestCase as DjangoTestCase, TransactionTestCase as DjangoTransactionTestCase
 from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.test import LiveServerTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from datetime import date, time, timedelta
+from django.utils import timezone
 
 # Importa os modelos e a camada de serviços
-from .models import Servico, Agendamento
+from .models import (
+    Servico, Agendamento, DiaAgenda, CepCache, CepLocal, Pet, PerfilUsuario, ResumoDiario, Tarefa,
+    Recurso, FechamentoAgenda, HorarioFuncionamento, PausaExpediente,
+)
+from .catalogo import obter_catalogo
+from .forms import AgendamentoForm
 from .services import (
     calcular_duracao_total, 
     gerar_horarios_possiveis, 
-    checar_conflito_agendamento
+    checar_conflito_agendamento,
+    calcular_inicios_livres,
+    horarios_disponiveis,
+    calendario_disponibilidade,
+    horario_para_minutos,
+    inicios_nas_lacunas,
+    proximos_horarios,
+    PERIODOS_DO_DIA,
+    reservar_horario,
+    HorarioIndisponivel,
+    pagina_agendamentos
 )
+from .admin import PaginadorContagemEstimada
+from .coalescencia import SingleFlight
+from .exportacao import linhas_csv
+from .management.checkpoint import Checkpoint
+from .management.commands.importar_agendamentos import Command as ImportarAgendamentos
+from . import (
+    busca, cache_camadas, cep, disponibilidade_lote, eventos, expediente, ocupacao, recursos, relatorios, tarefas,
+)
+
+class CacheLimpoMixin:
+    """
+    O banco de testes é desfeito a cada teste, mas o cache não: limpa os caches
+    (catálogo, índice de ocupação) para que um teste não enxergue dados do outro.
+    """
+
+    def tearDown(self):
+        for cache in caches.all():
+            cache.clear()
+        cep.limpar_cache_local()
+        cache_camadas.limpar_l1()
+        super().tearDown()
+
+class TestCase(CacheLimpoMixin, DjangoTestCase):
+    pass
+
+class TransactionTestCase(CacheLimpoMixin, DjangoTransactionTestCase):
+    pass
 
 # Define uma data de teste fixa
 DATA_TESTE = date(2025, 10, 10)
 DATA_FUTURA = date(2025, 10, 11)
 
+# Campos obrigatórios de um agendamento que os testes não examinam
+CAMPOS_AGENDAMENTO = {
+    'nome_tutor': "Tutor", 'nome_pet': "Rex", 'tipo_pet': "cachorro",
+    'cep': '00000-000', 'rua': 'Rua', 'numero': '1', 'bairro': 'Bairro', 'cidade': 'Cidade', 'estado': 'RS',
+    'forma_pagamento': 'pix',
+}
+
+def novo_agendamento(**campos):
+    """Agendamento ainda não salvo; `campos` completam ou substituem CAMPOS_AGENDAMENTO."""
+    return Agendamento(**{**CAMPOS_AGENDAMENTO, **campos})
+
+def criar_agendamento(**campos):
+    """Grava um agendamento (com signals); `campos` completam ou substituem CAMPOS_AGENDAMENTO."""
+    return Agendamento.objects.create(**{**CAMPOS_AGENDAMENTO, **campos})
+
 # ==============================================================================
 # 1. Testes da Lógica de Serviços
 # ==============================================================================
@@ -85,17 +164,9 @@ class ConflitoAgendamentoTest(TestCase):
         self.servico_30 = Servico.objects.create(id=20, nome="Banho 30m", duracao_minutos=30, preco=50.00)
         
         # Cria um agendamento fixo de 10:00 (60 minutos) que vai até 11:00
-        Agendamento.objects.create(
-            usuario=self.user,
-            nome_tutor="Tutor Teste",
-            nome_pet="Buddy",
-            tipo_pet="cachorro",
-            data=DATA_TESTE,
-            horario_inicio=time(10, 0),
-            duracao_total_minutos=60,
-            cep='00000-000', rua='Rua', numero='1', bairro='Bairro', cidade='Cidade', estado='RS',
-            forma_pagamento='pix', valor_total=100.00,
-            status='agendado',
+        criar_agendamento(
+            usuario=self.user, nome_tutor="Tutor Teste", nome_pet="Buddy", data=DATA_TESTE,
+            horario_inicio=time(10, 0), duracao_total_minutos=60, valor_total=100.00, status='agendado',
         ).servicos.add(self.servico_60)
         
         # Este é o agendamento de referência: [10:00 -> 11:00]
@@ -158,4 +229,1805 @@ class ConflitoAgendamentoTest(TestCase):
             60,      # Duração do próprio agendamento
             agendamento_id=self.agendamento_referencia.id
         )
-        self.assertTrue(livre, "Deve ser livre: o agendamento está excluindo a si mesmo da checagem.")
\ No newline at end of file
+        self.assertTrue(livre, "Deve ser livre: o agendamento está excluindo a si mesmo da checagem.")
+
+# ==============================================================================
+# 3. Testes do Motor de Disponibilidade (varredura única)
+# ==============================================================================
+
+class DisponibilidadeTest(TestCase):
+    """Testa o cálculo de horários livres com uma única query por dia."""
+
+    def setUp(self):
+        self.servico_60 = Servico.objects.create(nome="Tosa 1h", duracao_minutos=60, preco=100.00)
+        for horario, duracao in [(time(10, 0), 60), (time(15, 0), 30)]:
+            criar_agendamento(
+                data=DATA_TESTE, horario_inicio=horario, duracao_total_minutos=duracao, status='agendado',
+            )
+        # Cancelados não ocupam a agenda
+        criar_agendamento(
+            nome_pet="Mia", tipo_pet="gato", data=DATA_TESTE, horario_inicio=time(8, 0),
+            duracao_total_minutos=60, status='cancelado',
+        )
+
+    def test_calcular_inicios_livres_intervalos_sobrepostos(self):
+        """Intervalos sobrepostos devem ser tratados como um único bloco ocupado."""
+        intervalos = [(600, 660), (630, 720)]
+        livres = calcular_inicios_livres(intervalos, [540, 570, 600, 690, 720], 30)
+        self.assertEqual(livres, [540, 570, 720])
+
+    def test_horarios_disponiveis_uma_query(self):
+        """A disponibilidade do dia deve custar uma única query."""
+        recursos.obter_recursos()  # Snapshot dos recursos ativos: uma query por versão
+        expediente.obter_expediente()  # Expediente compilado: três queries por versão
+        with self.assertNumQueries(1):
+            livres = horarios_disponiveis(DATA_TESTE, 60)
+        self.assertIn("08:00", livres)
+        self.assertIn("09:00", livres)
+        self.assertNotIn("09:15", livres)
+        self.assertNotIn("10:30", livres)
+        self.assertIn("11:00", livres)
+        self.assertNotIn("14:45", livres)
+        self.assertIn("15:30", livres)
+
+    def test_horarios_disponiveis_equivale_checagem_por_slot(self):
+        """O resultado deve ser idêntico à checagem slot a slot."""
+        esperado = [
+            h for h in gerar_horarios_possiveis(intervalo_minutos=15)
+            if checar_conflito_agendamento(DATA_TESTE, h, 45)
+        ]
+        self.assertEqual(horarios_disponiveis(DATA_TESTE, 45), esperado)
+
+    def test_view_verificar_horarios(self):
+        """O endpoint deve devolver os horários livres calculados pelo motor."""
+        resposta = self.client.get(
+            reverse('verificar_horarios_disponiveis'),
+            {'data': DATA_FUTURA.isoformat(), 'servicos_ids': str(self.servico_60.id)},
+            secure=True,
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['horarios_disponiveis'][0], "08:00")
+
+    def test_view_verificar_horarios_get_condicional(self):
+        """Sem mudanças no dia, o navegador revalida e recebe 304 sem consulta aos agendamentos."""
+        url = reverse('verificar_horarios_disponiveis')
+        params = {'data': DATA_FUTURA.isoformat(), 'servicos_ids': str(self.servico_60.id)}
+        primeira = self.client.get(url, params, secure=True)
+        etag = primeira['ETag']
+        self.assertIn('Last-Modified', primeira)
+        self.assertIn('no-cache', primeira['Cache-Control'])
+        self.assertIn('private', primeira['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            nao_modificada = self.client.get(url, params, secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(nao_modificada.status_code, 304)
+        self.assertEqual(nao_modificada['ETag'], etag)
+
+        # Outros serviços (outra duração) têm outro ETag
+        outro = Servico.objects.create(nome="Banho", duracao_minutos=30, preco=50.00)
+        outra = self.client.get(url, {**params, 'servicos_ids': str(outro.id)}, secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(outra.status_code, 200)
+
+        # Um agendamento novo no dia troca a versão (após o commit): a resposta volta a ser calculada
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_agendamento(
+                data=DATA_FUTURA, horario_inicio=time(8, 0), duracao_total_minutos=60, status='agendado',
+            )
+        atualizada = self.client.get(url, params, secure=True, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(atualizada.status_code, 200)
+        self.assertNotEqual(atualizada['ETag'], etag)
+        self.assertNotIn("08:00", atualizada.json()['horarios_disponiveis'])
+
+
+# ==============================================================================
+# 4. Testes do Snapshot do Catálogo de Serviços
+# ==============================================================================
+
+class CatalogoServicosTest(TestCase):
+    """Testa o snapshot em memória do catálogo e sua invalidação por versão."""
+
+    def setUp(self):
+        self.banho = Servico.objects.create(nome="Banho", duracao_minutos=30, preco=50.00)
+        self.tosa = Servico.objects.create(nome="Tosa", duracao_minutos=60, preco=80.00)
+        self.inativo = Servico.objects.create(nome="Antigo", duracao_minutos=15, preco=10.00, ativo=False)
+
+    def test_leituras_sem_query(self):
+        """Depois de carregado, duração e preço não devem consultar o banco."""
+        obter_catalogo()
+        with self.assertNumQueries(0):
+            duracao = calcular_duracao_total([str(self.banho.id), str(self.tosa.id)])
+            valor = obter_catalogo().valor_total([self.banho.id, self.tosa.id])
+        self.assertEqual(duracao, 90)
+        self.assertEqual(valor, 130)
+
+    def test_versao_muda_ao_salvar(self):
+        """Editar o preço (como no list_editable do admin) deve gerar um novo snapshot."""
+        versao_anterior = obter_catalogo().versao
+        self.tosa.preco = 95
+        self.tosa.save()
+        catalogo = obter_catalogo()
+        self.assertNotEqual(catalogo.versao, versao_anterior)
+        self.assertEqual(catalogo.get(self.tosa.id).preco, 95)
+
+    def test_exclusao_invalida(self):
+        """Excluir um serviço deve removê-lo do snapshot."""
+        servico_id = self.banho.id
+        self.banho.delete()
+        self.assertIsNone(obter_catalogo().get(servico_id))
+
+    def test_ativos_ordenados_por_nome(self):
+        """Apenas serviços ativos, na ordenação padrão do modelo."""
+        nomes = [s.nome for s in obter_catalogo().ativos()]
+        self.assertEqual(nomes, ["Banho", "Tosa"])
+
+    def test_form_soma_preco_pelo_catalogo(self):
+        """O formulário deve validar os serviços e somar o valor total pelo snapshot."""
+        form = AgendamentoForm(data={
+            'servicos': [self.banho.id, self.tosa.id],
+            'nome_tutor': 'Tutor', 'nome_pet': 'Rex', 'tipo_pet': 'cachorro',
+            'data': date.today().isoformat(), 'horario_inicio': '09:00',
+            'cep': '01001000', 'rua': 'Rua', 'numero': '1', 'bairro': 'Centro',
+            'cidade': 'São Paulo', 'estado': 'sp', 'forma_pagamento': 'pix',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        agendamento = form.save(commit=False)
+        self.assertEqual(agendamento.valor_total, 130)
+
+    def test_form_rejeita_servico_inativo(self):
+        """Serviços inativos não fazem parte das escolhas do formulário."""
+        form = AgendamentoForm(data={'servicos': [self.inativo.id]})
+        form.is_valid()
+        self.assertIn('servicos', form.errors)
+
+
+# ==============================================================================
+# 5. Testes do Calendário de Disponibilidade (vários dias)
+# ==============================================================================
+
+class CalendarioDisponibilidadeTest(TestCase):
+    """Testa a disponibilidade de um período inteiro com uma única query."""
+
+    def setUp(self):
+        self.servico = Servico.objects.create(nome="Banho", duracao_minutos=60, preco=50.00)
+        self.inicio = date.today() + timedelta(days=5)
+        self.dia_lotado = self.inicio + timedelta(days=1)
+        # Um agendamento ocupando o expediente inteiro deixa o dia lotado
+        criar_agendamento(
+            data=self.dia_lotado, horario_inicio=time(8, 0), duracao_total_minutos=600, status='confirmado',
+        )
+        criar_agendamento(
+            nome_pet="Mia", tipo_pet="gato", data=self.inicio, horario_inicio=time(9, 0),
+            duracao_total_minutos=60, status='agendado',
+        )
+
+    def test_periodo_uma_query(self):
+        """Um período de 60 dias deve custar uma única query ao banco."""
+        fim = self.inicio + timedelta(days=59)
+        recursos.obter_recursos()  # Snapshot dos recursos ativos: uma query por versão
+        expediente.obter_expediente()  # Expediente compilado: três queries por versão
+        with self.assertNumQueries(1):
+            calendario = calendario_disponibilidade(self.inicio, fim, 60)
+        self.assertEqual(len(calendario), 60)
+        self.assertEqual(calendario[self.dia_lotado], [])
+        self.assertEqual(
+            [m for m in calendario[self.inicio] if m < 11 * 60],
+            [8 * 60, 10 * 60, 10 * 60 + 15, 10 * 60 + 30, 10 * 60 + 45],
+        )
+
+    def test_periodo_equivale_consulta_por_dia(self):
+        """Cada dia do calendário deve coincidir com o endpoint de um dia."""
+        calendario = calendario_disponibilidade(self.inicio, self.dia_lotado, 45)
+        for dia, livres in calendario.items():
+            esperado = horarios_disponiveis(dia, 45)
+            self.assertEqual([f"{m // 60:02d}:{m % 60:02d}" for m in livres], esperado)
+
+    def test_view_calendario(self):
+        """O endpoint deve informar os dias lotados e os horários livres por dia."""
+        resposta = self.client.get(reverse('calendario_disponibilidade'), {
+            'inicio': self.inicio.isoformat(),
+            'fim': (self.inicio + timedelta(days=6)).isoformat(),
+            'servicos_ids': str(self.servico.id),
+        }, secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        self.assertEqual(dados['duracao'], 60)
+        self.assertEqual(len(dados['dias']), 7)
+        self.assertEqual(dados['lotados'], [self.dia_lotado.isoformat()])
+        self.assertNotIn("09:00", dados['dias'][self.inicio.isoformat()])
+
+    def test_view_calendario_periodo_maximo(self):
+        """Períodos acima do limite devem ser rejeitados."""
+        resposta = self.client.get(reverse('calendario_disponibilidade'), {
+            'inicio': self.inicio.isoformat(),
+            'fim': (self.inicio + timedelta(days=90)).isoformat(),
+            'servicos_ids': str(self.servico.id),
+        }, secure=True)
+        self.assertEqual(resposta.status_code, 400)
+
+
+# ==============================================================================
+# 6. Testes do Índice de Ocupação (bitmap)
+# ==============================================================================
+
+class OcupacaoBitmapTest(TestCase):
+    """Testa o bitmap de slots por dia e sua manutenção pelos signals."""
+
+    def setUp(self):
+        self.data = DATA_TESTE
+        self.agendamento = criar_agendamento(
+            data=self.data, horario_inicio=time(10, 0), duracao_total_minutos=60, status='agendado',
+        )
+
+    def test_mascara_intervalo(self):
+        """Intervalos fora da grade ocupam o slot inteiro."""
+        self.assertEqual(ocupacao.mascara_intervalo(600, 660), 0b1111 << 40)
+        self.assertEqual(ocupacao.mascara_intervalo(605, 640), 0b111 << 40)
+
+    def test_janela_deslizante(self):
+        """Um início é livre quando todos os slots da duração estão livres."""
+        mapa = ocupacao.mascara_intervalo(600, 660)
+        inicios = ocupacao.inicios_livres(mapa, 60)
+        self.assertTrue(inicios >> 36 & 1)       # 09:00 -> 10:00
+        self.assertFalse(inicios >> 37 & 1)      # 09:15 -> 10:15
+        self.assertTrue(inicios >> 44 & 1)       # 11:00 -> 12:00
+        self.assertFalse(inicios >> (ocupacao.SLOTS_DIA - 1) & 1)  # não cabe antes da meia-noite
+
+    def test_conflito_sem_query_em_cache(self):
+        """Com o mapa em cache, a checagem de conflito não consulta o banco."""
+        ocupacao.obter_mapa(self.data)
+        recursos.obter_recursos()  # Snapshot dos recursos ativos: uma query por versão
+        expediente.obter_expediente()  # Expediente compilado: três queries por versão
+        with self.assertNumQueries(0):
+            self.assertFalse(checar_conflito_agendamento(self.data, "10:30", 30))
+            self.assertTrue(checar_conflito_agendamento(self.data, "11:00", 30))
+
+    def test_novo_agendamento_ocupa_mapa(self):
+        """Um agendamento criado com o mapa em cache ocupa os slots após o commit, sem reconstruir o mapa."""
+        ocupacao.obter_mapa(self.data)
+        versao = ocupacao.versao_dia(self.data)
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_agendamento(
+                nome_pet="Mia", tipo_pet="gato", data=self.data, horario_inicio=time(14, 0),
+                duracao_total_minutos=30, status='agendado',
+            )
+            # Antes do commit o mapa continua o mesmo (o agendamento ainda pode ser desfeito)
+            self.assertEqual(ocupacao.versao_dia(self.data), versao)
+        self.assertGreater(ocupacao.versao_dia(self.data), versao)
+        recursos.obter_recursos()  # Snapshot dos recursos ativos: uma query por versão
+        expediente.obter_expediente()  # Expediente compilado: três queries por versão
+        with self.assertNumQueries(0):  # Nova versão do dia com o mapa anterior | o intervalo
+            self.assertFalse(checar_conflito_agendamento(self.data, "14:00", 15))
+            self.assertTrue(checar_conflito_agendamento(self.data, "15:00", 15))
+            self.assertFalse(checar_conflito_agendamento(self.data, "10:00", 15))
+
+    def test_novo_agendamento_com_versao_travada_reconstroi_o_dia(self):
+        """Sem a trava da versão (outro processo trocando o dia), o OR não é aplicado: só a versão troca."""
+        ocupacao.obter_mapa(self.data)
+        token = ocupacao._mapas._travar(f'versao:{self.data.isoformat()}')
+        with override_settings(AGENDAMENTOS_OCUPACAO_TRAVA_ESPERA=0):
+            with self.captureOnCommitCallbacks(execute=True):
+                criar_agendamento(
+                    nome_pet="Mia", tipo_pet="gato", data=self.data, horario_inicio=time(14, 0),
+                    duracao_total_minutos=30, status='agendado',
+                )
+        ocupacao._mapas._destravar(f'versao:{self.data.isoformat()}', token)
+        recursos.obter_recursos()
+        expediente.obter_expediente()
+        with self.assertNumQueries(1):  # Versão nova sem mapa: reconstruído do banco uma vez
+            self.assertFalse(checar_conflito_agendamento(self.data, "14:00", 15))
+
+    def test_cancelamento_libera_slot(self):
+        """Cancelar (como em cancelar_agendamento) deve liberar o horário."""
+        self.assertFalse(checar_conflito_agendamento(self.data, "10:00", 60))
+        self.agendamento.status = 'cancelado'
+        self.agendamento.save()
+        self.assertTrue(checar_conflito_agendamento(self.data, "10:00", 60))
+
+    def test_edicao_move_ocupacao(self):
+        """Mudar o horário libera o slot antigo e ocupa o novo."""
+        ocupacao.obter_mapa(self.data)
+        self.agendamento.horario_inicio = time(15, 0)
+        self.agendamento.save()
+        self.assertTrue(checar_conflito_agendamento(self.data, "10:00", 60))
+        self.assertFalse(checar_conflito_agendamento(self.data, "15:00", 30))
+
+    def test_exclusao_libera_slot(self):
+        """Excluir o agendamento deve liberar o horário."""
+        ocupacao.obter_mapa(self.data)
+        self.agendamento.delete()
+        self.assertTrue(checar_conflito_agendamento(self.data, "10:00", 60))
+
+    def test_mapa_montado_antes_do_commit_e_descartado(self):
+        """Um mapa montado por outro processo com as linhas de antes do commit não sobrevive a ele."""
+        mapa_antigo = ocupacao.obter_mapa(self.data)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.agendamento.horario_inicio = time(15, 0)
+            self.agendamento.save()
+            # Leitor concorrente: ainda vê 10:00 no banco e grava o mapa na versão corrente
+            ocupacao._mapas.get_or_compute(ocupacao._chave(self.data), lambda: mapa_antigo, 60)
+        self.assertTrue(checar_conflito_agendamento(self.data, "10:00", 60))
+        self.assertIn("10:00", horarios_disponiveis(self.data, 60))
+
+
+# ==============================================================================
+# 7. Testes da Reserva Transacional (concorrência)
+# ==============================================================================
+
+class ReservaConcorrenteTest(TransactionTestCase):
+    """Várias threads disputando os mesmos horários não podem gerar reservas sobrepostas."""
+
+    THREADS = 8
+    TENTATIVAS_POR_THREAD = 12
+
+    def setUp(self):
+        self.servico = Servico.objects.create(nome="Banho", duracao_minutos=60, preco=50.00)
+        self.data = date.today() + timedelta(days=3)
+
+    def _novo_agendamento(self, horario):
+        return novo_agendamento(data=self.data, horario_inicio=horario, duracao_total_minutos=60, valor_total=50)
+
+    def test_reserva_recusa_horario_ocupado(self):
+        reservar_horario(self._novo_agendamento(time(10, 0)), [self.servico.id])
+        with self.assertRaises(HorarioIndisponivel):
+            reservar_horario(self._novo_agendamento(time(10, 30)), [self.servico.id])
+        self.assertEqual(Agendamento.objects.filter(data=self.data).count(), 1)
+
+    def test_estresse_sem_reservas_duplicadas(self):
+        """Threads concorrentes tentam reservar slots de 60 min em passos de 15 min."""
+        horarios = [time(h, m) for h in range(8, 17) for m in (0, 15, 30, 45)]
+        resultados = {'reservas': 0, 'recusas': 0}
+        trava = threading.Lock()
+        largada = threading.Barrier(self.THREADS)
+
+        def trabalhador():
+            try:
+                largada.wait()
+                for _ in range(self.TENTATIVAS_POR_THREAD):
+                    agendamento = self._novo_agendamento(random.choice(horarios))
+                    while True:
+                        try:
+                            reservar_horario(agendamento, [self.servico.id])
+                            chave = 'reservas'
+                        except HorarioIndisponivel:
+                            chave = 'recusas'
+                        except OperationalError:
+                            # SQLite em memória (testes) não espera pelo lock: tenta de novo
+                            relogio.sleep(0.001)
+                            continue
+                        break
+                    with trava:
+                        resultados[chave] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=trabalhador) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        intervalos = sorted(
+            (h.hour * 60 + h.minute, h.hour * 60 + h.minute + d)
+            for h, d in Agendamento.objects.filter(data=self.data).values_list('horario_inicio', 'duracao_total_minutos')
+        )
+        for anterior, seguinte in zip(intervalos, intervalos[1:]):
+            self.assertLessEqual(anterior[1], seguinte[0], "Reservas sobrepostas encontradas")
+        self.assertEqual(len(intervalos), resultados['reservas'])
+        self.assertGreater(resultados['reservas'], 0)
+
+        self.assertEqual(resultados['reservas'] + resultados['recusas'], self.THREADS * self.TENTATIVAS_POR_THREAD)
+
+
+# ==============================================================================
+# 8. Testes do Cache de CEP
+# ==============================================================================
+
+class ProvedorCepFalso(cep.ProvedorCep):
+    """Provedor local usado nos testes: não acessa a rede e conta as chamadas."""
+
+    chamadas = []
+    falhar = False
+
+    def consultar(self, valor):
+        ProvedorCepFalso.chamadas.append(valor)
+        if ProvedorCepFalso.falhar:
+            raise cep.ErroConsultaCep('provedor fora do ar')
+        if valor == '99999999':
+            raise cep.CepNaoEncontrado(valor)
+        return {'rua': 'Praça da Sé', 'bairro': 'Sé', 'cidade': 'São Paulo', 'estado': 'SP'}
+
+@override_settings(AGENDAMENTOS_CEP_PROVEDOR='agendamentos.tests.ProvedorCepFalso')
+class CepCacheTest(TestCase):
+    """Testa as camadas LRU e banco na frente do provedor de CEP."""
+
+    def setUp(self):
+        ProvedorCepFalso.chamadas = []
+        ProvedorCepFalso.falhar = False
+
+    def test_consulta_repetida_sem_rede_nem_banco(self):
+        """A segunda consulta deve vir do LRU, sem provedor e sem query."""
+        self.assertEqual(cep.consultar_cep('01001000')['cidade'], 'São Paulo')
+        with self.assertNumQueries(0):
+            self.assertEqual(cep.consultar_cep('01001000')['rua'], 'Praça da Sé')
+        self.assertEqual(ProvedorCepFalso.chamadas, ['01001000'])
+
+    def test_cache_no_banco_entre_processos(self):
+        """Sem o LRU (outro worker), o registro do banco evita a chamada ao provedor."""
+        cep.consultar_cep('01001000')
+        cep.limpar_cache_local()
+        cep.consultar_cep('01001000')
+        self.assertEqual(len(ProvedorCepFalso.chamadas), 1)
+
+    def test_cache_negativo(self):
+        """CEP inexistente também fica em cache."""
+        for _ in range(2):
+            with self.assertRaises(cep.CepNaoEncontrado):
+                cep.consultar_cep('99999999')
+        self.assertEqual(ProvedorCepFalso.chamadas, ['99999999'])
+        self.assertFalse(CepCache.objects.get(cep='99999999').encontrado)
+
+    @override_settings(AGENDAMENTOS_CEP_TTL=60)
+    def test_registro_vencido_consulta_provedor(self):
+        """Registros com mais idade que o TTL são consultados de novo."""
+        CepCache.objects.create(cep='01001000', rua='Antiga', atualizado_em=timezone.now() - timedelta(hours=1))
+        self.assertEqual(cep.consultar_cep('01001000')['rua'], 'Praça da Sé')
+        self.assertEqual(len(ProvedorCepFalso.chamadas), 1)
+
+    @override_settings(AGENDAMENTOS_CEP_TTL=60)
+    def test_provedor_fora_do_ar_usa_registro_vencido(self):
+        CepCache.objects.create(cep='01001000', rua='Antiga', atualizado_em=timezone.now() - timedelta(hours=1))
+        ProvedorCepFalso.falhar = True
+        self.assertEqual(cep.consultar_cep('01001000')['rua'], 'Antiga')
+
+    def test_view_consultar_cep(self):
+        resposta = self.client.get(reverse('consultar_cep'), {'cep': '01001-000'}, secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['estado'], 'SP')
+        resposta = self.client.get(reverse('consultar_cep'), {'cep': '99999-999'}, secure=True)
+        self.assertEqual(resposta.status_code, 404)
+        ProvedorCepFalso.falhar = True
+        resposta = self.client.get(reverse('consultar_cep'), {'cep': '22222-222'}, secure=True)
+        self.assertEqual(resposta.status_code, 500)
+
+
+# ==============================================================================
+# 9. Testes da Coalescência (single-flight) e Endpoints Assíncronos
+# ==============================================================================
+
+class SingleFlightTest(TestCase):
+    """Requisições idênticas simultâneas devem compartilhar uma única execução."""
+
+    def test_coalesce_chamadas_simultaneas(self):
+        execucoes = []
+
+        async def trabalho():
+            execucoes.append(1)
+            await asyncio.sleep(0.01)
+            return {'ok': True}
+
+        async def cenario():
+            voos = SingleFlight()
+            resultados = await asyncio.gather(*[voos.executar('01001000', trabalho) for _ in range(50)])
+            self.assertEqual(voos.em_andamento(), 0)
+            return resultados
+
+        resultados = asyncio.run(cenario())
+        self.assertEqual(len(execucoes), 1)
+        self.assertTrue(all(r == {'ok': True} for r in resultados))
+
+    def test_chaves_diferentes_nao_coalescem(self):
+        execucoes = []
+
+        async def cenario():
+            voos = SingleFlight()
+
+            def trabalho(chave):
+                async def executar():
+                    execucoes.append(chave)
+                    await asyncio.sleep(0)
+                    return chave
+                return executar
+
+            return await asyncio.gather(*[voos.executar(c, trabalho(c)) for c in ('a', 'b', 'a')])
+
+        self.assertEqual(asyncio.run(cenario()), ['a', 'b', 'a'])
+        self.assertEqual(sorted(execucoes), ['a', 'b'])
+
+    def test_excecao_propagada_para_todos(self):
+        async def falha():
+            await asyncio.sleep(0)
+            raise cep.ErroConsultaCep('fora do ar')
+
+        async def cenario():
+            voos = SingleFlight()
+            return await asyncio.gather(*[voos.executar('x', falha) for _ in range(3)], return_exceptions=True)
+
+        resultados = asyncio.run(cenario())
+        self.assertTrue(all(isinstance(r, cep.ErroConsultaCep) for r in resultados))
+
+@override_settings(AGENDAMENTOS_CEP_PROVEDOR='agendamentos.tests.ProvedorCepFalso')
+class EndpointsAssincronosTest(TestCase):
+    """Os endpoints assíncronos devem responder como as versões síncronas."""
+
+    def setUp(self):
+        ProvedorCepFalso.chamadas = []
+        ProvedorCepFalso.falhar = False
+        self.servico = Servico.objects.create(nome="Banho", duracao_minutos=30, preco=50.00)
+
+    async def test_verificar_horarios_async(self):
+        resposta = await self.async_client.get(
+            reverse('verificar_horarios_disponiveis'),
+            {'data': DATA_FUTURA.isoformat(), 'servicos_ids': str(self.servico.id)},
+            secure=True,
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn("08:00", resposta.json()['horarios_disponiveis'])
+
+    async def test_consultar_cep_async(self):
+        for _ in range(2):
+            resposta = await self.async_client.get(reverse('consultar_cep'), {'cep': '01001-000'}, secure=True)
+            self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(ProvedorCepFalso.chamadas, ['01001000'])
+
+
+# ==============================================================================
+# 10. Testes da Base Local de CEPs (importar_ceps)
+# ==============================================================================
+
+@override_settings(AGENDAMENTOS_CEP_PROVEDOR='agendamentos.tests.ProvedorCepFalso')
+class ImportarCepsTest(TestCase):
+    """Testa a importação em lotes, a retomada e a consulta à base local."""
+
+    LINHAS = [
+        'cep;logradouro;bairro;localidade;uf',
+        '01001-000;Praça da Sé;Sé;São Paulo;sp',
+        '20040-002;Rua da Assembleia;Centro;Rio de Janeiro;RJ',
+        'invalido;Rua X;Bairro;Cidade;RS',
+        '90010-000;Rua dos Andradas;Centro Histórico;Porto Alegre;RS',
+        '01001-000;Praça da Sé (atualizada);Sé;São Paulo;SP',
+    ]
+
+    def setUp(self):
+        ProvedorCepFalso.chamadas = []
+        ProvedorCepFalso.falhar = False
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.arquivo = os.path.join(self.diretorio.name, 'ceps.csv')
+        with open(self.arquivo, 'w', encoding='utf-8') as arquivo:
+            arquivo.write('\n'.join(self.LINHAS) + '\n')
+
+    def tearDown(self):
+        self.diretorio.cleanup()
+        super().tearDown()
+
+    def _importar(self, *args):
+        saida = StringIO()
+        call_command('importar_ceps', self.arquivo, '--delimitador', ';', '--lote', '2', *args, stdout=saida)
+        return saida.getvalue()
+
+    def test_importacao_em_lotes(self):
+        saida = self._importar()
+        self.assertEqual(CepLocal.objects.count(), 3)
+        self.assertEqual(CepLocal.objects.get(cep='01001000').rua, 'Praça da Sé (atualizada)')
+        self.assertEqual(CepLocal.objects.get(cep='90010000').estado, 'RS')
+        self.assertIn('linhas/s', saida)
+        self.assertIn('1 ignoradas', saida)
+
+    def test_retomar_pula_linhas_gravadas(self):
+        """Com --retomar, as linhas do checkpoint não são lidas de novo."""
+        Checkpoint(self.arquivo).salvar(2)
+        self._importar('--retomar')
+        self.assertFalse(CepLocal.objects.filter(cep='20040002').exists())
+        self.assertTrue(CepLocal.objects.filter(cep='90010000').exists())
+
+    def test_consulta_usa_base_local(self):
+        """CEPs da base local não dependem do provedor externo."""
+        self._importar()
+        self.assertEqual(cep.consultar_cep('20040002')['cidade'], 'Rio de Janeiro')
+        self.assertEqual(ProvedorCepFalso.chamadas, [])
+        cep.consultar_cep('30130000')
+        self.assertEqual(ProvedorCepFalso.chamadas, ['30130000'])
+
+
+# ==============================================================================
+# 11. Testes da Listagem "Meus Agendamentos" (cursor + prefetch)
+# ==============================================================================
+
+class MeusAgendamentosTest(TestCase):
+    """A página deve ter número constante de queries e paginação por cursor estável."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cliente', password='senha-forte-123')
+        self.banho = Servico.objects.create(nome="Banho", duracao_minutos=30, preco=50.00)
+        self.tosa = Servico.objects.create(nome="Tosa", duracao_minutos=60, preco=80.00)
+        self.client.force_login(self.user)
+
+    def _criar(self, quantidade, inicio=date(2024, 1, 1)):
+        for i in range(quantidade):
+            agendamento = criar_agendamento(
+                usuario=self.user, nome_pet=f"Pet {i}", data=inicio + timedelta(days=i // 3),
+                horario_inicio=time(8 + i % 3, 0), status='realizado', observacoes='x' * 500,
+            )
+            agendamento.servicos.add(self.banho, self.tosa)
+
+    def _queries_da_pagina(self):
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(reverse('meus_agendamentos'), secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        return len(contexto.captured_queries)
+
+    def test_queries_constantes(self):
+        """O número de queries não deve crescer com o histórico do usuário."""
+        self._criar(3)
+        poucas = self._queries_da_pagina()
+        self._criar(60, inicio=date(2023, 1, 1))
+        self.assertEqual(self._queries_da_pagina(), poucas)
+
+    def test_cursor_percorre_tudo_sem_repetir(self):
+        self._criar(25)
+        vistos = []
+        cursor = None
+        while True:
+            pagina, cursor = pagina_agendamentos(Agendamento.objects.filter(usuario=self.user), cursor, por_pagina=7)
+            vistos.extend(pagina)
+            if not cursor:
+                break
+        self.assertEqual(len(vistos), 25)
+        self.assertEqual(len({a.id for a in vistos}), 25)
+        chaves = [(-a.data.toordinal(), a.horario_inicio, a.id) for a in vistos]
+        self.assertEqual(chaves, sorted(chaves))
+
+    def test_secoes_proximos_e_passados(self):
+        self._criar(2)
+        futuro = criar_agendamento(
+            usuario=self.user, nome_pet="Futuro", tipo_pet="gato", data=date.today() + timedelta(days=2),
+            horario_inicio=time(9, 0), status='agendado',
+        )
+        resposta = self.client.get(reverse('meus_agendamentos'), secure=True)
+        self.assertEqual([a.id for a in resposta.context['proximos']], [futuro.id])
+        self.assertEqual(len(resposta.context['passados']), 2)
+        self.assertContains(resposta, 'Banho')
+
+
+# ==============================================================================
+# 12. Testes do Admin em Modo "Tabela Grande"
+# ==============================================================================
+
+class AgendamentoAdminTest(TestCase):
+    """Changelist com contagem estimada, filtro M2M sem duplicatas e prefetch."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='senha-forte-123', email='a@a.com')
+        self.banho = Servico.objects.create(nome="Banho", duracao_minutos=30, preco=50.00)
+        self.tosa = Servico.objects.create(nome="Tosa", duracao_minutos=60, preco=80.00)
+        self.client.force_login(self.admin)
+
+    def _criar(self, quantidade):
+        for i in range(quantidade):
+            agendamento = criar_agendamento(
+                usuario=self.admin, nome_pet=f"Pet {i}", data=DATA_TESTE + timedelta(days=i),
+                horario_inicio=time(9, 0),
+            )
+            agendamento.servicos.add(self.banho, self.tosa)
+
+    def _changelist(self, **params):
+        with CaptureQueriesContext(connection) as contexto:
+            resposta = self.client.get(reverse('admin:agendamentos_agendamento_changelist'), params, secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        return resposta, len(contexto.captured_queries)
+
+    def test_contagem_estimada_sem_filtros(self):
+        self._criar(3)
+        Agendamento.objects.filter(nome_pet='Pet 0').delete()
+        # Fora do PostgreSQL (ou abaixo do limiar de estimativa) a contagem é exata
+        paginador = PaginadorContagemEstimada(Agendamento.objects.all(), 100)
+        self.assertEqual(paginador.count, 2)
+        filtrado = PaginadorContagemEstimada(Agendamento.objects.filter(nome_pet='Pet 1'), 100)
+        self.assertEqual(filtrado.count, 1)
+
+    def test_filtro_servico_sem_duplicatas(self):
+        """Agendamentos com dois serviços aparecem uma única vez ao filtrar."""
+        self._criar(4)
+        resposta, _ = self._changelist(servico=str(self.banho.id))
+        self.assertEqual(len(resposta.context['cl'].result_list), 4)
+        self.assertNotIn('DISTINCT', str(resposta.context['cl'].queryset.query))
+
+    def test_queries_constantes_no_changelist(self):
+        self._criar(3)
+        self._changelist()  # Aquece o snapshot do catálogo usado pelo filtro de serviço
+        _, poucas = self._changelist()
+        self._criar(30)
+        _, muitas = self._changelist()
+        self.assertEqual(poucas, muitas)
+
+
+# ==============================================================================
+# 13. Testes da Busca Textual Indexada
+# ==============================================================================
+
+class BuscaIndexadaTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='joana', password='senha-forte-123', first_name='Joana')
+        self.pet = Pet.objects.create(dono=self.usuario, nome='Bolinha', tipo='cachorro', raca='Poodle')
+        self.agendamento = criar_agendamento(
+            usuario=self.usuario, nome_tutor="João Conceição", nome_pet="Thor", data=DATA_TESTE,
+            horario_inicio=time(9, 0), cep='01001-000', rua='Praça da Sé', bairro='Sé', cidade='São Paulo',
+            estado='SP',
+        )
+
+    def test_busca_ignora_acentos_e_aceita_prefixo(self):
+        self.assertEqual(busca.buscar('joao conc'), [('agendamento', self.agendamento.pk)])
+        self.assertEqual(busca.buscar('SAO PAULO'), [('agendamento', self.agendamento.pk)])
+        self.assertEqual(busca.buscar('praça thor', tipos=['pet']), [])
+
+    def test_indice_acompanha_alteracoes_e_exclusoes(self):
+        self.pet.nome = 'Pipoca'
+        self.pet.save()
+        self.assertEqual(busca.buscar('bolinha'), [])
+        self.assertEqual(busca.buscar('pipoca'), [('pet', self.pet.pk)])
+
+        # Dados do dono fazem parte do documento do pet
+        self.usuario.first_name = 'Mariana'
+        self.usuario.save()
+        self.assertEqual(busca.buscar('mariana'), [('pet', self.pet.pk)])
+
+        self.pet.delete()
+        self.assertEqual(busca.buscar('pipoca'), [])
+
+    def test_admin_e_endpoint_da_equipe_usam_o_indice(self):
+        admin = User.objects.create_superuser(username='admin', password='senha-forte-123', email='a@a.com')
+        url = reverse('busca_staff')
+
+        self.client.force_login(self.usuario)
+        resposta = self.client.get(url, {'q': 'thor'}, secure=True)
+        self.assertEqual(resposta.status_code, 302)  # Apenas equipe
+
+        self.client.force_login(admin)
+        resposta = self.client.get(url, {'q': 'thôr'}, secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        resultados = resposta.json()['resultados']
+        self.assertEqual([(r['tipo'], r['id']) for r in resultados], [('agendamento', self.agendamento.pk)])
+
+        resposta = self.client.get(reverse('admin:agendamentos_agendamento_changelist'), {'q': 'conceicao'}, secure=True)
+        self.assertEqual(list(resposta.context['cl'].result_list), [self.agendamento])
+
+    def test_admin_avisa_quando_a_busca_e_cortada(self):
+        admin = User.objects.create_superuser(username='admin', password='senha-forte-123', email='a@a.com')
+        for nome in ('Thor', 'Thomas'):
+            Pet.objects.create(dono=self.usuario, nome=nome, tipo='cachorro')
+        self.client.force_login(admin)
+        url = reverse('admin:agendamentos_pet_changelist')
+
+        limite = busca.LIMITE_ADMIN
+        busca.LIMITE_ADMIN = 1
+        try:
+            resposta = self.client.get(url, {'q': 'tho'}, secure=True)
+        finally:
+            busca.LIMITE_ADMIN = limite
+        self.assertEqual(len(resposta.context['cl'].result_list), 1)
+        self.assertIn('mais de 1 resultados', [str(m) for m in resposta.context['messages']][0])
+
+        resposta = self.client.get(url, {'q': 'tho'}, secure=True)
+        self.assertEqual(len(resposta.context['cl'].result_list), 2)
+        self.assertEqual(list(resposta.context['messages']), [])
+
+
+# ==============================================================================
+# 14. Testes dos Resumos Diários
+# ==============================================================================
+
+class ResumoDiarioTest(TestCase):
+
+    def setUp(self):
+        self.usuario = User.objects.create_user(username='tutor', password='senha-forte-123')
+        self.banho = Servico.objects.create(nome="Banho", duracao_minutos=30, preco=50.00)
+        self.tosa = Servico.objects.create(nome="Tosa", duracao_minutos=60, preco=80.00)
+        self.dia = DATA_TESTE
+
+    def _agendar(self, servicos, valor, forma='pix', dia=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            agendamento = criar_agendamento(
+                usuario=self.usuario, data=dia or self.dia, horario_inicio=time(9, 0),
+                duracao_total_minutos=30 * len(servicos), forma_pagamento=forma, valor_total=valor,
+            )
+            agendamento.servicos.set(servicos)
+        return agendamento
+
+    def _periodo(self):
+        return relatorios.resumo_periodo(self.dia, self.dia + timedelta(days=10))
+
+    def test_resumo_acompanha_criacao_edicao_e_cancelamento(self):
+        primeiro = self._agendar([self.banho, self.tosa], 130)
+        self._agendar([self.banho], 50, forma='dinheiro')
+
+        resumo = self._periodo()
+        self.assertEqual(resumo['totais']['quantidade'], 2)
+        self.assertEqual(resumo['totais']['receita'], 180)
+        self.assertEqual({s['nome']: s['quantidade'] for s in resumo['por_servico']}, {'Banho': 2, 'Tosa': 1})
+
+        # Remarcação move o agendamento para outro dia; troca de serviço atualiza as contagens
+        with self.captureOnCommitCallbacks(execute=True):
+            primeiro.data = self.dia + timedelta(days=1)
+            primeiro.save()
+            primeiro.servicos.remove(self.tosa)
+        por_dia = {d['data']: d['quantidade'] for d in self._periodo()['por_dia']}
+        self.assertEqual(por_dia, {self.dia: 1, self.dia + timedelta(days=1): 1})
+        self.assertEqual({s['nome']: s['quantidade'] for s in self._periodo()['por_servico']}, {'Banho': 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            primeiro.status = 'cancelado'
+            primeiro.save()
+        resumo = self._periodo()
+        self.assertEqual(resumo['totais']['receita'], 50)
+        self.assertEqual(resumo['por_status']['cancelado']['quantidade'], 1)
+        self.assertEqual(resumo['por_forma_pagamento']['dinheiro']['receita'], 50)
+
+    def test_recalculo_apos_o_commit_uma_vez_por_dia(self):
+        """Os signals não travam o dia na transação de quem agenda e não recalculam duas vezes."""
+        recalculados = []
+        original = relatorios.recalcular_dia
+        relatorios.recalcular_dia = lambda dia: (recalculados.append(dia), original(dia))
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                agendamento = criar_agendamento(
+                    usuario=self.usuario, data=self.dia, horario_inicio=time(9, 0), duracao_total_minutos=90,
+                    valor_total=130,
+                )
+                agendamento.servicos.set([self.banho, self.tosa])
+                agendamento.data = self.dia + timedelta(days=1)
+                agendamento.save()
+                self.assertEqual(recalculados, [])
+                self.assertFalse(DiaAgenda.objects.exists())  # Nenhum lock de dia dentro da transação
+        finally:
+            relatorios.recalcular_dia = original
+
+        self.assertEqual(recalculados, [self.dia, self.dia + timedelta(days=1)])
+        self.assertEqual(self._periodo()['totais']['quantidade'], 1)
+
+    def test_reconstrucao_recupera_resumos_apagados(self):
+        self._agendar([self.banho, self.tosa], 130)
+        esperado = list(ResumoDiario.objects.order_by('servico_id').values_list('servico_id', 'quantidade', 'minutos'))
+
+        ResumoDiario.objects.all().delete()
+        call_command('reconstruir_resumos', stdout=StringIO())
+        self.assertEqual(
+            list(ResumoDiario.objects.order_by('servico_id').values_list('servico_id', 'quantidade', 'minutos')),
+            esperado,
+        )
+
+    def test_painel_le_apenas_os_resumos(self):
+        admin = User.objects.create_superuser(username='admin', password='senha-forte-123', email='a@a.com')
+        for i in range(5):
+            self._agendar([self.banho], 50, dia=self.dia + timedelta(days=i))
+        obter_catalogo()  # Catálogo já em cache, como em produção
+        self.client.force_login(admin)
+
+        params = {'inicio': self.dia.isoformat(), 'fim': (self.dia + timedelta(days=30)).isoformat()}
+        # Sessão + usuário + 2 leituras de ResumoDiario, independente do número de agendamentos
+        with self.assertNumQueries(4):
+            resposta = self.client.get(reverse('painel_staff'), params, secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        dados = resposta.json()
+        self.assertEqual(dados['totais']['quantidade'], 5)
+        self.assertEqual(len(dados['por_dia']), 5)
+
+
+# ==============================================================================
+# 15. Testes da Exportação CSV em Streaming
+# ==============================================================================
+
+class ExportacaoCsvTest(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='senha-forte-123', email='a@a.com')
+        self.banho = Servico.objects.create(nome="Banho", duracao_minutos=30, preco=50.00)
+        self.tosa = Servico.objects.create(nome="Tosa", duracao_minutos=60, preco=80.00)
+        for i in range(5):
+            agendamento = criar_agendamento(
+                usuario=self.admin, nome_pet=f"Pet {i}", data=DATA_TESTE + timedelta(days=i),
+                horario_inicio=time(9, 0), forma_pagamento='pix' if i % 2 else 'dinheiro', valor_total=130,
+                status='cancelado' if i == 4 else 'agendado',
+            )
+            agendamento.servicos.add(self.banho, self.tosa)
+        obter_catalogo()
+
+    def _ler(self, resposta):
+        conteudo = b''.join(resposta.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(conteudo.splitlines(), delimiter=';'))
+
+    def test_servicos_resolvidos_por_lote(self):
+        # 1 query do iterator + 1 por lote de 2 agendamentos (3 lotes)
+        with self.assertNumQueries(4):
+            linhas = list(linhas_csv(Agendamento.objects.all(), tamanho_lote=2))
+        self.assertEqual(len(linhas), 6)
+        self.assertTrue(linhas[1].rstrip().endswith('Banho + Tosa'))
+
+    def test_endpoint_filtra_e_envia_em_streaming(self):
+        self.client.force_login(self.admin)
+        params = {'inicio': DATA_TESTE.isoformat(), 'status': 'agendado', 'forma_pagamento': 'pix'}
+        resposta = self.client.get(reverse('exportar_agendamentos'), params, secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.streaming)
+        linhas = self._ler(resposta)
+        self.assertEqual(linhas[0][0], 'ID')
+        self.assertEqual([linha[7] for linha in linhas[1:]], ['Pet 1', 'Pet 3'])
+
+        resposta = self.client.get(reverse('exportar_agendamentos'), {'status': 'perdido'}, secure=True)
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_acao_do_admin(self):
+        self.client.force_login(self.admin)
+        ids = list(Agendamento.objects.values_list('pk', flat=True)[:2])
+        resposta = self.client.post(
+            reverse('admin:agendamentos_agendamento_changelist'),
+            {'action': 'exportar_csv', '_selected_action': ids}, secure=True,
+        )
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(self._ler(resposta)), 3)
+
+
+# ==============================================================================
+# 16. Testes da Importação em Lote de Agendamentos
+# ==============================================================================
+
+class ImportarAgendamentosTest(TestCase):
+    """Validação igual à do formulário, conflitos em memória, pets e M2M em lote."""
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.usuario = User.objects.create_user(username='maria', password='senha-forte-123')
+        self.banho = Servico.objects.create(nome="Banho", duracao_minutos=30, preco=50.00)
+        self.tosa = Servico.objects.create(nome="Tosa", duracao_minutos=60, preco=80.00)
+        self.data = timezone.localdate() + timedelta(days=30)
+        self.dia = self.data.isoformat()
+
+    def tearDown(self):
+        self.diretorio.cleanup()
+        super().tearDown()
+
+    def _importar(self, nome, linhas, *args):
+        caminho = os.path.join(self.diretorio.name, nome)
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write('\n'.join(linhas) + '\n')
+        saida, erros = StringIO(), StringIO()
+        call_command('importar_agendamentos', caminho, '--lote', '2', *args, stdout=saida, stderr=erros)
+        return saida.getvalue(), erros.getvalue()
+
+    def _registro(self, **extra):
+        registro = {
+            'usuario': 'maria', 'nome_tutor': 'Maria', 'nome_pet': 'Luna', 'tipo_pet': 'gato',
+            'data': self.dia, 'horario_inicio': '09:00', 'servicos': ['Banho', self.tosa.id],
+            'cep': '01001000', 'rua': 'Rua A', 'numero': '1', 'bairro': 'Centro', 'cidade': 'São Paulo',
+            'estado': 'sp', 'forma_pagamento': 'pix',
+        }
+        registro.update(extra)
+        return json.dumps(registro)
+
+    def test_ndjson_valida_checa_conflitos_e_cria_pets(self):
+        saida, erros = self._importar('agendamentos.ndjson', [
+            self._registro(),
+            self._registro(horario_inicio='10:00', nome_pet='Thor'),   # Conflita com o anterior (09:00-10:30)
+            self._registro(horario_inicio='10:30', nome_pet='Thor'),
+            self._registro(cep='123', estado='SPX'),                   # Mesmas regras do formulário
+            self._registro(servicos=['Inexistente']),
+            self._registro(horario_inicio='14:00', usuario='fantasma'),
+        ])
+        self.assertIn('2 agendamentos importados, 4 linhas rejeitadas', saida)
+        self.assertIn('Linha 2: Conflito de horário', erros)
+        self.assertIn('CEP deve ter 8 dígitos', erros)
+        self.assertIn('Usuário inexistente', erros)
+
+        luna = Agendamento.objects.get(nome_pet='Luna')
+        self.assertEqual(luna.cep, '01001-000')
+        self.assertEqual(luna.estado, 'SP')
+        self.assertEqual(luna.duracao_total_minutos, 90)
+        self.assertEqual(luna.valor_total, 130)
+        self.assertEqual(set(luna.servicos.values_list('id', flat=True)), {self.banho.id, self.tosa.id})
+        self.assertEqual(set(Pet.objects.filter(dono=self.usuario).values_list('nome', flat=True)), {'Luna', 'Thor'})
+
+        # Ocupação, resumos e busca refletem as linhas gravadas sem signals
+        self.assertFalse(checar_conflito_agendamento(self.data, '09:30', 30))
+        self.assertEqual(relatorios.resumo_periodo(self.data, self.data)['totais']['quantidade'], 2)
+        self.assertEqual(busca.buscar('thor', tipos=['pet']), [('pet', Pet.objects.get(nome='Thor').pk)])
+
+    def test_csv_respeita_agenda_existente_e_datas_passadas(self):
+        criar_agendamento(
+            nome_tutor="Outro", data=self.data, horario_inicio=time(9, 0), duracao_total_minutos=60, bairro='B',
+            cidade='C',
+        )
+        ontem = (timezone.localdate() - timedelta(days=1)).strftime('%d/%m/%Y')
+        cabecalho = 'nome_tutor,nome_pet,tipo_pet,data,horario_inicio,servicos,cep,rua,numero,bairro,cidade,estado,forma_pagamento,status'
+        linhas = [
+            cabecalho,
+            f'Ana,Bob,cachorro,{self.dia},09:30,Banho,01001-000,Rua,1,B,C,RS,pix,agendado',
+            f'Ana,Bob,cachorro,{self.dia},10:00,Banho|Tosa,01001-000,Rua,1,B,C,RS,pix,agendado',
+            f'Ana,Bob,cachorro,{ontem},10:00,Banho,01001-000,Rua,1,B,C,RS,dinheiro,realizado',
+        ]
+        _, erros = self._importar('agendamentos.csv', linhas)
+        self.assertIn('Linha 1: Conflito de horário', erros)
+        self.assertIn('datas passadas', erros)
+
+        self._importar('historico.csv', [cabecalho, linhas[3]], '--permitir-passado')
+        self.assertEqual(Agendamento.objects.filter(status='realizado').count(), 1)
+
+    def test_horarios_fora_do_expediente_sao_rejeitados(self):
+        amanha = self.data + timedelta(days=1)
+        FechamentoAgenda.objects.create(data=amanha, motivo="Feriado")
+        saida, erros = self._importar('agendamentos.ndjson', [
+            self._registro(servicos=['Banho'], horario_inicio='07:00'),              # Antes da abertura
+            self._registro(servicos=['Banho'], horario_inicio='12:30'),              # Almoço
+            self._registro(servicos=['Banho'], horario_inicio='09:10'),              # Fora da grade
+            self._registro(servicos=['Banho'], data=amanha.isoformat()),             # Dia fechado
+            self._registro(servicos=['Banho'], horario_inicio='07:00', status='cancelado'),  # Não ocupa a agenda
+            self._registro(servicos=['Banho'], horario_inicio='14:00'),
+        ])
+        self.assertIn('2 agendamentos importados, 4 linhas rejeitadas', saida)
+        self.assertEqual(erros.count('Horário fora do expediente do dia.'), 4)
+
+    def test_agendamento_do_site_entre_lotes_e_respeitado(self):
+        gravar_original = ImportarAgendamentos._gravar
+
+        def gravar(comando, lote):
+            gravar_original(comando, lote)
+            if not Agendamento.objects.filter(nome_pet='Site').exists():
+                # Reserva feita pelo site depois do primeiro lote, com o dia já destravado
+                criar_agendamento(
+                    nome_tutor="Outro", nome_pet="Site", data=self.data, horario_inicio=time(14, 0),
+                    duracao_total_minutos=60, bairro='B', cidade='C',
+                )
+
+        ImportarAgendamentos._gravar = gravar
+        try:
+            saida, erros = self._importar('agendamentos.ndjson', [
+                self._registro(servicos=['Banho']),
+                self._registro(servicos=['Banho'], horario_inicio='09:30', nome_pet='Thor'),
+                self._registro(servicos=['Banho'], horario_inicio='14:00', nome_pet='Mel'),
+            ])
+        finally:
+            ImportarAgendamentos._gravar = gravar_original
+        self.assertIn('2 agendamentos importados, 1 linhas rejeitadas', saida)
+        self.assertIn('Linha 3: Conflito de horário', erros)
+        self.assertFalse(Agendamento.objects.filter(nome_pet='Mel').exists())
+
+
+# ==============================================================================
+# 17. Testes dos Derivados de Imagem dos Serviços
+# ==============================================================================
+
+class ImagemServicoTest(TestCase):
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.media = override_settings(MEDIA_ROOT=self.diretorio.name)
+        self.media.enable()
+
+    def tearDown(self):
+        self.media.disable()
+        self.diretorio.cleanup()
+        super().tearDown()
+
+    def _foto(self, largura, altura, nome='foto.png'):
+        saida = BytesIO()
+        Image.new('RGBA', (largura, altura), (200, 120, 90, 255)).save(saida, 'PNG')
+        return SimpleUploadedFile(nome, saida.getvalue(), content_type='image/png')
+
+    def _arquivos_derivados(self):
+        pasta = os.path.join(self.diretorio.name, 'servicos_imagens', 'derivados')
+        return sorted(os.listdir(pasta)) if os.path.isdir(pasta) else []
+
+    def test_upload_gera_derivados_e_srcset(self):
+        servico = Servico.objects.create(nome="Banho", duracao_minutos=30, preco=50, imagem=self._foto(1200, 800))
+        # O upload só agenda o processamento; até o worker rodar, a home usa a original
+        self.assertEqual(self._arquivos_derivados(), [])
+        self.assertContains(self.client.get(reverse('home'), secure=True), servico.imagem.url)
+        tarefas.executar_pendentes()
+        servico.refresh_from_db()
+        self.assertEqual(servico.imagem_larguras, [320, 640, 960])
+        self.assertEqual(len(self._arquivos_derivados()), 6)
+        self.assertTrue(all(nome.startswith(servico.imagem_hash) for nome in self._arquivos_derivados()))
+
+        resposta = self.client.get(reverse('home'), secure=True)
+        self.assertContains(resposta, 'type="image/webp"')
+        self.assertContains(resposta, f'{servico.imagem_hash}-960.webp 960w')
+        self.assertContains(resposta, 'loading="lazy"')
+
+        # Mesmo conteúdo enviado de novo: nenhum arquivo novo
+        servico.imagem = self._foto(1200, 800, nome='outra.png')
+        servico.save()
+        tarefas.executar_pendentes()
+        self.assertEqual(len(self._arquivos_derivados()), 6)
+
+    def test_imagem_pequena_nao_e_ampliada_e_backfill(self):
+        servico = Servico.objects.create(nome="Tosa", duracao_minutos=30, preco=50, imagem=self._foto(200, 100))
+        Servico.objects.filter(pk=servico.pk).update(imagem_hash='', imagem_larguras=[])
+
+        call_command('gerar_derivados_imagens', stdout=StringIO())
+        servico.refresh_from_db()
+        self.assertEqual(servico.imagem_larguras, [200])
+        self.assertEqual(obter_catalogo().get(servico.pk).imagem_hash, servico.imagem_hash)
+
+
+# ==============================================================================
+# 18. Testes da Fila de Tarefas em Segundo Plano
+# ==============================================================================
+
+EXECUCOES = []
+
+@tarefas.tarefa(nome='testes.registrar', fila='testes')
+def tarefa_registrar(valor, dobrar=False):
+    EXECUCOES.append(valor * 2 if dobrar else valor)
+
+@tarefas.tarefa(nome='testes.falhar', fila='testes', max_tentativas=2)
+def tarefa_falhar():
+    raise RuntimeError('falha simulada')
+
+
+class FilaTarefasTest(TestCase):
+
+    def setUp(self):
+        EXECUCOES.clear()
+
+    def test_enfileirar_e_executar(self):
+        tarefa = tarefa_registrar.enfileirar(21, dobrar=True)
+        self.assertEqual(tarefa.status, 'pendente')
+        self.assertEqual(EXECUCOES, [])  # Nada roda na requisição
+
+        self.assertEqual(tarefas.executar_pendentes(), 1)
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.tentativas), ('concluida', 1))
+        self.assertEqual(EXECUCOES, [42])
+
+    def test_novas_tentativas_com_backoff_ate_falhar(self):
+        tarefa = tarefa_falhar.enfileirar()
+        tarefas.executar_pendentes()
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.tentativas), ('pendente', 1))
+        self.assertGreater(tarefa.executar_apos, timezone.now())  # Aguarda o backoff
+        self.assertIn('falha simulada', tarefa.erro)
+
+        Tarefa.objects.filter(pk=tarefa.pk).update(executar_apos=timezone.now())
+        tarefas.executar_pendentes()
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.tentativas), ('falhou', 2))
+
+    def test_tarefas_travadas_voltam_para_a_fila(self):
+        tarefa = tarefa_registrar.enfileirar(1)
+        Tarefa.objects.filter(pk=tarefa.pk).update(
+            status='executando', iniciada_em=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(tarefas.recuperar_travadas(), 1)
+        tarefas.executar_pendentes()
+        self.assertEqual(EXECUCOES, [1])
+
+    def test_reserva_devolve_so_as_tarefas_reservadas(self):
+        primeira, segunda = tarefa_registrar.enfileirar(1), tarefa_registrar.enfileirar(2)
+        roubada = []
+
+        def outro_worker(execute, sql, params, many, context):
+            # Entre a seleção e o UPDATE, outro worker leva a primeira tarefa
+            if sql.lstrip().upper().startswith('UPDATE') and not roubada:
+                roubada.append(primeira.pk)
+                Tarefa.objects.filter(pk=primeira.pk).update(status='executando', worker='outro:1')
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(outro_worker):
+            ids = tarefas.reservar('testes', 10, 'este:2')
+        self.assertEqual(ids, [segunda.pk])
+        self.assertEqual(Tarefa.objects.get(pk=primeira.pk).worker, 'outro:1')
+        self.assertTrue(Tarefa.objects.get(pk=segunda.pk).worker.startswith('este:2:'))
+
+
+class WorkerTest(TransactionTestCase):
+    """O comando worker respeita o limite de concorrência de cada fila."""
+
+    def test_worker_limita_concorrencia_por_fila(self):
+        simultaneas = {'agora': 0, 'maximo': 0}
+        trava = threading.Lock()
+        funcao_original = tarefas._registro['testes.registrar']
+
+        def medir(valor, dobrar=False):
+            with trava:
+                simultaneas['agora'] += 1
+                simultaneas['maximo'] = max(simultaneas['maximo'], simultaneas['agora'])
+            relogio.sleep(0.02)
+            with trava:
+                simultaneas['agora'] -= 1
+
+        tarefas._registro['testes.registrar'] = (medir, 'testes', 3)
+        try:
+            for i in range(6):
+                tarefas.enfileirar('testes.registrar', i)
+            saida = StringIO()
+            call_command('worker', '--fila', 'testes=2', '--uma-vez', '--intervalo', '0.01', stdout=saida)
+        finally:
+            tarefas._registro['testes.registrar'] = funcao_original
+
+        self.assertEqual(Tarefa.objects.filter(status='concluida').count(), 6)
+        self.assertLessEqual(simultaneas['maximo'], 2)
+        self.assertIn('6 tarefas executadas', saida.getvalue())
+
+
+# ==============================================================================
+# 19. Testes do Cache de Fragmentos e de Páginas Anônimas
+# ==============================================================================
+
+class CachePaginasTest(TestCase):
+
+    def setUp(self):
+        self.banho = Servico.objects.create(nome="Banho", duracao_minutos=30, preco=50.00, descricao="Banho completo")
+
+    def test_home_anonima_servida_do_cache_sem_banco(self):
+        primeira = self.client.get(reverse('home'), secure=True)
+        self.assertContains(primeira, 'Banho completo')
+        self.assertIn('Cookie', primeira['Vary'])
+
+        with self.assertNumQueries(0):
+            segunda = self.client.get(reverse('home'), secure=True)
+        self.assertEqual(segunda.content, primeira.content)
+        self.assertIn('Cookie', segunda['Vary'])
+
+        # Alterar um serviço troca a versão do catálogo e, com ela, a página e os fragmentos
+        self.banho.descricao = 'Banho com hidratação'
+        self.banho.save()
+        self.assertContains(self.client.get(reverse('home'), secure=True), 'Banho com hidratação')
+
+    def test_usuario_logado_nao_recebe_pagina_anonima(self):
+        self.client.get(reverse('home'), secure=True)  # Popula o cache anônimo
+        usuario = User.objects.create_user(username='tutora', password='senha-forte-123')
+        self.client.force_login(usuario)
+        resposta = self.client.get(reverse('home'), secure=True)
+        self.assertContains(resposta, 'tutora')
+        self.assertContains(resposta, 'Banho completo')
+
+    def test_checkboxes_de_servicos_em_cache_por_versao(self):
+        self.assertContains(self.client.get(reverse('agendar_servico'), secure=True), 'Banho - R$ 50.00')
+        self.banho.nome = 'Banho Premium'
+        self.banho.save()
+        resposta = self.client.get(reverse('agendar_servico'), secure=True)
+        self.assertContains(resposta, 'Banho Premium - R$ 50.00')
+        self.assertNotContains(resposta, 'Banho - R$ 50.00')
+
+
+# ==============================================================================
+# 20. Testes do Cache em Duas Camadas
+# ==============================================================================
+
+class CacheDoisNiveisTest(TestCase):
+
+    def setUp(self):
+        self.camada = cache_camadas.CacheDoisNiveis('testes', tamanho_l1=2, ttl_l1=60)
+        self.chamadas = 0
+
+    def calcular(self, valor='novo'):
+        self.chamadas += 1
+        return valor
+
+    def test_get_or_compute_calcula_uma_vez(self):
+        self.assertEqual(self.camada.get_or_compute('a', self.calcular, 60), 'novo')
+        self.assertEqual(self.camada.get_or_compute('a', self.calcular, 60), 'novo')
+        self.assertEqual(self.chamadas, 1)
+
+        # Outro processo: L1 vazio, valor vem do L2 sem recalcular
+        self.camada.limpar_l1()
+        self.assertEqual(self.camada.get_or_compute('a', self.calcular, 60), 'novo')
+        self.assertEqual(self.chamadas, 1)
+
+    def test_l1_descarta_o_menos_usado(self):
+        for chave in ('a', 'b', 'c'):
+            self.camada.set(chave, chave, 60)
+        self.assertEqual(len(self.camada.l1), 2)
+        self.assertIsNone(self.camada.l1.get('a'))
+        self.assertEqual(self.camada.get('a'), 'a')  # Ainda no L2
+
+    def test_expiracao_antecipada_perto_do_vencimento(self):
+        self.camada.set('a', 'antigo', 60)
+        # Longe do vencimento e sem custo registrado: nunca antecipa
+        self.assertEqual(self.camada.get_or_compute('a', self.calcular, 60), 'antigo')
+
+        # Cálculo "caro" (100 s) a 60 s do vencimento: antecipa quase sempre
+        self.camada.limpar_l1()
+        self.camada._gravar('a', 'antigo', 60, custo=100)
+        resultados = set()
+        for _ in range(20):
+            resultados.add(self.camada.get_or_compute('a', lambda: self.calcular(), 60, beta=5))
+        self.assertIn('novo', resultados)
+
+    def test_quem_perde_a_trava_devolve_o_valor_atual(self):
+        self.camada._gravar('a', 'antigo', 60, custo=10 ** 6)
+        self.camada.limpar_l1()
+        self.assertIsNotNone(self.camada._travar('a'))  # Outro processo está recalculando
+        self.assertEqual(self.camada.get_or_compute('a', self.calcular, 60), 'antigo')
+        self.assertEqual(self.chamadas, 0)
+
+    def test_stampede_calcula_uma_unica_vez(self):
+        barreira = threading.Barrier(8)
+        liberar = threading.Event()
+        resultados = []
+
+        def lento():
+            self.chamadas += 1
+            liberar.wait(2)
+            return 42
+
+        def ler():
+            barreira.wait()
+            resultados.append(self.camada.get_or_compute('a', lento, 60))
+
+        threads = [threading.Thread(target=ler) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        liberar.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(resultados, [42] * 8)
+        self.assertEqual(self.chamadas, 1)
+
+    def test_mapa_de_ocupacao_no_cache_compartilhado(self):
+        data = timezone.localdate() + timedelta(days=30)
+        with self.assertNumQueries(1):
+            self.assertEqual(ocupacao.obter_mapa(data), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(ocupacao.obter_mapa(data), 0)
+        ocupacao.invalidar_dia(data)
+        with self.assertNumQueries(1):
+            self.assertEqual(ocupacao.obter_mapa(data), 0)
+
+
+# ==============================================================================
+# 21. Testes dos Eventos de Disponibilidade ao Vivo (SSE)
+# ==============================================================================
+
+@override_settings(AGENDAMENTOS_EVENTOS_INTERVALO=0.01, AGENDAMENTOS_EVENTOS_KEEPALIVE=5)
+class EventosDisponibilidadeTest(TestCase):
+
+    def setUp(self):
+        self.data = timezone.localdate() + timedelta(days=30)
+
+    def agendar(self, horario, status='agendado'):
+        with self.captureOnCommitCallbacks(execute=True):  # O mapa recebe o intervalo após o commit
+            return criar_agendamento(
+                data=self.data, horario_inicio=horario, duracao_total_minutos=30, status=status,
+            )
+
+    def test_diferenca_entre_mapas(self):
+        anterior = ocupacao.mascara_intervalo(600, 630)
+        atual = ocupacao.mascara_intervalo(630, 660)
+        self.assertEqual(eventos.diferenca(self.data, anterior, atual), [
+            ('ocupado', {'data': self.data.isoformat(), 'slots': ['10:30', '10:45']}),
+            ('liberado', {'data': self.data.isoformat(), 'slots': ['10:00', '10:15']}),
+        ])
+        self.assertEqual(eventos.diferenca(self.data, atual, atual), [])
+
+    def test_datas_invalidas(self):
+        url = reverse('eventos_disponibilidade')
+        self.assertEqual(self.client.get(url, secure=True).status_code, 400)
+        self.assertEqual(self.client.get(url, {'datas': 'amanha'}, secure=True).status_code, 400)
+        muitas = ','.join((self.data + timedelta(days=i)).isoformat() for i in range(eventos.MAX_DATAS + 1))
+        self.assertEqual(self.client.get(url, {'datas': muitas}, secure=True).status_code, 400)
+
+    def test_sem_asgi_recusa_stream_e_tela_usa_polling(self):
+        # O cliente de testes síncrono passa pelo handler WSGI, como o runserver
+        resposta = self.client.get(reverse('eventos_disponibilidade'), {'datas': self.data.isoformat()}, secure=True)
+        self.assertEqual(resposta.status_code, 503)
+
+        resposta = self.client.get(reverse('agendar_servico'), secure=True)
+        self.assertFalse(resposta.context['eventos_ao_vivo'])
+        self.assertContains(resposta, 'const eventosAoVivo = false;')
+
+    async def test_stream_avisa_ocupacao_e_liberacao(self):
+        resposta = await self.async_client.get(
+            reverse('eventos_disponibilidade'), {'datas': self.data.isoformat()}, secure=True,
+        )
+        self.assertEqual(resposta['Content-Type'], 'text/event-stream')
+        fluxo = resposta.streaming_content
+        self.assertEqual(await anext(fluxo), b'retry: 3000\n\n')
+
+        # Aguarda a central registrar o estado inicial do dia
+        while self.data not in eventos.central().estado:
+            await asyncio.sleep(0.01)
+
+        agendamento = await sync_to_async(self.agendar)(time(10, 0))
+        evento = (await asyncio.wait_for(anext(fluxo), 2)).decode()
+        self.assertIn('event: ocupado', evento)
+        self.assertIn('"slots": ["10:00", "10:15"]', evento)
+
+        agendamento.status = 'cancelado'
+        await sync_to_async(agendamento.save)()
+        evento = (await asyncio.wait_for(anext(fluxo), 2)).decode()
+        self.assertIn('event: liberado', evento)
+
+        await fluxo.aclose()
+        await sync_to_async(resposta.close)()  # O servidor fecha a resposta quando o cliente sai
+        self.assertNotIn(self.data, eventos.central().inscricoes)
+
+
+# ==============================================================================
+# 22. Testes da Agenda por Recurso (profissionais e veículos em paralelo)
+# ==============================================================================
+
+class AgendaRecursosTest(TestCase):
+
+    def setUp(self):
+        self.data = timezone.localdate() + timedelta(days=30)
+        self.banho = Servico.objects.create(nome="Banho", duracao_minutos=60, preco=50.00)
+        self.tosa = Servico.objects.create(nome="Tosa", duracao_minutos=60, preco=80.00)
+        self.ana = Recurso.objects.create(nome="Ana")  # Executa todos os serviços
+        self.van = Recurso.objects.create(nome="Van", tipo='veiculo')
+        self.van.servicos.set([self.banho])
+
+    def reservar(self, horario, servicos, **extra):
+        agendamento = novo_agendamento(
+            data=self.data, horario_inicio=horario, duracao_total_minutos=60, status='agendado', **extra,
+        )
+        with self.captureOnCommitCallbacks(execute=True):  # A versão do dia troca após o commit
+            return reservar_horario(agendamento, [s.id for s in servicos])
+
+    def test_indice_por_bisect(self):
+        indice = recursos.IndiceRecurso([(600, 660), (540, 570), (650, 700)])
+        self.assertEqual((indice.inicios, indice.fins), ([540, 600], [570, 700]))
+        self.assertTrue(indice.livre(480, 540))
+        self.assertFalse(indice.livre(560, 600))
+        self.assertTrue(indice.livre(570, 600))
+        self.assertTrue(indice.livre(700, 760))
+        self.assertFalse(indice.livre(690, 720))
+
+    def test_recursos_em_paralelo_respeitando_elegibilidade(self):
+        primeiro = self.reservar(time(10, 0), [self.banho])
+        segundo = self.reservar(time(10, 0), [self.banho])
+        self.assertEqual({primeiro.recurso, segundo.recurso}, {self.ana, self.van})
+        with self.assertRaises(HorarioIndisponivel):
+            self.reservar(time(10, 30), [self.banho])
+
+        # Tosa só com a Ana: às 11:00 ela está livre, às 10:00 não
+        self.assertFalse(checar_conflito_agendamento(self.data, "10:00", 60, servicos_ids=[self.tosa.id]))
+        self.assertEqual(self.reservar(time(11, 0), [self.tosa]).recurso, self.ana)
+
+        livres_banho = horarios_disponiveis(self.data, 60, servicos_ids=[self.banho.id])
+        livres_tosa = horarios_disponiveis(self.data, 60, servicos_ids=[self.tosa.id])
+        self.assertIn("11:00", livres_banho)  # A van está livre
+        self.assertNotIn("11:00", livres_tosa)
+        self.assertNotIn("10:00", livres_banho)
+
+    def test_agendamento_sem_recurso_ocupa_todos(self):
+        # Criado diretamente (como os anteriores ao cadastro dos recursos)
+        criar_agendamento(
+            nome_pet="Mia", tipo_pet="gato", data=self.data, horario_inicio=time(9, 0),
+            duracao_total_minutos=60, status='agendado',
+        )
+        self.assertNotIn("09:00", horarios_disponiveis(self.data, 60, servicos_ids=[self.banho.id]))
+        calendario = calendario_disponibilidade(self.data, self.data, 60, servicos_ids=[self.banho.id])
+        self.assertNotIn(9 * 60, calendario[self.data])
+        self.assertIn(10 * 60, calendario[self.data])
+
+    def test_edicao_mantem_o_recurso(self):
+        agendamento = self.reservar(time(10, 0), [self.banho])
+        recurso_original = agendamento.recurso_id
+        agendamento.horario_inicio = time(15, 0)
+        reservar_horario(agendamento, [self.banho.id], agendamento_id=agendamento.id)
+        agendamento.refresh_from_db()
+        self.assertEqual(agendamento.recurso_id, recurso_original)
+
+    def test_elegibilidade_alterada_invalida_snapshot(self):
+        self.assertEqual(len(recursos.elegiveis([self.tosa.id])), 1)
+        self.van.servicos.add(self.tosa)
+        self.assertEqual(len(recursos.elegiveis([self.tosa.id])), 2)
+        self.van.ativo = False
+        self.van.save()
+        self.assertEqual([r.nome for r in recursos.obter_recursos()], ["Ana"])
+
+
+# ==============================================================================
+# 23. Testes do Expediente Compilado (horários, pausas e feriados cadastrados)
+# ==============================================================================
+
+class ExpedienteTest(TestCase):
+
+    def setUp(self):
+        self.data = timezone.localdate() + timedelta(days=30)
+
+    def test_padrao_igual_ao_expediente_fixo(self):
+        inicios = expediente.inicios_do_dia(self.data)
+        self.assertEqual(inicios[0], 8 * 60)
+        self.assertEqual(inicios[-1], 17 * 60 + 45)
+        self.assertNotIn(12 * 60, inicios)
+        self.assertIn(14 * 60, inicios)
+        self.assertEqual(len(inicios), 32)
+        self.assertEqual(expediente.inicios_do_dia(self.data, minimo_minutos=17 * 60), (1020, 1035, 1050, 1065))
+
+    def test_dias_da_semana_e_pausas_cadastrados(self):
+        for dia in range(5):
+            HorarioFuncionamento.objects.create(dia_semana=dia, abertura=time(9, 0), fechamento=time(17, 0))
+        HorarioFuncionamento.objects.create(dia_semana=5, abertura=time(8, 0), fechamento=time(12, 0))
+        PausaExpediente.objects.create(inicio=time(12, 0), fim=time(13, 0), descricao="Almoço")
+
+        semana = {dia.weekday(): dia for dia in (self.data + timedelta(days=i) for i in range(7))}
+        segunda, sabado, domingo = semana[0], semana[5], semana[6]
+        dias = {dia: expediente.inicios_do_dia(dia) for dia in semana.values()}
+
+        self.assertEqual(dias[domingo], ())
+        self.assertEqual(dias[sabado][-1], 11 * 60 + 45)
+        self.assertEqual(dias[segunda][0], 9 * 60)
+        self.assertNotIn(12 * 60 + 30, dias[segunda])
+        self.assertIn(13 * 60, dias[segunda])
+        self.assertEqual(horarios_disponiveis(domingo, 60), [])
+        self.assertFalse(checar_conflito_agendamento(domingo, "10:00", 60))
+
+    def test_feriado_e_fechamento_parcial(self):
+        FechamentoAgenda.objects.create(data=self.data, motivo="Feriado municipal")
+        amanha = self.data + timedelta(days=1)
+        FechamentoAgenda.objects.create(data=amanha, inicio=time(8, 0), fim=time(10, 0), motivo="Dedetização")
+
+        self.assertEqual(horarios_disponiveis(self.data, 30), [])
+        self.assertEqual(horarios_disponiveis(amanha, 30)[0], "10:00")
+        self.assertFalse(checar_conflito_agendamento(amanha, "09:00", 30))
+        self.assertTrue(checar_conflito_agendamento(amanha, "10:00", 30))
+        calendario = calendario_disponibilidade(self.data, amanha, 30)
+        self.assertEqual(calendario[self.data], [])
+        self.assertEqual(calendario[amanha][0], 10 * 60)
+
+    def test_feriado_anual(self):
+        FechamentoAgenda.objects.create(data=date(2000, 12, 25), repetir_anualmente=True, motivo="Natal")
+        natal = date(self.data.year + 1, 12, 25)
+        self.assertEqual(expediente.inicios_do_dia(natal), ())
+        self.assertNotEqual(expediente.inicios_do_dia(natal + timedelta(days=1)), ())
+
+    def test_alteracao_invalida_e_snapshot_sem_query(self):
+        expediente.obter_expediente()
+        with self.assertNumQueries(0):
+            expediente.inicios_do_dia(self.data)
+
+        horario = HorarioFuncionamento.objects.create(
+            dia_semana=self.data.weekday(), abertura=time(10, 0), fechamento=time(11, 0),
+        )
+        self.assertEqual(expediente.inicios_do_dia(self.data), (600, 615, 630, 645))
+        horario.delete()
+        self.assertEqual(len(expediente.inicios_do_dia(self.data)), 32)
+
+    def test_horarios_fora_do_expediente_nao_estao_livres(self):
+        self.assertFalse(checar_conflito_agendamento(self.data, "12:30", 30))  # Almoço
+        self.assertFalse(checar_conflito_agendamento(self.data, "19:00", 30))
+        self.assertFalse(checar_conflito_agendamento(self.data, "10:10", 30))
+
+    def test_horarios_fora_da_grade(self):
+        with self.assertRaises(ValidationError) as erro:
+            HorarioFuncionamento(dia_semana=0, abertura=time(8, 10), fechamento=time(18, 0)).full_clean()
+        self.assertIn('abertura', erro.exception.message_dict)
+        with self.assertRaises(ValidationError):
+            PausaExpediente(inicio=time(12, 0), fim=time(13, 5)).full_clean()
+        with self.assertRaises(ValidationError):
+            FechamentoAgenda(data=self.data, inicio=time(9, 20), fim=time(10, 0)).full_clean()
+        HorarioFuncionamento(dia_semana=0, abertura=time(8, 15), fechamento=time(18, 0)).full_clean()
+
+        # Gravado sem validação (shell, fixture): a janela de 08:10 toca o slot das 08:30
+        HorarioFuncionamento.objects.create(dia_semana=self.data.weekday(), abertura=time(8, 10), fechamento=time(10, 0))
+        criar_agendamento(data=self.data, horario_inicio=time(8, 30), duracao_total_minutos=30, status='agendado')
+        livres = horarios_disponiveis(self.data, 30)
+        self.assertNotIn("08:10", livres)
+        self.assertIn("09:10", livres)
+        self.assertFalse(checar_conflito_agendamento(self.data, "08:10", 30))
+        self.assertTrue(checar_conflito_agendamento(self.data, "09:10", 30))
+        for horario in livres:
+            self.assertTrue(checar_conflito_agendamento(self.data, horario, 30), horario)
+
+
+# ==============================================================================
+# 24. Testes da Disponibilidade em Lote (NumPy)
+# ==============================================================================
+
+class DisponibilidadeLoteTest(TestCase):
+
+    def setUp(self):
+        self.inicio = timezone.localdate() + timedelta(days=30)
+        self.fim = self.inicio + timedelta(days=6)
+        for dias, horario, duracao in [(0, time(9, 0), 60), (0, time(14, 30), 45), (2, time(10, 0), 120), (5, time(8, 0), 15)]:
+            self.criar(self.inicio + timedelta(days=dias), horario, duracao)
+        FechamentoAgenda.objects.create(data=self.inicio + timedelta(days=3), motivo="Feriado")
+
+    def criar(self, data, horario, duracao, **extra):
+        return criar_agendamento(
+            data=data, horario_inicio=horario, duracao_total_minutos=duracao, status='agendado', **extra,
+        )
+
+    def test_igual_ao_calendario_para_todas_as_duracoes(self):
+        duracoes = (15, 30, 60, 90, 180)
+        lote = disponibilidade_lote.calcular_disponibilidade_lote(self.inicio, self.fim, duracoes)
+        for duracao in duracoes:
+            self.assertEqual(lote.por_dia(duracao), calendario_disponibilidade(self.inicio, self.fim, duracao))
+        self.assertEqual(lote.contagem().shape, (5, 7))
+        self.assertEqual(lote.contagem()[0, 3], 0)  # Feriado
+
+    def test_uma_query_para_o_periodo(self):
+        recursos.obter_recursos()  # Snapshot dos recursos ativos: uma query por versão
+        expediente.obter_expediente()  # Expediente compilado: três queries por versão
+        with self.assertNumQueries(1):
+            disponibilidade_lote.calcular_disponibilidade_lote(self.inicio, self.fim, range(15, 181, 15))
+
+    def test_recursos_e_elegibilidade(self):
+        banho = Servico.objects.create(nome="Banho", duracao_minutos=60, preco=50.00)
+        tosa = Servico.objects.create(nome="Tosa", duracao_minutos=60, preco=80.00)
+        ana = Recurso.objects.create(nome="Ana")
+        van = Recurso.objects.create(nome="Van", tipo='veiculo')
+        van.servicos.set([banho])
+        self.criar(self.inicio + timedelta(days=1), time(11, 0), 60, recurso=ana)
+        self.criar(self.inicio + timedelta(days=1), time(15, 0), 60, recurso=van)
+
+        for servicos_ids in ([banho.id], [tosa.id]):
+            lote = disponibilidade_lote.calcular_disponibilidade_lote(self.inicio, self.fim, (60,), servicos_ids)
+            for dia in lote.datas:
+                esperado = [horario_para_minutos(h) for h in horarios_disponiveis(dia, 60, servicos_ids=servicos_ids)]
+                self.assertEqual(lote.horarios(60, dia), esperado)
+
+    def test_comando_de_comparacao(self):
+        saida = StringIO()
+        call_command(
+            'comparar_disponibilidade', '--inicio', self.inicio.isoformat(), '--dias', '7',
+            '--duracoes', '30,60', '--repeticoes', '1', stdout=saida,
+        )
+        self.assertIn('Resultados idênticos', saida.getvalue())
+
+
+# ==============================================================================
+# 25. Testes da Busca dos Próximos Horários Livres
+# ==============================================================================
+
+class ProximosHorariosTest(TestCase):
+
+    def setUp(self):
+        self.inicio = timezone.localdate() + timedelta(days=30)
+        self.servico = Servico.objects.create(nome="Banho e Tosa", duracao_minutos=60, preco=90.00)
+
+    def ocupar_dia(self, data):
+        for horario in (time(8, 0), time(9, 0), time(10, 0), time(11, 0), time(14, 0), time(15, 0), time(16, 0), time(17, 0)):
+            criar_agendamento(data=data, horario_inicio=horario, duracao_total_minutos=60, status='agendado')
+
+    def test_lacunas(self):
+        candidatos = tuple(range(480, 1080, 15))
+        # Blocos 09:00-10:00 e 10:30-12:00: 45 minutos só cabem antes das 09:00 e a partir das 12:00
+        livres = inicios_nas_lacunas([540, 630], [600, 720], candidatos, 45, 10)
+        self.assertEqual(livres[:5], [480, 495, 720, 735, 750])
+        self.assertEqual(inicios_nas_lacunas([540], [600], candidatos, 60, 2), [480, 600])
+
+    def test_pula_dias_lotados_e_fechados(self):
+        self.ocupar_dia(self.inicio)
+        FechamentoAgenda.objects.create(data=self.inicio + timedelta(days=1), motivo="Feriado")
+        encontrados = proximos_horarios([self.servico.id], a_partir=self.inicio, quantidade=3)
+        segundo_dia = self.inicio + timedelta(days=2)
+        self.assertEqual(encontrados, [(segundo_dia, 480), (segundo_dia, 495), (segundo_dia, 510)])
+
+    def test_periodo_e_igual_a_varredura_dia_a_dia(self):
+        tarde = PERIODOS_DO_DIA['tarde']
+        encontrados = proximos_horarios([self.servico.id], a_partir=self.inicio, periodo=tarde, quantidade=20)
+        self.assertEqual(encontrados[0], (self.inicio, 14 * 60))
+        esperado = [
+            (self.inicio, horario_para_minutos(h)) for h in horarios_disponiveis(self.inicio, 60)
+            if tarde[0] <= horario_para_minutos(h) < tarde[1]
+        ]
+        self.assertEqual([e for e in encontrados if e[0] == self.inicio], esperado)
+
+    def test_para_cedo_com_poucas_queries(self):
+        recursos.obter_recursos()  # Snapshot dos recursos ativos: uma query por versão
+        expediente.obter_expediente()  # Expediente compilado: três queries por versão
+        obter_catalogo()
+        with self.assertNumQueries(1):  # Só a primeira janela de dias
+            proximos_horarios([self.servico.id], a_partir=self.inicio, quantidade=5)
+
+    def test_com_recursos(self):
+        tosa = Servico.objects.create(nome="Tosa", duracao_minutos=60, preco=80.00)
+        ana = Recurso.objects.create(nome="Ana")
+        Recurso.objects.create(nome="Van", tipo='veiculo').servicos.set([self.servico])
+        ana.servicos.set([tosa])
+        self.ocupar_dia(self.inicio)  # Sem recurso: bloqueia os dois
+        encontrados = proximos_horarios([tosa.id], a_partir=self.inicio, quantidade=1)
+        self.assertEqual(encontrados, [(self.inicio + timedelta(days=1), 480)])
+
+    def test_view(self):
+        resposta = self.client.get(reverse('proximos_horarios'), {
+            'servicos_ids': str(self.servico.id), 'a_partir': self.inicio.isoformat(),
+            'periodo': 'manha', 'quantidade': 2,
+        }, secure=True)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json(), {
+            'duracao': 60,
+            'horarios': [
+                {'data': self.inicio.isoformat(), 'horario': '08:00'},
+                {'data': self.inicio.isoformat(), 'horario': '08:15'},
+            ],
+        })
+        for parametros in ({'periodo': 'madrugada'}, {'quantidade': 0}, {'a_partir': 'ontem'}):
+            resposta = self.client.get(
+                reverse('proximos_horarios'), {'servicos_ids': str(self.servico.id), **parametros}, secure=True,
+            )
+            self.assertEqual(resposta.status_code, 400)
+
+
+# ==============================================================================
+# 26. Testes da Geração de Dados Sintéticos e do Teste de Carga
+# ==============================================================================
+
+class PopularDadosTest(TestCase):
+
+    def popular(self, *args):
+        call_command(
+            'popular_dados', '--usuarios', '6', '--servicos', '4', '--ceps', '5', '--dias-historico', '20',
+            '--dias-futuros', '5', '--por-dia', '6', '--lote', '25', *args, stdout=StringIO(),
+        )
+
+    def test_volumes_sem_sobreposicao(self):
+        self.popular()
+        self.assertEqual(User.objects.filter(username__startswith='carga').count(), 6)
+        self.assertEqual(PerfilUsuario.objects.count(), 6)
+        self.assertEqual(Pet.objects.count(), 12)
+        agendamentos = Agendamento.objects.all()
+        self.assertGreater(agendamentos.count(), 20)
+        self.assertFalse(agendamentos.filter(servicos__isnull=True).exists())
+        self.assertEqual(agendamentos.filter(data__lt=timezone.localdate(), status='agendado').count(), 0)
+        self.assertTrue(busca.buscar(agendamentos.first().nome_pet, tipos=['agendamento']))
+
+        # Nenhuma sobreposição, nem entre os cancelados
+        por_dia = {}
+        for dia, horario, duracao in agendamentos.values_list('data', 'horario_inicio', 'duracao_total_minutos'):
+            inicio = horario_para_minutos(horario)
+            por_dia.setdefault(dia, []).append((inicio, inicio + duracao))
+        for intervalos in por_dia.values():
+            intervalos.sort()
+            for (_, fim_anterior), (inicio, _) in zip(intervalos, intervalos[1:]):
+                self.assertLessEqual(fim_anterior, inicio)
+
+    def test_prefixo_repetido(self):
+        self.popular()
+        with self.assertRaises(CommandError):
+            self.popular()
+
+    def test_nova_execucao_reaproveita_servicos(self):
+        self.popular()
+        self.popular('--prefixo', 'outra')
+        self.assertEqual(Servico.objects.count(), 4)
+        self.assertEqual(User.objects.filter(username__startswith='outra').count(), 6)
+
+    @override_settings(DEBUG=True)
+    def test_carga_reporta_percentis_e_queries(self):
+        self.popular('--servicos', '3')
+        saida = StringIO()
+        call_command(
+            'testar_carga', '--requisicoes', '25', '--concorrencia', '1', '--aquecimento', '2',
+            '--permitir-escrita', stdout=saida,
+        )
+        relatorio = saida.getvalue()
+        self.assertIn('p95 ms', relatorio)
+        self.assertIn('Total: 25 requisições', relatorio)
+        self.assertIn('0 erros', relatorio)
+        self.assertIn('disponibilidade', relatorio)
+        self.assertIn('só para comparar', relatorio)
+
+    def test_carga_recusa_escrita_e_producao(self):
+        self.popular()
+        argumentos = ('testar_carga', '--requisicoes', '5', '--concorrencia', '1')
+        with self.assertRaisesMessage(CommandError, 'DEBUG=False'):
+            call_command(*argumentos, '--mix', 'home=1', stdout=StringIO())
+        with override_settings(DEBUG=True):
+            with self.assertRaisesMessage(CommandError, '--permitir-escrita'):
+                call_command(*argumentos, stdout=StringIO())
+            call_command(*argumentos, '--mix', 'home=1,disponibilidade=1', stdout=StringIO())
+        self.assertFalse(Agendamento.objects.filter(nome_tutor='Tutor Carga').exists())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, SESSION_COOKIE_SECURE=False, CSRF_COOKIE_SECURE=False)
+class TestarCargaHttpTest(CacheLimpoMixin, LiveServerTestCase):
+    """Modo --url: o comando faz login pelo formulário e mede um servidor de verdade."""
+
+    def test_carga_por_http(self):
+        call_command(
+            'popular_dados', '--usuarios', '2', '--servicos', '2', '--ceps', '3', '--dias-historico', '5',
+            '--dias-futuros', '3', '--por-dia', '3', stdout=StringIO(),
+        )
+        saida = StringIO()
+        call_command(
+            'testar_carga', '--url', self.live_server_url, '--requisicoes', '12', '--concorrencia', '1',
+            '--aquecimento', '1', '--mix', 'home=1,disponibilidade=2,meus_agendamentos=1,agendar=1',
+            '--permitir-escrita', stdout=saida,
+        )
+        relatorio = saida.getvalue()
+        self.assertIn('Total: 12 requisições', relatorio)
+        self.assertIn(' 0 erros', relatorio)
+        self.assertNotIn('só para comparar', relatorio)
+        self.assertTrue(Agendamento.objects.filter(nome_tutor='Tutor Carga').exists())
@@ -20,9 +20,17 @@ urlpatterns = [
     path('meus-agendamentos/', views.meus_agendamentos, name='meus_agendamentos'),
     path('agendar-servico/', views.agendar_servico, name='agendar_servico'),
     path('verificar-horarios-disponiveis/', views.verificar_horarios_disponiveis, name='verificar_horarios_disponiveis'),
+    path('eventos-disponibilidade/', views.eventos_disponibilidade, name='eventos_disponibilidade'),
+    path('calendario-disponibilidade/', views.calendario_disponibilidade, name='calendario_disponibilidade'),
+    path('proximos-horarios/', views.proximos_horarios, name='proximos_horarios'),
     path('consultar-cep/', views.consultar_cep, name='consultar_cep'),
 
     # Editar e Cancelar agendamento
     path('editar-agendamento/<int:agendamento_id>/', views.editar_agendamento, name='editar_agendamento'),
     path('cancelar-agendamento/<int:agendamento_id>/', views.cancelar_agendamento, name='cancelar_agendamento'),
+
+    # Equipe
+    path('staff/busca/', views.busca_staff, name='busca_staff'),
+    path('staff/painel/', views.painel_staff, name='painel_staff'),
+    path('staff/exportar-agendamentos/', views.exportar_agendamentos, name='exportar_agendamentos'),
 ]
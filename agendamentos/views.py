@@ -2,32 +2,56 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.urls import reverse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from datetime import date, datetime, time, timedelta
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from asgiref.sync import sync_to_async
+from datetime import date, datetime
+import hashlib
 import json
-import urllib.request
 
 # Importa a nova camada de serviços
 from .services import (
     calcular_duracao_total, 
-    gerar_horarios_possiveis, 
-    checar_conflito_agendamento
+    checar_conflito_agendamento,
+    horarios_disponiveis,
+    minimo_minutos_para,
+    calendario_disponibilidade as calcular_calendario,
+    minutos_para_horario,
+    reservar_horario,
+    HorarioIndisponivel,
+    pagina_agendamentos,
+    proximos_horarios as buscar_proximos_horarios,
+    MAX_DIAS_CALENDARIO,
+    MAX_PROXIMOS,
+    PERIODOS_DO_DIA
 )
 
 from .forms import (
     CustomUserCreationForm, CustomAuthenticationForm, PetForm, 
     DadosPessoaisForm, AgendamentoForm
 )
-from .models import Pet, PerfilUsuario, Servico, Agendamento
+from .models import Pet, PerfilUsuario, Agendamento
+from .catalogo import obter_catalogo, versao_catalogo
+from . import cep as cep_service
+from . import busca, eventos, expediente, exportacao, ocupacao, recursos, relatorios
+from .coalescencia import SingleFlight
+from .cache_paginas import cache_anonimo
 
 # ==============================================================================
 # Views de Autenticação e Informação (sem alterações na lógica)
 # ==============================================================================
 
+@cache_anonimo()
 def home(request):
-    servicos = Servico.objects.filter(ativo=True)[:5]
-    return render(request, 'agendamentos/home.html', {'servicos': servicos})
+    catalogo = obter_catalogo()
+    return render(request, 'agendamentos/home.html', {
+        'servicos': catalogo.ativos()[:5],
+        'versao_catalogo': catalogo.versao,
+    })
 
 def cadastro(request):
     if request.method == 'POST':
@@ -60,8 +84,26 @@ def logout_view(request):
 
 @login_required
 def meus_agendamentos(request):
-    agendamentos = Agendamento.objects.filter(usuario=request.user).order_by('-data', 'horario_inicio') 
-    return render(request, 'agendamentos/meus_agendamentos.html', {'agendamentos': agendamentos})
+    # Próximos e passados, cada seção com seu próprio cursor: o número de queries
+    # não depende do histórico do usuário.
+    hoje = timezone.localdate()
+    do_usuario = Agendamento.objects.filter(usuario=request.user)
+    
+    proximos, cursor_proximos = pagina_agendamentos(
+        do_usuario.filter(data__gte=hoje), request.GET.get('proximos')
+    )
+    passados, cursor_passados = pagina_agendamentos(
+        do_usuario.filter(data__lt=hoje), request.GET.get('passados')
+    )
+    
+    return render(request, 'agendamentos/meus_agendamentos.html', {
+        'proximos': proximos,
+        'passados': passados,
+        'cursor_proximos': cursor_proximos,
+        'cursor_passados': cursor_passados,
+        'cursor_proximos_atual': request.GET.get('proximos', ''),
+        'cursor_passados_atual': request.GET.get('passados', ''),
+    })
 
 @login_required
 def meus_pets(request):
@@ -153,7 +195,7 @@ def agendar_servico(request):
                 return redirect('agendar_servico')
             
             # 2. VALIDAÇÃO DE CONFLITO (USANDO SERVICE)
-            if not checar_conflito_agendamento(data_agendamento, horario_inicio_str, duracao_total):
+            if not checar_conflito_agendamento(data_agendamento, horario_inicio_str, duracao_total, servicos_ids=servicos_ids):
                 messages.error(request, f"O horário selecionado ({horario_inicio_str}) está ocupado pelo período de {duracao_total} minutos. Escolha outro horário.")
                 return redirect('agendar_servico')
             
@@ -169,8 +211,12 @@ def agendar_servico(request):
                 if pet:
                     agendamento.pet = pet
             
-            agendamento.save()
-            form.save_m2m()
+            # 4. RESERVA TRANSACIONAL: refaz a checagem sob o lock do dia
+            try:
+                reservar_horario(agendamento, form.cleaned_data['servicos'])
+            except HorarioIndisponivel:
+                messages.error(request, f"O horário selecionado ({horario_inicio_str}) acabou de ser ocupado. Escolha outro horário.")
+                return redirect('agendar_servico')
             
             messages.success(request, f'Agendamento realizado com sucesso para {agendamento.data} das {horario_inicio_str} até {agendamento.horario_fim().strftime("%H:%M")}!')
             return redirect('home')
@@ -178,7 +224,7 @@ def agendar_servico(request):
     else:
         form = AgendamentoForm(user=request.user if request.user.is_authenticated else None)
     
-    servicos = Servico.objects.filter(ativo=True)
+    catalogo = obter_catalogo()
     
     pets_json = []
     if request.user.is_authenticated:
@@ -187,11 +233,49 @@ def agendar_servico(request):
     
     return render(request, 'agendamentos/agendar_servico.html', {
         'form': form,
-        'servicos': servicos,
-        'pets_json': json.dumps(pets_json)
+        'servicos': catalogo.ativos(),
+        'pets_json': json.dumps(pets_json),
+        # Checkboxes sem seleção nem erros: bloco servido do cache de fragmentos
+        'cachear_servicos': not form.is_bound,
+        'versao_catalogo': catalogo.versao,
+        'eventos_ao_vivo': eventos.ao_vivo(request),
+        'intervalo_polling': eventos.intervalo_polling(),
     })
 
-def verificar_horarios_disponiveis(request):
+# Endpoints assíncronos: sob ASGI não prendem um worker enquanto esperam banco ou
+# rede, e requisições idênticas simultâneas compartilham uma única execução.
+_voos_disponibilidade = SingleFlight()
+_voos_cep = SingleFlight()
+
+def _validadores_disponibilidade(data_obj, servicos_ids, minimo_minutos):
+    """
+    ETag e Last-Modified da resposta, só com dados do cache: versão do dia (muda
+    quando um agendamento entra ou sai da agenda), versão do catálogo (durações),
+    recursos (elegibilidade), expediente (horários e fechamentos), serviços pedidos
+    e o filtro de horário mínimo de hoje.
+    """
+    versao_dia = ocupacao.versao_dia(data_obj)
+    base = (
+        f'{data_obj.isoformat()}:{versao_dia}:{versao_catalogo()}:{recursos.versao_recursos()}'
+        f':{expediente.versao_expediente()}:{servicos_ids}:{minimo_minutos}'
+    )
+    etag = '"%s"' % hashlib.md5(base.encode('utf-8')).hexdigest()
+    return etag, http_date(versao_dia / 1e9)
+
+def _com_validadores(resposta, etag, ultima_modificacao):
+    resposta['ETag'] = etag
+    resposta['Last-Modified'] = ultima_modificacao
+    # O navegador guarda a resposta, mas sempre revalida (If-None-Match) antes de usar
+    patch_cache_control(resposta, private=True, no_cache=True)
+    return resposta
+
+def _calcular_horarios_disponiveis(data_obj, servicos_ids, minimo_minutos):
+    duracao_novo_agendamento = calcular_duracao_total(servicos_ids)
+    return horarios_disponiveis(
+        data_obj, duracao_novo_agendamento, minimo_minutos=minimo_minutos, servicos_ids=servicos_ids,
+    )
+
+async def verificar_horarios_disponiveis(request):
     data = request.GET.get('data')
     servicos_ids_str = request.GET.get('servicos_ids') 
     
@@ -199,70 +283,139 @@ def verificar_horarios_disponiveis(request):
         return JsonResponse({'error': 'Data e serviços são obrigatórios para verificar a disponibilidade'}, status=400)
     
     try:
-        # 1. Preparação de Data
+        # 1. Preparação de Data e Serviços
         data_obj = date.fromisoformat(data)
-        
-        agora_local = timezone.localtime(timezone.now())
-        hoje = agora_local.date()
-        hora_minima_para_agendar = agora_local + timedelta(minutes=15)
-        
-        # 2. Obter Duração e Horários Base (USANDO SERVICE)
-        servicos_ids = [int(sid) for sid in servicos_ids_str.split(',') if sid]
-        if not servicos_ids:
-            return JsonResponse({'error': 'Serviço(s) inválido(s) selecionado(s).'}, status=400)
-            
-        duracao_novo_agendamento = calcular_duracao_total(servicos_ids)
-        horarios_possiveis = gerar_horarios_possiveis(intervalo_minutos=15)
-        
-        horarios_disponiveis = []
-        
-        # 3. Iterar e Checar a disponibilidade
-        for horario_str in horarios_possiveis:
-            
-            slot_time = datetime.strptime(horario_str, '%H:%M').time()
-            
-            # --- FILTRO DE TEMPO PASSADO (MANTIDO NA VIEW) ---
-            if data_obj == hoje:
-                slot_dt_naive = datetime.combine(data_obj, slot_time)
-                slot_dt_completo = timezone.make_aware(slot_dt_naive, timezone.get_current_timezone()) 
-                
-                if slot_dt_completo < hora_minima_para_agendar.replace(second=0, microsecond=0):
-                    continue
-            # ------------------------------------
-            
-            # Checa o conflito usando a função de serviço
-            if checar_conflito_agendamento(data_obj, horario_str, duracao_novo_agendamento):
-                horarios_disponiveis.append(horario_str)
-        
-        return JsonResponse({'horarios_disponiveis': horarios_disponiveis})
+        servicos_ids = tuple(sorted(int(sid) for sid in servicos_ids_str.split(',') if sid))
+    except ValueError:
+        return JsonResponse({'error': 'Data ou formato de serviço inválido'}, status=400)
+    
+    if not servicos_ids:
+        return JsonResponse({'error': 'Serviço(s) inválido(s) selecionado(s).'}, status=400)
+    
+    # --- FILTRO DE TEMPO PASSADO: para hoje, só a partir de agora + 15 minutos ---
+    minimo_minutos = minimo_minutos_para(data_obj) if data_obj == timezone.localdate() else None
+    
+    # 2. Nada mudou no dia desde a última resposta: 304 sem ler os agendamentos.
+    #    A validação é feita só pelo ETag (o Last-Modified não reflete o catálogo nem o filtro de hoje).
+    etag, ultima_modificacao = await sync_to_async(_validadores_disponibilidade)(data_obj, servicos_ids, minimo_minutos)
+    condicional = get_conditional_response(request, etag=etag)
+    if condicional is not None:
+        return _com_validadores(condicional, etag, ultima_modificacao)
+    
+    # 3. Duração e varredura do dia (uma execução por data + serviços + filtro)
+    chave = (data_obj, servicos_ids, minimo_minutos)
+    livres = await _voos_disponibilidade.executar(
+        chave,
+        lambda: sync_to_async(_calcular_horarios_disponiveis)(data_obj, servicos_ids, minimo_minutos),
+    )
+    
+    return _com_validadores(JsonResponse({'horarios_disponiveis': livres}), etag, ultima_modificacao)
+
+async def eventos_disponibilidade(request):
+    """
+    Stream SSE com os slots ocupados e liberados nas datas observadas
+    (?datas=AAAA-MM-DD,...). Feito para ASGI: cada conexão aberta é só uma
+    corrotina aguardando a central de eventos do worker.
+    """
+    try:
+        datas = sorted({date.fromisoformat(d) for d in request.GET.get('datas', '').split(',') if d})
+    except ValueError:
+        return JsonResponse({'error': 'Data inválida'}, status=400)
+    if not datas:
+        return JsonResponse({'error': 'Informe ao menos uma data'}, status=400)
+    if len(datas) > eventos.MAX_DATAS:
+        return JsonResponse({'error': f'Observe no máximo {eventos.MAX_DATAS} datas.'}, status=400)
+    if not eventos.ao_vivo(request):
+        # Sob WSGI o stream prenderia o worker sem entregar nada: o cliente usa polling
+        return JsonResponse({'error': 'Eventos ao vivo exigem um servidor ASGI.'}, status=503)
+
+    resposta = StreamingHttpResponse(eventos.FluxoEventos(datas), content_type='text/event-stream')
+    resposta['Cache-Control'] = 'no-cache'
+    resposta['X-Accel-Buffering'] = 'no'  # Proxies (nginx) não devem segurar os eventos
+    return resposta
+
+def calendario_disponibilidade(request):
+    inicio = request.GET.get('inicio')
+    fim = request.GET.get('fim')
+    servicos_ids_str = request.GET.get('servicos_ids')
+    
+    if not inicio or not fim or not servicos_ids_str:
+        return JsonResponse({'error': 'Início, fim e serviços são obrigatórios para consultar o calendário'}, status=400)
     
+    try:
+        data_inicio = date.fromisoformat(inicio)
+        data_fim = date.fromisoformat(fim)
+        servicos_ids = [int(sid) for sid in servicos_ids_str.split(',') if sid]
     except ValueError:
         return JsonResponse({'error': 'Data ou formato de serviço inválido'}, status=400)
+    
+    if not servicos_ids:
+        return JsonResponse({'error': 'Serviço(s) inválido(s) selecionado(s).'}, status=400)
+    if data_fim < data_inicio:
+        return JsonResponse({'error': 'A data final deve ser igual ou posterior à inicial.'}, status=400)
+    if (data_fim - data_inicio).days + 1 > MAX_DIAS_CALENDARIO:
+        return JsonResponse({'error': f'O período máximo é de {MAX_DIAS_CALENDARIO} dias.'}, status=400)
+    
+    # Dias passados não têm horários: começa a partir de hoje
+    data_inicio = max(data_inicio, timezone.localdate())
+    duracao = calcular_duracao_total(servicos_ids)
+    
+    dias = {}
+    lotados = []
+    if data_inicio <= data_fim:
+        for dia, livres in calcular_calendario(data_inicio, data_fim, duracao, servicos_ids).items():
+            dias[dia.isoformat()] = [minutos_para_horario(m) for m in livres]
+            if not livres:
+                lotados.append(dia.isoformat())
+    
+    return JsonResponse({'duracao': duracao, 'dias': dias, 'lotados': lotados})
+
+def proximos_horarios(request):
+    """
+    Primeiros horários livres para os serviços (?servicos_ids=1,2), a partir de
+    ?a_partir=AAAA-MM-DD (padrão: hoje), opcionalmente só em um ?periodo=manha|tarde|noite.
+    """
+    servicos_ids_str = request.GET.get('servicos_ids')
+    if not servicos_ids_str:
+        return JsonResponse({'error': 'Os serviços são obrigatórios para buscar horários'}, status=400)
+    
+    try:
+        servicos_ids = [int(sid) for sid in servicos_ids_str.split(',') if sid]
+        a_partir = date.fromisoformat(request.GET['a_partir']) if request.GET.get('a_partir') else None
+        quantidade = int(request.GET.get('quantidade', 5))
+    except ValueError:
+        return JsonResponse({'error': 'Data, quantidade ou formato de serviço inválido'}, status=400)
+    
+    if not servicos_ids:
+        return JsonResponse({'error': 'Serviço(s) inválido(s) selecionado(s).'}, status=400)
+    if not 1 <= quantidade <= MAX_PROXIMOS:
+        return JsonResponse({'error': f'A quantidade deve estar entre 1 e {MAX_PROXIMOS}.'}, status=400)
+    periodo = request.GET.get('periodo') or None
+    if periodo is not None and periodo not in PERIODOS_DO_DIA:
+        return JsonResponse({'error': f'Período inválido. Use: {", ".join(PERIODOS_DO_DIA)}.'}, status=400)
+    
+    duracao = calcular_duracao_total(servicos_ids)
+    encontrados = buscar_proximos_horarios(
+        servicos_ids, a_partir, PERIODOS_DO_DIA.get(periodo), quantidade,
+    )
+    horarios = [{'data': dia.isoformat(), 'horario': minutos_para_horario(m)} for dia, m in encontrados]
+    return JsonResponse({'duracao': duracao, 'horarios': horarios})
 
-def consultar_cep(request):
+async def consultar_cep(request):
     cep = request.GET.get('cep', '').replace('-', '')
     
-    if len(cep) != 8:
+    if len(cep) != 8 or not cep.isdigit():
         return JsonResponse({'error': 'CEP deve ter 8 dígitos'}, status=400)
     
     try:
-        url = f'https://viacep.com.br/ws/{cep}/json/'
-        
-        with urllib.request.urlopen(url) as response:
-            data = response.read().decode('utf-8')
-            data = json.loads(data)
-        
-        if data.get('erro'):
-            return JsonResponse({'error': 'CEP não encontrado'}, status=404)
-        
-        return JsonResponse({
-            'rua': data.get('logradouro', ''),
-            'bairro': data.get('bairro', ''),
-            'cidade': data.get('localidade', ''),
-            'estado': data.get('uf', '')
-        })
-        
-    except Exception as e:
+        # LRU do processo sem sair do event loop; senão tabela CepCache -> provedor
+        endereco = cep_service.consultar_cep_em_memoria(cep)
+        if endereco is None:
+            endereco = await _voos_cep.executar(cep, lambda: sync_to_async(cep_service.consultar_cep)(cep))
+        return JsonResponse(endereco)
+    except cep_service.CepNaoEncontrado:
+        return JsonResponse({'error': 'CEP não encontrado'}, status=404)
+    except cep_service.ErroConsultaCep as e:
         return JsonResponse({'error': 'Erro ao consultar CEP: ' + str(e)}, status=500)
 
 @login_required
@@ -288,16 +441,22 @@ def editar_agendamento(request, agendamento_id):
                 return redirect('meus_agendamentos')
                 
             # 2. VALIDAÇÃO DE CONFLITO (USANDO SERVICE)
-            if not checar_conflito_agendamento(data_agendamento, horario_inicio_str, duracao_total, agendamento_id=agendamento.id):
+            if not checar_conflito_agendamento(
+                data_agendamento, horario_inicio_str, duracao_total,
+                agendamento_id=agendamento.id, servicos_ids=servicos_ids,
+            ):
                 messages.error(request, f"O horário selecionado ({horario_inicio_str}) está ocupado pelo período de {duracao_total} minutos. Escolha outro horário.")
                 return redirect('meus_agendamentos')
 
-            # 3. SALVAR
+            # 3. SALVAR (reserva transacional, desconsiderando o próprio agendamento)
             agendamento = form.save(commit=False)
             agendamento.duracao_total_minutos = duracao_total
             agendamento.horario_inicio = datetime.strptime(horario_inicio_str, '%H:%M').time()
-            agendamento.save()
-            form.save_m2m()
+            try:
+                reservar_horario(agendamento, form.cleaned_data['servicos'], agendamento_id=agendamento.id)
+            except HorarioIndisponivel:
+                messages.error(request, f"O horário selecionado ({horario_inicio_str}) acabou de ser ocupado. Escolha outro horário.")
+                return redirect('meus_agendamentos')
 
             messages.success(request, 'Agendamento atualizado com sucesso!')
             return redirect('meus_agendamentos')
@@ -310,14 +469,16 @@ def editar_agendamento(request, agendamento_id):
         pets = Pet.objects.filter(dono=request.user)
         pets_json = [{'id': pet.id, 'nome': pet.nome, 'tipo': pet.tipo} for pet in pets]
 
-    servicos = Servico.objects.filter(ativo=True)
+    servicos = obter_catalogo().ativos()
 
     return render(request, 'agendamentos/agendar_servico.html', {
         'form': form,
         'servicos': servicos,
         'pets_json': json.dumps(pets_json),
         'editar': True,
-        'agendamento': agendamento
+        'agendamento': agendamento,
+        'eventos_ao_vivo': eventos.ao_vivo(request),
+        'intervalo_polling': eventos.intervalo_polling(),
     })
 
 
@@ -334,4 +495,64 @@ def cancelar_agendamento(request, agendamento_id):
         messages.warning(request, 'Agendamento cancelado com sucesso!')
         return redirect('meus_agendamentos')
     
-    return redirect('meus_agendamentos')
\ No newline at end of file
+    return redirect('meus_agendamentos')
+
+# ==============================================================================
+# Views da Equipe (staff)
+# ==============================================================================
+
+@staff_member_required
+def busca_staff(request):
+    """Busca ranqueada em agendamentos, pets e perfis. Parâmetros: q, tipo (opcional), limite."""
+    termo = request.GET.get('q', '').strip()
+    tipo = request.GET.get('tipo')
+    if len(termo) < 2:
+        return JsonResponse({'error': 'Informe ao menos 2 caracteres para buscar'}, status=400)
+    if tipo and tipo not in busca.TIPOS:
+        return JsonResponse({'error': 'Tipo inválido'}, status=400)
+    try:
+        limite = min(max(int(request.GET.get('limite', 20)), 1), 100)
+    except ValueError:
+        return JsonResponse({'error': 'Limite inválido'}, status=400)
+
+    resultados = [
+        {
+            'tipo': tipo_objeto,
+            'id': objeto.pk,
+            'descricao': str(objeto),
+            'url': reverse(f'admin:agendamentos_{objeto._meta.model_name}_change', args=[objeto.pk]),
+        }
+        for tipo_objeto, objeto in busca.buscar_objetos(termo, [tipo] if tipo else None, limite)
+    ]
+    return JsonResponse({'resultados': resultados})
+
+
+@staff_member_required
+def painel_staff(request):
+    """Relatório do período (padrão: mês atual) lido apenas da tabela de resumos diários."""
+    try:
+        if request.GET.get('inicio') or request.GET.get('fim'):
+            data_inicio = date.fromisoformat(request.GET.get('inicio', ''))
+            data_fim = date.fromisoformat(request.GET.get('fim', ''))
+        else:
+            data_inicio, data_fim = relatorios.periodo_do_mes(timezone.localdate())
+    except ValueError:
+        return JsonResponse({'error': 'Informe início e fim no formato AAAA-MM-DD'}, status=400)
+
+    if data_fim < data_inicio:
+        return JsonResponse({'error': 'A data final deve ser igual ou posterior à inicial.'}, status=400)
+    if (data_fim - data_inicio).days + 1 > relatorios.MAX_DIAS_RELATORIO:
+        return JsonResponse({'error': f'O período máximo é de {relatorios.MAX_DIAS_RELATORIO} dias.'}, status=400)
+
+    resumo = relatorios.resumo_periodo(data_inicio, data_fim)
+    return JsonResponse({'inicio': data_inicio, 'fim': data_fim, **resumo})
+
+
+@staff_member_required
+def exportar_agendamentos(request):
+    """CSV em streaming. Filtros opcionais: inicio, fim, status e forma_pagamento (vírgula para vários)."""
+    try:
+        queryset = exportacao.filtrar_agendamentos(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': f'Filtro inválido: {e}'}, status=400)
+    return exportacao.resposta_csv(queryset, f'agendamentos-{timezone.localdate().isoformat()}.csv')
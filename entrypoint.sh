@@ -1,6 +1,9 @@
 #!/usr/bin/env bash
+# Cria a tabela do cache compartilhado (se ainda não existir)
+python manage.py createcachetable
+
 # Cria o superusuário (se ainda não existir) usando as variáveis de ambiente
 python manage.py createsuperuser --noinput || true
 
-# Inicia o servidor Gunicorn (o que antes estava no Procfile)
-exec gunicorn agendamento.wsgi:application --log-file -
\ No newline at end of file
+# Inicia o servidor Gunicorn com workers ASGI (uvicorn): eventos ao vivo e views assíncronas
+exec gunicorn agendamento.asgi:application -k uvicorn.workers.UvicornWorker --log-file -
\ No newline at end of file